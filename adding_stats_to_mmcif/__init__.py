@@ -1,47 +1,167 @@
+import asyncio
+import contextvars
+import functools
 import logging
-import tempfile
 import os
-import shutil
+
+# the only place the version is set, setup.py reads it from here. Batch runs redo every entry when it changes
+__version__ = '0.6'
 
 logger = logging.getLogger()
 FORMAT = "%(filename)s - %(funcName)s - %(message)s"
 logging.basicConfig(format=FORMAT)
 
-from .add_sequence_to_mmcif import AddSequenceToMmcif
+from .add_sequence_to_mmcif import AddSequenceToMmcif, ExtractFromMmcif
 from .add_data_from_aimless_xml import run_process as addAimlessDataToMmcif
+from .add_data_from_aimless_xml import get_xml_data, add_xml_data_to_mmcif
 from .add_data_from_mmcif import AddToMmcif
+from .cif_handling import mmcifHandling
+from .metrics import collect_metrics, stage
+from .pairwise_align import get_banded_alignment_engine
+
 
+def add_statistics(mm, xml_file=None, input_mmcif_to_get_data_from=None, include_categories=None,
+                   exclude_categories=None):
+    """
+    :param mm: parsed mmcifHandling of the input mmCIF, updated in memory
+    :param xml_file: Aimless XML file to take the statistics from
+    :param input_mmcif_to_get_data_from: mmCIF file to take the statistics from instead
+    :param include_categories: patterns of the categories to copy from input_mmcif_to_get_data_from, all by default
+    :param exclude_categories: patterns of the categories not to copy from input_mmcif_to_get_data_from,
+    by default the coordinates
+    :return: True if it worked or there was nothing to add, False if not
+    """
+    worked = True
+    if xml_file:
+        with stage('xml_parse'):
+            xml_data, software_row = get_xml_data(xml_file=xml_file)
+        with stage('aimless_merge'):
+            worked = add_xml_data_to_mmcif(pc=mm, xml_data=xml_data, software_row=software_row)
+        if not worked:
+            logging.error('adding statistics to mmCIF failed')
+    elif input_mmcif_to_get_data_from:
+        ac = AddToMmcif(include_categories=include_categories, exclude_categories=exclude_categories)
+        with stage('statistics_mmcif_parse'):
+            parsed = ac.parse_mmcif(mmcif_file=input_mmcif_to_get_data_from)
+        if parsed:
+            with stage('statistics_mmcif_merge'):
+                worked = ac.copy_to_mmcif(mmcif=mm)
+    return worked
+
+
+def run_process(input_mmcif, output_mmcif, fasta_file, xml_file=None, input_mmcif_to_get_data_from=None, workers=1,
+                banded=False, metrics_file=None, include_categories=None, exclude_categories=None):
+    """
+    :param include_categories: patterns of the categories to copy from input_mmcif_to_get_data_from, such as refine*
+    :param exclude_categories: patterns of the categories not to copy from input_mmcif_to_get_data_from,
+    by default the coordinates
+    :param metrics_file: file to append the time and memory used by each stage to as JSON,
+    by default from ADDING_STATS_TO_MMCIF_METRICS
+    """
+    with collect_metrics(metrics_file=metrics_file, input_mmcif=input_mmcif, output_mmcif=output_mmcif) as metrics:
+        worked = run_stages(input_mmcif=input_mmcif, output_mmcif=output_mmcif, fasta_file=fasta_file,
+                            xml_file=xml_file, input_mmcif_to_get_data_from=input_mmcif_to_get_data_from,
+                            workers=workers, banded=banded, include_categories=include_categories,
+                            exclude_categories=exclude_categories)
+        if metrics:
+            metrics.fields['worked'] = worked
+    return worked
 
-def run_process(input_mmcif, output_mmcif, fasta_file, xml_file=None, input_mmcif_to_get_data_from=None):
+
+def run_stages(input_mmcif, output_mmcif, fasta_file, xml_file=None, input_mmcif_to_get_data_from=None, workers=1,
+               banded=False, include_categories=None, exclude_categories=None):
 
     worked = True
 
     if os.path.exists(input_mmcif):
-        run_dir = tempfile.mkdtemp()
-        temp_cif = os.path.join(run_dir, 'temp.cif')
-        if xml_file:
-            worked = addAimlessDataToMmcif(xml_file=xml_file, input_cif=input_mmcif, output_cif=temp_cif)
-            if not worked:
-                logging.error('adding statistics to mmCIF failed')
-        elif input_mmcif_to_get_data_from:
-            ac = AddToMmcif()
-            data = ac.get_data(input_mmcif_to_get_data_from)
-            if data:
-                worked = ac.add_to_cif(input_mmcif_file=input_mmcif, output_mmcif_file=temp_cif, data_dictionary=data)
-        else:
-            shutil.copy(input_mmcif, temp_cif)
+        # the input mmCIF is parsed once, updated in memory by each stage and written out once
+        mm = mmcifHandling()
+        with stage('mmcif_parse'):
+            parsed = mm.parse_mmcif(fileName=input_mmcif)
+        if not parsed:
+            logging.error('unable to parse input mmcif file')
+            return False
+        worked = add_statistics(mm=mm, xml_file=xml_file, input_mmcif_to_get_data_from=input_mmcif_to_get_data_from,
+                                include_categories=include_categories, exclude_categories=exclude_categories)
 
         if worked:
-            worked = AddSequenceToMmcif(input_mmcif=temp_cif,
+            worked = AddSequenceToMmcif(input_mmcif=input_mmcif,
                                         output_mmcif=output_mmcif,
-                                        fasta_file=fasta_file).process_data()
+                                        fasta_file=fasta_file,
+                                        mmcif_handling=mm,
+                                        workers=workers,
+                                        alignment_engine=get_banded_alignment_engine() if banded else None
+                                        ).process_data()
             if not worked:
                 logging.error('adding sequence to mmCIF failed')
-
-        if worked:
-            shutil.rmtree(run_dir)
     else:
         logging.error('unable to access input mmcif file')
         worked = False
 
     return worked
+
+
+async def run_process_async(input_mmcif, output_mmcif, fasta_file, xml_file=None, input_mmcif_to_get_data_from=None,
+                            workers=1, banded=False, executor=None, metrics_file=None, include_categories=None,
+                            exclude_categories=None):
+    """
+    run_process for asyncio. Parsing, adding statistics, aligning and writing run on the executor,
+    looking up non standard residues from the PDBe API does not block the event loop
+    :param executor: thread pool for the stages which use the CPU, by default the event loop's.
+    The parsed mmCIF is shared between the stages, so this cannot be a process pool, use workers to align
+    sequences on several processes
+    :param metrics_file: file to append the time and memory used by each stage to as JSON,
+    by default from ADDING_STATS_TO_MMCIF_METRICS
+    :return: True if it worked, False if not
+    """
+    with collect_metrics(metrics_file=metrics_file, input_mmcif=input_mmcif, output_mmcif=output_mmcif) as metrics:
+        worked = await run_stages_async(input_mmcif=input_mmcif, output_mmcif=output_mmcif, fasta_file=fasta_file,
+                                        xml_file=xml_file, input_mmcif_to_get_data_from=input_mmcif_to_get_data_from,
+                                        workers=workers, banded=banded, executor=executor,
+                                        include_categories=include_categories, exclude_categories=exclude_categories)
+        if metrics:
+            metrics.fields['worked'] = worked
+    return worked
+
+
+async def run_stages_async(input_mmcif, output_mmcif, fasta_file, xml_file=None, input_mmcif_to_get_data_from=None,
+                           workers=1, banded=False, executor=None, include_categories=None, exclude_categories=None):
+    loop = asyncio.get_running_loop()
+
+    def in_executor(function, **kwargs):
+        # the executor runs the stage in this context, so its metrics are collected
+        return loop.run_in_executor(executor, functools.partial(contextvars.copy_context().run, function, **kwargs))
+
+    if not os.path.exists(input_mmcif):
+        logging.error('unable to access input mmcif file')
+        return False
+
+    mm = mmcifHandling()
+
+    def parse_mmcif():
+        with stage('mmcif_parse'):
+            return mm.parse_mmcif(fileName=input_mmcif)
+
+    if not await in_executor(parse_mmcif):
+        logging.error('unable to parse input mmcif file')
+        return False
+    worked = await in_executor(add_statistics, mm=mm, xml_file=xml_file,
+                               input_mmcif_to_get_data_from=input_mmcif_to_get_data_from,
+                               include_categories=include_categories, exclude_categories=exclude_categories)
+
+    if worked:
+        with stage('compound_resolution'):
+            non_standard_residue_mapping = await ExtractFromMmcif(mm=mm).resolve_non_standard_residues_async(
+                executor=executor)
+        add_sequence = AddSequenceToMmcif(input_mmcif=input_mmcif,
+                                          output_mmcif=output_mmcif,
+                                          fasta_file=fasta_file,
+                                          mmcif_handling=mm,
+                                          workers=workers,
+                                          alignment_engine=get_banded_alignment_engine() if banded else None,
+                                          non_standard_residue_mapping=non_standard_residue_mapping)
+        worked = await in_executor(add_sequence.process_data)
+        if not worked:
+            logging.error('adding sequence to mmCIF failed')
+
+    return worked
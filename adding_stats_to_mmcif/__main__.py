@@ -1,18 +1,34 @@
 import argparse
 import logging
+import sys
 from adding_stats_to_mmcif import run_process
+from adding_stats_to_mmcif import batch
 
 logger = logging.getLogger()
 FORMAT = "%(filename)s - %(funcName)s - %(message)s"
 logging.basicConfig(format=FORMAT)
 
 if __name__ == '__main__':  # pragma: no cover
+    # python -m adding_stats_to_mmcif batch --manifest entries.csv processes a whole manifest
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        sys.exit(batch.main(sys.argv[2:]))
+
     parser = argparse.ArgumentParser()
     parser.add_argument('--xml_file', help='input xml file', type=str)
     parser.add_argument('--output_mmcif', help='output mmcif file', type=str, required=True)
     parser.add_argument('--input_mmcif', help='input mmcif file', type=str, required=True)
     parser.add_argument('--input_mmcif_to_get_data_from', help='input mmcif file to get data from', type=str)
+    parser.add_argument('--include_categories', help='patterns of the categories to copy from '
+                                                     '--input_mmcif_to_get_data_from, such as refine*',
+                        type=str, nargs='+')
+    parser.add_argument('--exclude_categories', help='patterns of the categories not to copy from '
+                                                     '--input_mmcif_to_get_data_from, by default the coordinates',
+                        type=str, nargs='*')
     parser.add_argument('--fasta_file', help='input fasta file', type=str)
+    parser.add_argument('--workers', help='number of processes aligning sequences', type=int, default=1)
+    parser.add_argument('--banded', help='align long sequences in a band around the diagonal', action='store_true')
+    parser.add_argument('--metrics', help='file to append the time and memory used by each stage to as JSON, '
+                                          '- for standard error', type=str)
     parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
                         default=logging.INFO)
 
@@ -20,5 +36,7 @@ if __name__ == '__main__':  # pragma: no cover
     logger.setLevel(args.loglevel)
 
     complete = run_process(input_mmcif=args.input_mmcif, output_mmcif=args.output_mmcif, fasta_file=args.fasta_file,
-                           xml_file=args.xml_file, input_mmcif_to_get_data_from=args.input_mmcif_to_get_data_from)
+                           xml_file=args.xml_file, input_mmcif_to_get_data_from=args.input_mmcif_to_get_data_from,
+                           workers=args.workers, banded=args.banded, metrics_file=args.metrics,
+                           include_categories=args.include_categories, exclude_categories=args.exclude_categories)
     logging.info('worked: {}'.format(complete))
@@ -47,6 +47,29 @@ def fix_resolution_cross_val(pc):
     c['pdbx_ls_cross_valid_method'] = 'FREE R-VALUE'
     b.set_pairs('_refine.', c, False)
 
+
+def add_xml_data_to_mmcif(pc, xml_data, software_row):
+    """
+    add data from an aimless XML file to an already parsed mmCIF file
+    :param pc: parsed cif_handling.mmcifHandling
+    :param xml_data: statistics dictionary from get_xml_data
+    :param software_row: aimless software row from get_xml_data
+    :return: True if there was data to add, False if not
+    """
+    if not xml_data:
+        return False
+    # add aimless data to the mmCIF file
+    ok = pc.addToCif(data_dictionary=xml_data)
+    fix_resolution_limits(pc)
+    fix_resolution_cross_val(pc)
+    # update the software list in the mmCIF file to add aimless
+    with pc.categoryUpdate() as update:
+        update.add_values(category='software', item_value_dictionary=software_row, ordinal_item='pdbx_ordinal')
+    # add exptl data
+    pc.addExptlToCif()
+    return True
+
+
 def run_process(xml_file, input_cif, output_cif):
     xml_data, software_row = get_xml_data(xml_file=xml_file)
     if xml_data:
@@ -54,16 +77,7 @@ def run_process(xml_file, input_cif, output_cif):
         if os.path.exists(input_cif):
             pc = mmcifHandling()
             pc.parse_mmcif(fileName=input_cif)
-            # add aimless data to the mmCIF file
-            ok = pc.addToCif(data_dictionary=xml_data)
-            fix_resolution_limits(pc)
-            fix_resolution_cross_val(pc)
-            # update the software list in the mmCIF file to add aimless
-            software_cat = pc.addValuesToCategory(category='software', item_value_dictionary=software_row,
-                                                  ordinal_item='pdbx_ordinal')
-            ok = pc.addToCif(data_dictionary=software_cat)
-            # add exptl data
-            pc.addExptlToCif()
+            add_xml_data_to_mmcif(pc=pc, xml_data=xml_data, software_row=software_row)
             # write out the resulting mmCIF file.
             pc.writeCif(fileName=output_cif)
             if os.path.exists(output_cif):
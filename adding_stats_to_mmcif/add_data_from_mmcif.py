@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 import argparse
+import fnmatch
 import logging
-from pprint import pprint
 
 from adding_stats_to_mmcif.cif_handling import mmcifHandling
 
@@ -9,26 +9,118 @@ logger = logging.getLogger()
 FORMAT = "%(filename)s - %(funcName)s - %(message)s"
 logging.basicConfig(format=FORMAT)
 
+# coordinates belong to the model the data is added to, so they are not copied from the other mmCIF by default
+DEFAULT_EXCLUDE_CATEGORIES = ['atom_site', 'atom_site_anisotrop']
+
+
+def category_matches(category, patterns):
+    """
+    :param category: mmCIF category, with or without the leading _ and trailing .
+    :param patterns: list of shell style patterns of category names, such as refine* or reflns_shell
+    :return: True if the category matches any of the patterns, mmCIF names are not case sensitive
+    """
+    name = category.strip('_.').lower()
+    return any(fnmatch.fnmatchcase(name, pattern.strip('_.').lower()) for pattern in patterns)
+
 
 class AddToMmcif:
 
-    def __init__(self):
+    def __init__(self, include_categories=None, exclude_categories=None):
+        """
+        :param include_categories: patterns of the categories to copy, all categories by default
+        :param exclude_categories: patterns of the categories not to copy, by default DEFAULT_EXCLUDE_CATEGORIES
+        """
         self.mmcif_data = dict()
         self.ch = mmcifHandling()
+        self.include_categories = include_categories
+        self.exclude_categories = DEFAULT_EXCLUDE_CATEGORIES if exclude_categories is None else exclude_categories
+
+    def is_category_selected(self, category):
+        """
+        :param category: mmCIF category
+        :return: True if the category is to be copied
+        """
+        if self.include_categories and not category_matches(category=category, patterns=self.include_categories):
+            return False
+        return not category_matches(category=category, patterns=self.exclude_categories)
+
+    def parse_mmcif(self, mmcif_file):
+        """
+        :param mmcif_file: mmCIF file to take the data from
+        :return: True if it was parsed, False if not
+        """
+        return self.ch.parse_mmcif(fileName=mmcif_file)
+
+    def get_category_sources(self):
+        """
+        categories are selected by name, so the values of the others are never read
+        :return: dictionary of selected category: position of the datablock it is taken from,
+        the last datablock with the category
+        """
+        category_sources = dict()
+        for position, datablock in enumerate(self.ch.getDatablocks()):
+            if self.ch.getDatablock(datablock=position):
+                for category in self.ch.getCategories():
+                    if self.is_category_selected(category=category):
+                        category_sources[category] = position
+                    else:
+                        logging.debug('not copying {}'.format(category))
+        return category_sources
 
     def get_data(self, mmcif_file):
-        if self.ch.parse_mmcif(fileName=mmcif_file):
-            for position, datablock in enumerate(self.ch.getDatablocks()):
-                if self.ch.getDatablock(datablock=position):
-                    for category in self.ch.getCategories():
-                        self.mmcif_data.update(self.ch.getCategory(category=category))
+        if self.parse_mmcif(mmcif_file=mmcif_file):
+            for category, position in self.get_category_sources().items():
+                self.ch.getDatablock(datablock=position)
+                self.mmcif_data.update(self.ch.getCategory(category=category))
 
         return self.mmcif_data
 
+    def copy_to_mmcif(self, mmcif):
+        """
+        add the selected categories of the parsed mmCIF file to another parsed mmCIF file.
+        Categories which are not in mmcif are copied whole by gemmi, only the rows of categories which are in both
+        are converted to Python to be merged
+        :param mmcif: parsed cif_handling.mmcifHandling to add the data to
+        :return: True if worked, False if failed
+        """
+        try:
+            current_categories = set(category.lower() for category in mmcif.getCategories())
+            data_dictionary = dict()
+            # datablock position: categories to copy from it
+            categories_to_copy = dict()
+            for category, position in self.get_category_sources().items():
+                if category.lower() in current_categories:
+                    self.ch.getDatablock(datablock=position)
+                    data_dictionary.update(self.ch.getCategory(category=category))
+                else:
+                    categories_to_copy.setdefault(position, []).append(category)
+            if data_dictionary and not mmcif.addToCif(data_dictionary=data_dictionary):
+                return False
+            for position in categories_to_copy:
+                self.ch.getDatablock(datablock=position)
+                mmcif.copyCategories(source=self.ch, categories=categories_to_copy[position])
+            return True
+        except Exception as e:
+            logging.error(e)
+            return False
+
+    def add_to_mmcif(self, mmcif, data_dictionary):
+        """
+        add data to an already parsed mmCIF file
+        :param mmcif: parsed cif_handling.mmcifHandling
+        :param data_dictionary: data from get_data
+        :return: True if worked, False if failed
+        """
+        try:
+            return mmcif.addToCif(data_dictionary=data_dictionary)
+        except Exception as e:
+            logging.error(e)
+            return False
+
     def add_to_cif(self, input_mmcif_file, output_mmcif_file, data_dictionary):
         try:
             self.ch.parse_mmcif(fileName=input_mmcif_file)
-            ret = self.ch.addToCif(data_dictionary=data_dictionary)
+            ret = self.add_to_mmcif(mmcif=self.ch, data_dictionary=data_dictionary)
             if ret:
                 self.ch.writeCif(fileName=output_mmcif_file)
                 return True
@@ -39,10 +131,17 @@ class AddToMmcif:
 
 
 if __name__ == '__main__':
+    from pprint import pprint
+
     parser = argparse.ArgumentParser()
     parser.add_argument('--input_data_mmcif', help='input mmcif file to get data from', type=str, required=True)
     parser.add_argument('--input_model_mmcif', help='mmcif file to add data to', type=str, required=True)
     parser.add_argument('--output_model_mmcif', help='mmcif file to add data to', type=str, required=True)
+    parser.add_argument('--include_categories', help='patterns of the categories to copy, such as refine*',
+                        type=str, nargs='+')
+    parser.add_argument('--exclude_categories', help='patterns of the categories not to copy, '
+                                                     'by default {}'.format(' '.join(DEFAULT_EXCLUDE_CATEGORIES)),
+                        type=str, nargs='*')
     parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
                         default=logging.INFO)
 
@@ -51,7 +150,7 @@ if __name__ == '__main__':
     logger.setLevel(args.loglevel)
 
     ret = False
-    gc = AddToMmcif()
+    gc = AddToMmcif(include_categories=args.include_categories, exclude_categories=args.exclude_categories)
     data = gc.get_data(args.input_data_mmcif)
     if data:
         pprint(data)
@@ -1,11 +1,16 @@
 #!/usr/bin/env python
 import argparse
+import asyncio
+import functools
 import logging
 import os
 
-from .cif_handling import mmcifHandling
+from .cif_handling import EncodedColumn, mmcifHandling
+from .compound_cache import get_compound_cache
+from .debug_logging import debug
 from .get_data_from_pdbe_api import GetSpecificDataFromPdbeAPI
-from .pairwise_align import SequenceAlign
+from .metrics import stage
+from .pairwise_align import SequenceIndex, get_alignment_engine, get_banded_alignment_engine
 from .process_fasta import ProcessFasta
 
 logger = logging.getLogger()
@@ -29,14 +34,19 @@ residue_map_3to1['U'] = 'U'
 
 class ExtractFromMmcif:
 
-    def __init__(self, ):
-        self.mm = mmcifHandling()
+    def __init__(self, mm=None, compound_cache=None, non_standard_residue_mapping=None):
+        self.mm = mm if mm else mmcifHandling()
+        self.compound_cache = compound_cache if compound_cache else get_compound_cache()
         self.sequence_dict = dict()
-        self.non_standard_residue_mapping = dict()
+        # one letter codes already resolved, for example by resolve_non_standard_residues_async
+        self.non_standard_residue_mapping = dict(non_standard_residue_mapping or {})
 
     def get_sequence_dict(self):
-        self.get_seq_of_polymer_entities()
-        self.get_data_from_atom_site()
+        with stage('compound_resolution'):
+            self.resolve_non_standard_residues()
+        with stage('sequence_extraction'):
+            self.get_seq_of_polymer_entities()
+            self.get_data_from_atom_site()
         return self.sequence_dict
 
     def parse_mmcif(self, mmcif_file):
@@ -52,7 +62,8 @@ class ExtractFromMmcif:
     def get_non_standard_one_letter(self, three_letter):
         """
         Return the one letter code for a non standard residue.
-        Checks the cache and then the PDBe API for the one letter code for a residue
+        Checks the cache, then the persistent compound cache and then the PDBe API for the one letter code
+        for a residue
 
         threeLetter = non standard residue three letter code
         returns the one letter code
@@ -60,19 +71,86 @@ class ExtractFromMmcif:
         if three_letter in self.non_standard_residue_mapping:
             one_letter = self.non_standard_residue_mapping[three_letter]
         else:
-            one_letter = GetSpecificDataFromPdbeAPI().get_one_letter_code_for_compound(compound=three_letter)
+            one_letter = self.compound_cache.get(three_letter)
+            if one_letter is None:
+                pdbe_api = GetSpecificDataFromPdbeAPI()
+                one_letter = pdbe_api.get_one_letter_code_for_compound(compound=three_letter)
+                if pdbe_api.lookup_worked:
+                    self.compound_cache.set(three_letter, one_letter)
             self.non_standard_residue_mapping[three_letter] = one_letter
         return one_letter
 
+    def get_compounds(self):
+        """
+        :return: set of the residue names used by entity_poly_seq and atom_site
+        """
+        compounds = set()
+        if self.mm:
+            compounds.update(self.mm.getCategoryValues('entity_poly_seq', item='mon_id'))
+            columns = self.mm.getCategoryArrays('atom_site', items=['label_comp_id', 'auth_comp_id'])
+            label_three_letters = columns.get('label_comp_id')
+            if label_three_letters:
+                compounds.update(label_three_letters.labels)
+            if 'auth_comp_id' in columns and (not label_three_letters or '' in label_three_letters.labels):
+                compounds.update(columns['auth_comp_id'].labels)
+        return compounds
+
+    def resolve_non_standard_residues(self):
+        """
+        Look up the one letter codes for all the non standard residues in the mmCIF at once.
+        Checks the persistent compound cache and then looks up the rest concurrently from the PDBe API
+        """
+        to_look_up = self.get_compounds_to_look_up()
+        if to_look_up:
+            logging.debug('looking up {} compounds from the PDBe API'.format(len(to_look_up)))
+            pdbe_api = GetSpecificDataFromPdbeAPI()
+            one_letter_codes = pdbe_api.get_one_letter_codes_for_compounds(compounds=to_look_up)
+            self.store_looked_up(one_letter_codes=one_letter_codes, failed_lookups=pdbe_api.failed_lookups)
+
+    async def resolve_non_standard_residues_async(self, executor=None):
+        """
+        as resolve_non_standard_residues, without blocking the event loop
+        :param executor: executor for reading the mmCIF and the compound cache, by default the event loop's
+        :return: dictionary of non standard residue: one letter code
+        """
+        loop = asyncio.get_running_loop()
+        to_look_up = await loop.run_in_executor(executor, self.get_compounds_to_look_up)
+        if to_look_up:
+            logging.debug('looking up {} compounds from the PDBe API'.format(len(to_look_up)))
+            pdbe_api = GetSpecificDataFromPdbeAPI()
+            one_letter_codes = await pdbe_api.get_one_letter_codes_for_compounds_async(compounds=to_look_up)
+            await loop.run_in_executor(executor, functools.partial(self.store_looked_up,
+                                                                   one_letter_codes=one_letter_codes,
+                                                                   failed_lookups=pdbe_api.failed_lookups))
+        return self.non_standard_residue_mapping
+
+    def get_compounds_to_look_up(self):
+        """
+        map the non standard residues found in the persistent compound cache
+        :return: list of the non standard residues which are not cached
+        """
+        compounds = [compound for compound in self.get_compounds() if compound
+                     and compound not in residue_map_3to1 and compound not in self.non_standard_residue_mapping]
+        if not compounds:
+            return []
+        cached = self.compound_cache.get_many(compounds)
+        self.non_standard_residue_mapping.update(cached)
+        return [compound for compound in compounds if compound not in cached]
+
+    def store_looked_up(self, one_letter_codes, failed_lookups):
+        """
+        :param one_letter_codes: dictionary of compound: one letter code from the PDBe API
+        :param failed_lookups: compounds without a definite answer, which are not cached
+        """
+        self.non_standard_residue_mapping.update(one_letter_codes)
+        self.compound_cache.set_many({compound: one_letter_codes[compound] for compound in one_letter_codes
+                                      if compound not in failed_lookups})
+
     def get_seq_of_polymer_entities(self):
         internal_dict = dict()
         if self.mm:
-            row_list = self.mm.getCategoryList('entity_poly_seq')
-            # logging.debug(row_list)
-            for row in row_list:
-                entity_id = row['entity_id']
-                three_letter = row['mon_id']
-                num = row['num']
+            rows = self.mm.getCategoryRows('entity_poly_seq', items=['entity_id', 'mon_id'])
+            for entity_id, three_letter in rows:
                 # not in use + breaks script when not in input:
                 # hetero = row['hetero']
 
@@ -80,7 +158,7 @@ class ExtractFromMmcif:
                 # if hetero == 'n': # hetero is used for a heterogen instead of microhet in refmac.
                 internal_dict.setdefault(entity_id, []).append(one_letter)
 
-        logging.debug('internal_dict: {}'.format(internal_dict))
+        debug('internal_dict: %s', internal_dict)
         for entity_id in internal_dict:
             sequence_list = internal_dict[entity_id]
             sequence = ''.join(sequence_list)
@@ -89,34 +167,55 @@ class ExtractFromMmcif:
                 self.sequence_dict[entity_id]['chains'] = []
 
     def get_data_from_atom_site(self):
+        import numpy as np
         atom_site_dict = dict()
         atom_site_sequence_dict = dict()
         if self.mm:
-            row_list = self.mm.getCategoryList('atom_site')
-            for row in row_list:
-                entity_id = row.get('label_entity_id')
-                chain_id = row.get('auth_asym_id')
-                auth_three_letter = row.get('auth_comp_id')
-                label_three_letter = row.get('label_comp_id')
-                three_letter = label_three_letter if label_three_letter else auth_three_letter
-                residue_number = row.get('auth_seq_id')
-                # ins_code = row['pdbx_PDB_ins_code']
-                # group_PDB = row['group_PDB']
-
-                if three_letter:
+            columns = self.mm.getCategoryArrays('atom_site', items=['label_entity_id', 'auth_asym_id', 'auth_comp_id',
+                                                                    'label_comp_id', 'auth_seq_id',
+                                                                    'pdbx_PDB_ins_code'])
+            number_of_atoms = len(next(iter(columns.values()))) if columns else 0
+            if number_of_atoms:
+                # items missing from atom_site are treated as a single None value
+                missing = EncodedColumn(codes=np.zeros(number_of_atoms, dtype=np.int32), labels=[None])
+                entity_ids = columns.get('label_entity_id', missing)
+                chain_ids = columns.get('auth_asym_id', missing)
+                auth_three_letters = columns.get('auth_comp_id', missing)
+                label_three_letters = columns.get('label_comp_id', missing)
+                residue_numbers = columns.get('auth_seq_id', missing)
+                insertion_codes = columns.get('pdbx_PDB_ins_code', missing)
+                residue_key_columns = (entity_ids, chain_ids, residue_numbers, insertion_codes)
+
+                # a residue starts wherever the residue key differs from the previous atom
+                new_residue = np.zeros(number_of_atoms, dtype=bool)
+                new_residue[0] = True
+                for column in residue_key_columns:
+                    new_residue[1:] |= column.codes[1:] != column.codes[:-1]
+                first_atoms = np.flatnonzero(new_residue)
+
+                # residues split by other residues, such as alternate conformations, are only counted once
+                seen_residues = set()
+                residue_keys = zip(*(column.codes[first_atoms].tolist() for column in residue_key_columns))
+                for atom, residue_key in zip(first_atoms.tolist(), residue_keys):
+                    if residue_key in seen_residues:
+                        continue
+                    seen_residues.add(residue_key)
+
+                    entity_id = entity_ids.label(atom)
+                    chain_id = chain_ids.label(atom)
+                    label_three_letter = label_three_letters.label(atom)
+                    three_letter = label_three_letter if label_three_letter else auth_three_letters.label(atom)
+                    residue_number = residue_numbers.label(atom)
+
+                    if not three_letter:
+                        raise ValueError('Unknown three letter code for residue {} {}'.format(chain_id,
+                                                                                               residue_number))
                     one_letter = self.get_one_letter_code(three_letter=three_letter)
+                    atom_site_sequence_dict.setdefault(entity_id, {}).setdefault(chain_id, []).append(one_letter)
+                    atom_site_dict.setdefault(entity_id, {}).setdefault(chain_id, []).append(residue_number)
 
-                    # logging.debug('{} {}{} {}'.format(entity_id, chain_id, residue_number, one_letter))
-                    atom_site_dict.setdefault(entity_id, {}).setdefault(chain_id, [])
-                    if residue_number not in atom_site_dict[entity_id][chain_id]:
-                        # logging.debug('new residue')
-                        atom_site_sequence_dict.setdefault(entity_id, {}).setdefault(chain_id, []).append(one_letter)
-                        atom_site_dict[entity_id][chain_id].append(residue_number)
-                else:
-                    raise 'Unknown three letter code for residue {} {}'.format(chain_id, residue_number)
-
-        logging.debug('atom site dict: {}'.format(atom_site_dict))
-        logging.debug('sequence dict: {}'.format(atom_site_sequence_dict))
+        debug('atom site dict: %s', atom_site_dict)
+        debug('sequence dict: %s', atom_site_sequence_dict)
         for entity_id in atom_site_sequence_dict:
             for chain_id in atom_site_sequence_dict[entity_id]:
                 if entity_id in self.sequence_dict:
@@ -134,9 +233,14 @@ class ExtractFromMmcif:
         self.mm.removeCategory(category=category)
 
     def add_to_mmcif(self, category, item_value_dict, ordinal=None):
-        category_dict = self.mm.addValuesToCategory(category=category, item_value_dictionary=item_value_dict,
-                                                    ordinal_item=ordinal)
-        self.mm.addToCif(category_dict)
+        with self.update_mmcif() as update:
+            return update.add_values(category=category, item_value_dictionary=item_value_dict, ordinal_item=ordinal)
+
+    def update_mmcif(self):
+        """
+        :return: CategoryUpdate to add rows to several categories, each category is written once on commit
+        """
+        return self.mm.categoryUpdate()
 
     def add_exptl(self):
         exptl_data = self.mm.addExptlToCif()
@@ -150,8 +254,28 @@ class ExtractFromMmcif:
 
 class AddSequenceToMmcif:
 
-    def __init__(self, input_mmcif, output_mmcif, fasta_file=None, input_sequence=None, input_chainids=None):
+    def __init__(self, input_mmcif, output_mmcif, fasta_file=None, input_sequence=None, input_chainids=None,
+                 mmcif_handling=None, alignment_engine=None, workers=1, chunk_size=None,
+                 non_standard_residue_mapping=None):
+        """
+        :param input_mmcif: input mmCIF file
+        :param output_mmcif: output mmCIF file
+        :param fasta_file: input FASTA file
+        :param input_sequence: input sequence in one letter format, instead of a FASTA file
+        :param input_chainids: comma separated list of chain ids for input_sequence
+        :param mmcif_handling: already parsed cif_handling.mmcifHandling, used instead of parsing input_mmcif
+        :param alignment_engine: pairwise_align.AlignmentEngine, by default the one shared by this process
+        :param workers: number of processes aligning sequences at the same time
+        :param chunk_size: number of alignments sent to a worker process at a time
+        :param non_standard_residue_mapping: one letter codes of non standard residues which are already resolved
+        """
         self.input_mmcif = input_mmcif
+        self.mmcif_handling = mmcif_handling
+        self.alignment_engine = alignment_engine if alignment_engine else get_alignment_engine()
+        self.sequence_index = None
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.non_standard_residue_mapping = non_standard_residue_mapping
         self.output_cif = output_mmcif
         self.fasta_file = fasta_file
         self.input_sequence = input_sequence
@@ -172,10 +296,11 @@ class AddSequenceToMmcif:
     def process_fasta(self):
         if self.fasta_file:
             pf = ProcessFasta(fasta_file=self.fasta_file)
-            pf.process_fasta_file()
+            with stage('fasta_parse'):
+                pf.process_fasta_file()
             self.input_sequence_dict = pf.get_sequence_dict()
             if self.input_sequence_dict:
-                logging.debug(self.input_sequence_dict)
+                debug('input sequences: %s', self.input_sequence_dict)
                 return True
         return False
 
@@ -186,58 +311,119 @@ class AddSequenceToMmcif:
             for chain in chain_ids:
                 self.input_sequence_dict[chain] = self.input_sequence
             if self.input_sequence_dict:
-                logging.debug(self.input_sequence_dict)
+                debug('input sequences: %s', self.input_sequence_dict)
                 return True
         return False
 
     def process_mmcif(self):
         logging.debug('processing {}'.format(self.input_mmcif))
-        if os.path.exists(self.input_mmcif):
-            self.mmcif = ExtractFromMmcif()
-            ok = self.mmcif.parse_mmcif(mmcif_file=self.input_mmcif)
+        if self.mmcif_handling:
+            self.mmcif = ExtractFromMmcif(mm=self.mmcif_handling,
+                                          non_standard_residue_mapping=self.non_standard_residue_mapping)
+            self.mmcif_sequence_dict = self.mmcif.get_sequence_dict()
+        elif os.path.exists(self.input_mmcif):
+            self.mmcif = ExtractFromMmcif(non_standard_residue_mapping=self.non_standard_residue_mapping)
+            with stage('mmcif_parse'):
+                ok = self.mmcif.parse_mmcif(mmcif_file=self.input_mmcif)
             if ok:
                 self.mmcif_sequence_dict = self.mmcif.get_sequence_dict()
-        logging.debug(self.mmcif_sequence_dict)
+        debug('mmcif sequences: %s', self.mmcif_sequence_dict)
         return self.mmcif_sequence_dict
 
+    def get_sequence_index(self):
+        input_sequences = list(self.input_sequence_dict.values())
+        if self.sequence_index is None or self.sequence_index.sequences != input_sequences:
+            self.sequence_index = SequenceIndex(sequences=input_sequences)
+        return self.sequence_index
+
     def get_best_match(self, mmcif_sequence):
-        best_score = 0
-        best_seq = None
-        for seq in self.input_sequence_dict:
-            test_sequence = self.input_sequence_dict[seq]
-            logging.debug(test_sequence)
-            if len(test_sequence) >= len(mmcif_sequence):
-                sa = SequenceAlign(sequence1=mmcif_sequence, sequence2=test_sequence)
-                aligned, error, score = sa.do_sequence_alignment()
-                if aligned:
+        return self.get_best_matches(mmcif_sequences=[mmcif_sequence])[0]
+
+    def get_best_matches(self, mmcif_sequences):
+        """
+        find the input sequence which best matches each mmCIF sequence. One worker skips input sequences
+        which cannot beat the best score so far, more workers align against all the input sequences in parallel
+        :param mmcif_sequences: list of one letter sequences
+        :return: list of (best input sequence or None, score), in the order of mmcif_sequences
+        """
+        best_matches = [(None, 0)] * len(mmcif_sequences)
+        sequences_to_align = list()
+        for position, mmcif_sequence in enumerate(mmcif_sequences):
+            # the observed sequence is usually the input sequence without its disordered ends
+            exact_score = self.alignment_engine.exact_match_score(query=mmcif_sequence)
+            if exact_score:
+                sequence_index = self.get_sequence_index()
+                match = sequence_index.find_substring(query=mmcif_sequence)
+                if match is not None and len(sequence_index.sequences[match]) >= len(mmcif_sequence):
+                    logging.debug('exact match to input sequence {}'.format(match))
+                    best_matches[position] = (sequence_index.sequences[match], exact_score)
+                    continue
+            sequences_to_align.append(position)
+
+        if self.workers <= 1:
+            sequence_index = self.get_sequence_index()
+            for position in sequences_to_align:
+                mmcif_sequence = mmcif_sequences[position]
+                candidates = [candidate for candidate, test_sequence in enumerate(sequence_index.sequences)
+                              if len(test_sequence) >= len(mmcif_sequence)]
+                match, score = self.alignment_engine.best_match(
+                    query=mmcif_sequence,
+                    targets=[sequence_index.sequences[candidate] for candidate in candidates],
+                    target_compositions=[sequence_index.compositions[candidate] for candidate in candidates])
+                if match is not None:
+                    best_matches[position] = (sequence_index.sequences[candidates[match]], score)
+            return best_matches
+
+        # mmCIF sequence x input sequence score matrix, flattened so it can be shared between workers
+        pairs = list()
+        for position in sequences_to_align:
+            mmcif_sequence = mmcif_sequences[position]
+            for test_sequence in self.input_sequence_dict.values():
+                if len(test_sequence) >= len(mmcif_sequence):
+                    pairs.append((mmcif_sequence, test_sequence))
+        scores = self.alignment_engine.score_pairs(pairs=pairs, workers=self.workers, chunk_size=self.chunk_size)
+
+        score_position = 0
+        for position in sequences_to_align:
+            best_score = 0
+            best_seq = None
+            mmcif_sequence = mmcif_sequences[position]
+            for test_sequence in self.input_sequence_dict.values():
+                if len(test_sequence) >= len(mmcif_sequence):
+                    score = scores[score_position]
+                    score_position += 1
                     if score > best_score:
                         best_seq = test_sequence
                         best_score = score
-        return best_seq, best_score
+            best_matches[position] = (best_seq, best_score)
+        return best_matches
 
     def match_sequences(self):
         mmcif_out = []
-        logging.debug('mmcif sequences: {}'.format(self.mmcif_sequence_dict))
-        logging.debug('input sequences: {}'.format(self.input_sequence_dict))
-        for entity_id in self.mmcif_sequence_dict:
-            if 'sequence' in self.mmcif_sequence_dict[entity_id]:
-                mmcif_sequence = self.mmcif_sequence_dict[entity_id]['sequence']
-                chain_ids = self.mmcif_sequence_dict[entity_id]['chains']
-                logging.debug(chain_ids)
-
-                matched_sequence, matched_score = self.get_best_match(mmcif_sequence=mmcif_sequence)
-                if matched_sequence:
-                    mmcif_out.append({'entity_id': entity_id,
-                                      'pdbx_seq_one_letter_code': matched_sequence,
-                                      'pdbx_strand_id': ','.join(chain_ids)})
+        debug('mmcif sequences: %s', self.mmcif_sequence_dict)
+        debug('input sequences: %s', self.input_sequence_dict)
+        entity_ids = [entity_id for entity_id in self.mmcif_sequence_dict
+                      if 'sequence' in self.mmcif_sequence_dict[entity_id]]
+        with stage('alignment'):
+            best_matches = self.get_best_matches(
+                mmcif_sequences=[self.mmcif_sequence_dict[entity_id]['sequence'] for entity_id in entity_ids])
+        for entity_id, (matched_sequence, matched_score) in zip(entity_ids, best_matches):
+            chain_ids = self.mmcif_sequence_dict[entity_id]['chains']
+            logging.debug(chain_ids)
+
+            if matched_sequence:
+                mmcif_out.append({'entity_id': entity_id,
+                                  'pdbx_seq_one_letter_code': matched_sequence,
+                                  'pdbx_strand_id': ','.join(chain_ids)})
 
         if mmcif_out:
-            logging.debug('adding data to mmcif: {}'.format(mmcif_out))
+            debug('adding data to mmcif: %s', mmcif_out)
             mmcif_dict = {'entity_poly': mmcif_out}
             # self.mmcif.remove_category(category='entity_poly')
             self.add_to_mmcif(mmcif_dict=mmcif_dict)
             self.add_exptl()
-            self.mmcif.write_mmcif(filename=self.output_cif)
+            with stage('write'):
+                self.mmcif.write_mmcif(filename=self.output_cif)
             if os.path.exists(self.output_cif):
                 return True
         else:
@@ -245,18 +431,19 @@ class AddSequenceToMmcif:
         return False
 
     def add_to_mmcif(self, mmcif_dict):
-        logging.debug(mmcif_dict)
-        for cat in mmcif_dict:
-            for row in mmcif_dict[cat]:
-                logging.debug(row)
-                self.mmcif.add_to_mmcif(category=cat, item_value_dict=row)
+        debug('mmcif dict: %s', mmcif_dict)
+        with self.mmcif.update_mmcif() as update:
+            for cat in mmcif_dict:
+                for row in mmcif_dict[cat]:
+                    debug('row: %s', row)
+                    update.add_values(category=cat, item_value_dictionary=row)
 
     def add_exptl(self):
         return self.mmcif.add_exptl()
 
     def process_data(self):
         self.process_input_sequences()
-        logging.debug(self.input_sequence_dict)
+        debug('input sequences: %s', self.input_sequence_dict)
         if not self.input_sequence_dict:
             logging.error('missing input sequence')
             return False
@@ -277,6 +464,8 @@ if __name__ == '__main__':
     parser.add_argument('--fasta_file', help='input fasta file', type=str)
     parser.add_argument('--sequence', help='input sequence in one letter format', type=str)
     parser.add_argument('--chain_ids', help='input chain ids in a comma separated list', type=str)
+    parser.add_argument('--workers', help='number of processes aligning sequences', type=int, default=1)
+    parser.add_argument('--banded', help='align long sequences in a band around the diagonal', action='store_true')
     parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
                         default=logging.INFO)
 
@@ -287,4 +476,7 @@ if __name__ == '__main__':
                                 output_mmcif=args.output_mmcif,
                                 fasta_file=args.fasta_file,
                                 input_sequence=args.sequence,
-                                input_chainids=args.chain_ids).process_data()
+                                input_chainids=args.chain_ids,
+                                workers=args.workers,
+                                alignment_engine=get_banded_alignment_engine() if args.banded else None
+                                ).process_data()
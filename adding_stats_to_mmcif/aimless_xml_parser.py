@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 import argparse
 import logging
-import pprint
 
+from .debug_logging import debug
 from .mmcif_dictionary_handling import SoftwareClassification
 from .xml_parsing import parse_xml
 
@@ -57,7 +57,7 @@ def split_on_separator(separator, value_to_split):
             value_list = value_to_split.split()
         else:
             value_list = value_to_split.split(separator)
-        logging.debug(value_list)
+        debug('values: %s', value_list)
     return value_list
 
 
@@ -145,9 +145,8 @@ class aimlessReport:
                     header_list = split_on_separator(separator=headers.attrib['separator'].text,
                                                      value_to_split=headers.text)
                     data = table.find('data').text
-                    logging.debug(data)
                     data_lines = data.strip().split('\n')
-                    logging.debug(data_lines)
+                    debug('data lines: %s', data_lines)
                     number_of_data_values = len(data_lines)
                     logging.debug('number of data items: %s' % number_of_data_values)
                     for instance, d in enumerate(data_lines):
@@ -193,6 +192,8 @@ class aimlessReport:
 
 
 if __name__ == '__main__':  # pragma: no cover
+    import pprint
+
     parser = argparse.ArgumentParser()
     parser.add_argument('--xml_file', help='input xml file', type=str, required=True)
     parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
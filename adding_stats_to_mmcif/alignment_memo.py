@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+import argparse
+import collections
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+# set to a file to keep alignment scores between runs, by default they are only kept in memory
+MEMO_FILE_ENV = 'ADDING_STATS_TO_MMCIF_ALIGNMENT_MEMO'
+DEFAULT_MAX_SIZE = 100000
+
+_alignment_memo = None
+
+
+def get_alignment_memo():
+    """
+    :return: the AlignmentMemo shared by everything in this process
+    """
+    global _alignment_memo
+    if _alignment_memo is None:
+        _alignment_memo = AlignmentMemo(memo_file=os.environ.get(MEMO_FILE_ENV))
+    return _alignment_memo
+
+
+def get_memo_key(parameters, query, target):
+    """
+    :param parameters: scoring parameters, alignment scores are only reused with the same parameters
+    :param query: one letter sequence without gaps
+    :param target: one letter sequence without gaps
+    :return: hash of the scoring parameters and the pair of sequences
+    """
+    key = '{}\n{}\n{}'.format(sorted(parameters.items()), query, target)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class AlignmentMemo:
+    """
+    least recently used memo of alignment scores, optionally kept on disk in SQLite
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, memo_file=None):
+        """
+        :param max_size: maximum number of scores kept in memory
+        :param memo_file: SQLite file to keep scores in between runs
+        """
+        self.max_size = max_size
+        self.memo_file = memo_file
+        self.scores = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.connection = None
+        self.connection_pid = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """
+        open the memo file, reopening it in a forked process
+        :return: True if the memo file is available, False if not
+        """
+        if not self.memo_file:
+            return False
+        if self.connection and self.connection_pid == os.getpid():
+            return True
+        try:
+            memo_dir = os.path.dirname(self.memo_file)
+            if memo_dir and not os.path.exists(memo_dir):
+                os.makedirs(memo_dir, exist_ok=True)
+            connection = sqlite3.connect(self.memo_file, timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL NOT NULL)')
+            connection.commit()
+        except (OSError, sqlite3.Error) as e:
+            logging.warning('unable to use alignment memo {}: {}'.format(self.memo_file, e))
+            self.memo_file = None
+            return False
+        self.connection = connection
+        self.connection_pid = os.getpid()
+        return True
+
+    def remember(self, key, score):
+        self.scores[key] = score
+        self.scores.move_to_end(key)
+        while len(self.scores) > self.max_size:
+            self.scores.popitem(last=False)
+
+    def get(self, key):
+        """
+        :param key: key from get_memo_key
+        :return: memoised score, or None if the pair has not been scored
+        """
+        with self.lock:
+            score = self.scores.get(key)
+            if score is None and self.connect():
+                try:
+                    row = self.connection.execute('SELECT score FROM scores WHERE key = ?', (key,)).fetchone()
+                except sqlite3.Error as e:
+                    logging.warning('unable to read alignment memo: {}'.format(e))
+                    row = None
+                if row:
+                    score = row[0]
+            if score is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.remember(key=key, score=score)
+            return score
+
+    def set(self, key, score):
+        """
+        :param key: key from get_memo_key
+        :param score: alignment score
+        """
+        with self.lock:
+            self.remember(key=key, score=score)
+            if self.connect():
+                try:
+                    with self.connection:
+                        self.connection.execute('INSERT OR REPLACE INTO scores VALUES (?, ?)', (key, score))
+                except sqlite3.Error as e:
+                    logging.warning('unable to write to alignment memo: {}'.format(e))
+
+    def get_stats(self):
+        """
+        :return: dictionary of hits, misses and the number of scores in memory
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.scores)}
+
+    def clear(self):
+        """
+        forget the scores in memory and reset the counters, scores on disk are kept
+        """
+        with self.lock:
+            self.scores.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--memo_file', help='SQLite file of alignment scores', type=str, required=True)
+    parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
+                        default=logging.INFO)
+    args = parser.parse_args()
+
+    logger.setLevel(args.loglevel)
+
+    am = AlignmentMemo(memo_file=args.memo_file)
+    if am.connect():
+        logging.info('scores: {}'.format(am.connection.execute('SELECT COUNT(*) FROM scores').fetchone()[0]))
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+from adding_stats_to_mmcif import run_process, __version__
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+# manifest columns, which are the arguments of run_process
+MANIFEST_COLUMNS = ['input_mmcif', 'output_mmcif', 'fasta_file', 'xml_file', 'input_mmcif_to_get_data_from']
+REQUIRED_COLUMNS = ['input_mmcif', 'output_mmcif']
+# manifest columns which are input files, their contents are part of the entry hash
+INPUT_COLUMNS = ['input_mmcif', 'fasta_file', 'xml_file', 'input_mmcif_to_get_data_from']
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def read_manifest(manifest_file):
+    """
+    read a CSV manifest with a header row, or a JSON manifest holding a list of objects
+    :param manifest_file: manifest of entries to process, with the columns in MANIFEST_COLUMNS
+    :return: list of entry dictionaries
+    """
+    with open(manifest_file) as in_file:
+        if manifest_file.lower().endswith('.json'):
+            rows = json.load(in_file)
+        else:
+            rows = list(csv.DictReader(in_file))
+
+    entries = list()
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            entries.append(get_entry(row))
+        except ValueError as e:
+            raise ValueError('entry {} of {}: {}'.format(row_number, manifest_file, e))
+    return entries
+
+
+def get_entry(row):
+    """
+    :param row: dictionary with the columns in MANIFEST_COLUMNS, others are ignored
+    :return: entry dictionary of the arguments of run_process
+    """
+    if not isinstance(row, dict):
+        raise ValueError('expected an object of {}'.format(', '.join(MANIFEST_COLUMNS)))
+    entry = {column: row.get(column) or None for column in MANIFEST_COLUMNS}
+    missing = [column for column in REQUIRED_COLUMNS if not entry[column]]
+    if missing:
+        raise ValueError('no {}'.format(', '.join(missing)))
+    return entry
+
+
+def get_file_hash(file_name):
+    """
+    :param file_name: file to hash
+    :return: sha256 of the file contents, or None if the file cannot be read
+    """
+    file_hash = hashlib.sha256()
+    try:
+        with open(file_name, 'rb') as in_file:
+            for block in iter(lambda: in_file.read(HASH_BLOCK_SIZE), b''):
+                file_hash.update(block)
+    except OSError:
+        return None
+    return file_hash.hexdigest()
+
+
+def get_run_hash(banded=False, include_categories=None, exclude_categories=None):
+    """
+    :param banded: align long sequences in a band around the diagonal
+    :param include_categories: patterns of the categories to copy from input_mmcif_to_get_data_from
+    :param exclude_categories: patterns of the categories not to copy from input_mmcif_to_get_data_from
+    :return: hash of everything besides the input files which changes the output:
+    the package version, the software classification, the alignment scoring parameters
+    and the options of run_process
+    """
+    from adding_stats_to_mmcif.add_data_from_mmcif import AddToMmcif
+    from adding_stats_to_mmcif.mmcif_dictionary_handling import SOFTWARE_JSON_FILE
+    from adding_stats_to_mmcif.pairwise_align import get_alignment_engine, get_banded_alignment_engine
+
+    engine = get_banded_alignment_engine() if banded else get_alignment_engine()
+    # the categories actually copied, so a change to the default selection is noticed too
+    selection = AddToMmcif(include_categories=include_categories, exclude_categories=exclude_categories)
+    run = {'version': __version__,
+           'software_classification': get_file_hash(SOFTWARE_JSON_FILE),
+           'scoring': dict(engine.memo_parameters, **engine.parameters),
+           'banded': banded,
+           'include_categories': selection.include_categories,
+           'exclude_categories': selection.exclude_categories}
+    return hashlib.sha256(json.dumps(run, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_entry_hash(entry, run_hash):
+    """
+    :param entry: entry dictionary from read_manifest
+    :param run_hash: hash from get_run_hash
+    :return: hash of the entry, the contents of its input files and the run
+    """
+    inputs = {'entry': entry, 'run': run_hash}
+    for column in INPUT_COLUMNS:
+        if entry[column]:
+            inputs[column] = get_file_hash(entry[column])
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def read_state(state_file):
+    """
+    :param state_file: JSON lines file of completed entries written by run_batch
+    :return: dictionary of output mmCIF: last recorded state
+    """
+    state = dict()
+    if not state_file or not os.path.exists(state_file):
+        return state
+    with open(state_file) as in_file:
+        for line in in_file:
+            try:
+                record = json.loads(line)
+                state[record['output_mmcif']] = record
+            except (ValueError, KeyError, TypeError):
+                # a run which died while writing leaves a partial last line
+                logging.warning('ignoring bad line in {}'.format(state_file))
+    return state
+
+
+def is_up_to_date(entry, entry_hash, state):
+    """
+    :param entry: entry dictionary from read_manifest
+    :param entry_hash: hash from get_entry_hash
+    :param state: dictionary from read_state
+    :return: True if the entry worked with the same inputs and its output is unchanged since
+    """
+    record = state.get(entry['output_mmcif'])
+    if not record or record.get('entry_hash') != entry_hash or not record.get('output_hash'):
+        return False
+    return get_file_hash(entry['output_mmcif']) == record['output_hash']
+
+
+def warm_caches():
+    """
+    import the slow modules and open the shared caches, so that each entry only pays for its own work
+    """
+    from gemmi import cif  # noqa: F401
+    from adding_stats_to_mmcif.ccd_index import get_ccd_index
+    from adding_stats_to_mmcif.compound_cache import get_compound_cache
+    from adding_stats_to_mmcif.mmcif_dictionary_handling import get_software_dictionary
+    from adding_stats_to_mmcif.pairwise_align import get_alignment_engine
+
+    get_software_dictionary()
+    get_compound_cache().connect()
+    get_ccd_index()
+    get_alignment_engine().aligner
+
+
+def init_worker(loglevel):
+    """
+    set up a batch worker process
+    :param loglevel: logging level of the worker
+    """
+    logger.setLevel(loglevel)
+    warm_caches()
+
+
+def process_entry(entry, workers=1, banded=False, metrics_file=None, include_categories=None,
+                  exclude_categories=None):
+    """
+    :param entry: entry dictionary from read_manifest
+    :param workers: number of processes aligning sequences for the entry
+    :param banded: align long sequences in a band around the diagonal
+    :param metrics_file: file to append the time and memory used by each stage of the entry to
+    :param include_categories: patterns of the categories to copy from input_mmcif_to_get_data_from
+    :param exclude_categories: patterns of the categories not to copy from input_mmcif_to_get_data_from
+    :return: dictionary of the entry, whether it worked, the error if it failed, the time taken
+    and the hash of the output file
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        worked = run_process(workers=workers, banded=banded, metrics_file=metrics_file,
+                             include_categories=include_categories, exclude_categories=exclude_categories, **entry)
+        if not worked:
+            error = 'processing failed'
+    except Exception as e:
+        logging.exception('{} failed'.format(entry['input_mmcif']))
+        worked = False
+        error = '{}: {}'.format(type(e).__name__, e)
+    return {'entry': entry, 'worked': bool(worked), 'error': error, 'seconds': time.perf_counter() - start,
+            'output_hash': get_file_hash(entry['output_mmcif']) if worked else None}
+
+
+def run_batch(entries, workers=1, align_workers=1, banded=False, state_file=None, force=False, metrics_file=None,
+              include_categories=None, exclude_categories=None):
+    """
+    process the entries of a manifest, on a pool of worker processes when workers is more than 1.
+    With a state file, entries which worked with the same inputs, version, scoring parameters and options before,
+    and whose output is unchanged, are skipped
+    :param entries: list of entry dictionaries from read_manifest
+    :param workers: number of entries processed at the same time
+    :param align_workers: number of processes aligning sequences for each entry
+    :param banded: align long sequences in a band around the diagonal
+    :param state_file: JSON lines file recording the hash of each completed entry
+    :param force: process every entry, even if it is up to date
+    :param metrics_file: file to append the time and memory used by each stage of each entry to
+    :param include_categories: patterns of the categories to copy from input_mmcif_to_get_data_from
+    :param exclude_categories: patterns of the categories not to copy from input_mmcif_to_get_data_from
+    :return: list of results from process_entry, in manifest order
+    """
+    results = [None] * len(entries)
+    entry_hashes = [None] * len(entries)
+    to_process = list(range(len(entries)))
+
+    if state_file:
+        run_hash = get_run_hash(banded=banded, include_categories=include_categories,
+                                exclude_categories=exclude_categories)
+        state = read_state(state_file=state_file) if not force else dict()
+        to_process = list()
+        for position, entry in enumerate(entries):
+            entry_hashes[position] = get_entry_hash(entry=entry, run_hash=run_hash)
+            if is_up_to_date(entry=entry, entry_hash=entry_hashes[position], state=state):
+                results[position] = {'entry': entry, 'worked': True, 'error': None, 'seconds': 0.0,
+                                     'output_hash': state[entry['output_mmcif']]['output_hash'], 'skipped': True}
+            else:
+                to_process.append(position)
+        logging.info('{} of {} entries are up to date'.format(len(entries) - len(to_process), len(entries)))
+        state_dir = os.path.dirname(state_file)
+        if state_dir and not os.path.exists(state_dir):
+            os.makedirs(state_dir, exist_ok=True)
+        state_out = open(state_file, 'a')
+    else:
+        state_out = None
+
+    def report(position, result):
+        result['skipped'] = False
+        results[position] = result
+        logging.info('{} {}/{} {}{}'.format('worked' if result['worked'] else 'FAILED', position + 1, len(entries),
+                                           result['entry']['input_mmcif'],
+                                           ': {}'.format(result['error']) if result['error'] else ''))
+        if state_out:
+            # written as each entry completes, so a run which dies can be resumed
+            state_out.write(json.dumps({'output_mmcif': result['entry']['output_mmcif'],
+                                        'entry_hash': entry_hashes[position],
+                                        'output_hash': result.get('output_hash')}) + '\n')
+            state_out.flush()
+
+    try:
+        if workers <= 1 or len(to_process) <= 1:
+            if to_process:
+                warm_caches()
+            for position in to_process:
+                report(position, process_entry(entry=entries[position], workers=align_workers, banded=banded,
+                                               metrics_file=metrics_file, include_categories=include_categories,
+                                               exclude_categories=exclude_categories))
+            return results
+
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(to_process)), initializer=init_worker,
+                                 initargs=(logger.level,)) as executor:
+            futures = {executor.submit(process_entry, entries[position], align_workers, banded, metrics_file,
+                                       include_categories, exclude_categories): position
+                       for position in to_process}
+            for future in as_completed(futures):
+                position = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # the worker died, for example it ran out of memory
+                    result = {'entry': entries[position], 'worked': False,
+                              'error': '{}: {}'.format(type(e).__name__, e), 'seconds': None, 'output_hash': None}
+                report(position, result)
+        return results
+    finally:
+        if state_out:
+            state_out.close()
+
+
+def write_report(results, report_file):
+    """
+    :param results: list of results from run_batch
+    :param report_file: JSON file to write the results to
+    """
+    report_dir = os.path.dirname(report_file)
+    if report_dir and not os.path.exists(report_dir):
+        os.makedirs(report_dir, exist_ok=True)
+    with open(report_file, 'w') as out_file:
+        json.dump(results, out_file, indent=2)
+
+
+def main(arguments=None):
+    """
+    :param arguments: command line arguments, by default sys.argv
+    :return: exit code, 0 if every entry worked, 1 if any failed
+    """
+    parser = argparse.ArgumentParser(prog='adding_stats_to_mmcif batch',
+                                     description='process every entry of a CSV or JSON manifest with columns {}'.format(
+                                         ', '.join(MANIFEST_COLUMNS)))
+    parser.add_argument('--manifest', help='CSV or JSON manifest of entries', type=str, required=True)
+    parser.add_argument('--workers', help='number of entries processed at the same time', type=int,
+                        default=os.cpu_count() or 1)
+    parser.add_argument('--align_workers', help='number of processes aligning sequences for each entry', type=int,
+                        default=1)
+    parser.add_argument('--banded', help='align long sequences in a band around the diagonal', action='store_true')
+    parser.add_argument('--include_categories', help='patterns of the categories to copy from '
+                                                     'input_mmcif_to_get_data_from, such as refine*',
+                        type=str, nargs='+')
+    parser.add_argument('--exclude_categories', help='patterns of the categories not to copy from '
+                                                     'input_mmcif_to_get_data_from, by default the coordinates',
+                        type=str, nargs='*')
+    parser.add_argument('--report', help='JSON file to write the result of each entry to', type=str)
+    parser.add_argument('--state_file', help='file recording completed entries, so an interrupted or repeated run '
+                                             'skips entries which are up to date. Default: the manifest with .state',
+                        type=str)
+    parser.add_argument('--force', help='process every entry, even if it is up to date', action='store_true')
+    parser.add_argument('--metrics', help='file to append the time and memory used by each stage of each entry to '
+                                          'as JSON', type=str)
+    parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
+                        default=logging.INFO)
+
+    args = parser.parse_args(arguments)
+    logger.setLevel(args.loglevel)
+
+    try:
+        entries = read_manifest(manifest_file=args.manifest)
+    except (OSError, ValueError) as e:
+        logging.error('unable to read manifest: {}'.format(e))
+        return 1
+
+    state_file = args.state_file if args.state_file else '{}.state'.format(args.manifest)
+    results = run_batch(entries=entries, workers=args.workers, align_workers=args.align_workers, banded=args.banded,
+                        state_file=state_file, force=args.force, metrics_file=args.metrics,
+                        include_categories=args.include_categories, exclude_categories=args.exclude_categories)
+    if args.report:
+        write_report(results=results, report_file=args.report)
+
+    failed = [result for result in results if not result['worked']]
+    skipped = [result for result in results if result['skipped']]
+    logging.info('{} of {} entries worked, {} of them up to date, {} failed'.format(
+        len(results) - len(failed), len(results), len(skipped), len(failed)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+import argparse
+import bisect
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from adding_stats_to_mmcif.compound_cache import get_cache_dir
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+# set to the index file compiled from components.cif, or to an empty string to turn the index off
+CCD_INDEX_ENV = 'ADDING_STATS_TO_MMCIF_CCD_INDEX'
+CCD_INDEX_FILE_NAME = 'components.idx'
+
+# header: magic and number of records. Records: compound id, one letter code, parent compound id
+INDEX_MAGIC = b'CCDIDX01'
+HEADER = struct.Struct('<8sI')
+RECORD = struct.Struct('<8s1s8s')
+# longest compound id which fits in a record
+MAX_COMPOUND_LENGTH = 8
+
+_ccd_index = None
+_ccd_index_lock = threading.Lock()
+
+
+def get_ccd_index_file():
+    """
+    :return: index file from ADDING_STATS_TO_MMCIF_CCD_INDEX, otherwise components.idx in the cache directory
+    """
+    index_file = os.environ.get(CCD_INDEX_ENV)
+    if index_file is None:
+        cache_dir = get_cache_dir()
+        index_file = os.path.join(cache_dir, CCD_INDEX_FILE_NAME) if cache_dir else ''
+    return index_file
+
+
+def get_ccd_index():
+    """
+    :return: the CcdIndex shared by everything in this process, or None if there is no index file
+    """
+    global _ccd_index
+    with _ccd_index_lock:
+        if _ccd_index is None:
+            _ccd_index = CcdIndex(index_file=get_ccd_index_file())
+    if _ccd_index.is_available():
+        return _ccd_index
+    return None
+
+
+def cif_value(value):
+    """
+    :param value: single value from a cif file
+    :return: value without quotes, None for ? and .
+    """
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '\'"':
+        value = value[1:-1]
+    if value in ('?', '.', ''):
+        return None
+    return value
+
+
+def read_chem_comps(components_cif):
+    """
+    stream the chem_comp category out of the Chemical Component Dictionary, without parsing the whole file
+    :param components_cif: components.cif file
+    :return: generator of (compound id, one letter code, parent compound id)
+    """
+    wanted = {'_chem_comp.id': 'id',
+              '_chem_comp.one_letter_code': 'one_letter_code',
+              '_chem_comp.mon_nstd_parent_comp_id': 'parent'}
+    chem_comp = dict()
+    pending_tag = None
+    with open(components_cif) as in_file:
+        for line in in_file:
+            if line.startswith('data_'):
+                if chem_comp.get('id'):
+                    yield chem_comp['id'], chem_comp.get('one_letter_code'), chem_comp.get('parent')
+                chem_comp = dict()
+                pending_tag = None
+            elif pending_tag:
+                # long values are on the line after the tag
+                if not line.startswith(';'):
+                    chem_comp[pending_tag] = cif_value(line)
+                pending_tag = None
+            elif line.startswith('_chem_comp.'):
+                tag_value = line.split(None, 1)
+                if tag_value[0] in wanted:
+                    if len(tag_value) == 2:
+                        chem_comp[wanted[tag_value[0]]] = cif_value(tag_value[1])
+                    else:
+                        pending_tag = wanted[tag_value[0]]
+    if chem_comp.get('id'):
+        yield chem_comp['id'], chem_comp.get('one_letter_code'), chem_comp.get('parent')
+
+
+def build_ccd_index(components_cif, index_file=None):
+    """
+    compile components.cif into a sorted fixed width index which can be memory mapped
+    :param components_cif: components.cif file from the wwPDB
+    :param index_file: output index file, by default the one from get_ccd_index_file
+    :return: number of compounds in the index
+    """
+    if index_file is None:
+        index_file = get_ccd_index_file()
+    records = dict()
+    for compound, one_letter_code, parent in read_chem_comps(components_cif=components_cif):
+        compound = compound.upper()
+        if len(compound) > MAX_COMPOUND_LENGTH:
+            logging.warning('compound id too long for the index: {}'.format(compound))
+            continue
+        if one_letter_code and len(one_letter_code) != 1:
+            one_letter_code = None
+        # modified residues can have more than one parent, only a single parent gives a one letter code
+        if parent and (',' in parent or len(parent) > MAX_COMPOUND_LENGTH):
+            parent = None
+        records[compound] = (one_letter_code, parent.upper() if parent else None)
+
+    index_dir = os.path.dirname(index_file)
+    if index_dir and not os.path.exists(index_dir):
+        os.makedirs(index_dir, exist_ok=True)
+    temp_file = '{}.{}.tmp'.format(index_file, os.getpid())
+    with open(temp_file, 'wb') as out_file:
+        out_file.write(HEADER.pack(INDEX_MAGIC, len(records)))
+        for compound in sorted(records):
+            one_letter_code, parent = records[compound]
+            out_file.write(RECORD.pack(compound.encode('ascii'),
+                                       (one_letter_code or '').encode('ascii'),
+                                       (parent or '').encode('ascii')))
+    # readers never see a half written index
+    os.replace(temp_file, index_file)
+    logging.info('{} compounds indexed in {}'.format(len(records), index_file))
+    return len(records)
+
+
+class CcdIndex:
+    """
+    read only, memory mapped lookup of one letter codes compiled from the Chemical Component Dictionary
+    """
+
+    def __init__(self, index_file):
+        """
+        :param index_file: index file written by build_ccd_index
+        """
+        self.index_file = index_file
+        self.index = None
+        self.number_of_records = 0
+        self.opened = False
+
+    def open(self):
+        """
+        map the index file into memory
+        :return: True if the index is available, False if not
+        """
+        if self.opened:
+            return self.index is not None
+        self.opened = True
+        if not self.index_file or not os.path.exists(self.index_file):
+            return False
+        try:
+            with open(self.index_file, 'rb') as in_file:
+                index = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, number_of_records = HEADER.unpack_from(index, 0)
+        except (OSError, ValueError, struct.error) as e:
+            logging.warning('unable to use CCD index {}: {}'.format(self.index_file, e))
+            return False
+        if magic != INDEX_MAGIC or len(index) != HEADER.size + number_of_records * RECORD.size:
+            logging.warning('{} is not a CCD index'.format(self.index_file))
+            index.close()
+            return False
+        self.index = index
+        self.number_of_records = number_of_records
+        return True
+
+    def is_available(self):
+        return self.open()
+
+    def __len__(self):
+        return self.number_of_records if self.open() else 0
+
+    def __getitem__(self, position):
+        # sequence of compound ids, so bisect can search the mapped file directly
+        start = HEADER.size + position * RECORD.size
+        return self.index[start:start + MAX_COMPOUND_LENGTH]
+
+    def get_record(self, compound):
+        """
+        :param compound: chemical component id
+        :return: (one letter code, parent compound id) or None if the compound is not in the index
+        """
+        # longer ids are not in the index, cutting them short could match a different compound
+        if not compound or len(compound) > MAX_COMPOUND_LENGTH or not self.open():
+            return None
+        key = RECORD.pack(compound.upper().encode('ascii', 'replace'), b'', b'')[:MAX_COMPOUND_LENGTH]
+        position = bisect.bisect_left(self, key, 0, self.number_of_records)
+        if position == self.number_of_records or self[position] != key:
+            return None
+        _, one_letter_code, parent = RECORD.unpack_from(self.index, HEADER.size + position * RECORD.size)
+        return one_letter_code.rstrip(b'\x00').decode('ascii') or None, parent.rstrip(b'\x00').decode('ascii') or None
+
+    def get_one_letter_code(self, compound):
+        """
+        :param compound: chemical component id
+        :return: one letter code, from the parent compound if there is none, 'X' if neither has one.
+        None if the compound is not in the index
+        """
+        record = self.get_record(compound=compound)
+        if record is None:
+            return None
+        one_letter_code, parent = record
+        if not one_letter_code and parent:
+            parent_record = self.get_record(compound=parent)
+            if parent_record:
+                one_letter_code = parent_record[0]
+        return one_letter_code or 'X'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--components_cif', help='components.cif to compile into the index', type=str)
+    parser.add_argument('--index_file', help='CCD index file', type=str)
+    parser.add_argument('--compound', help='compound to look up in the index', type=str)
+    parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
+                        default=logging.INFO)
+    args = parser.parse_args()
+
+    logger.setLevel(args.loglevel)
+
+    index_file = args.index_file if args.index_file else get_ccd_index_file()
+    if args.components_cif:
+        build_ccd_index(components_cif=args.components_cif, index_file=index_file)
+    if args.compound:
+        logging.info('{}: {}'.format(args.compound, CcdIndex(index_file=index_file).get_one_letter_code(args.compound)))
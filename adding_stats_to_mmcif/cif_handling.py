@@ -2,11 +2,44 @@
 import argparse
 import logging
 
+from .debug_logging import debug
 from .gemmi_cif_handling import mmcifHandling as gemmi_cif_handling
 
 logger = logging.getLogger()
 
 
+class EncodedColumn:
+    """
+    dictionary encoded string column.
+    codes is a numpy array of positions in labels, labels are in order of first appearance
+    """
+
+    def __init__(self, codes, labels):
+        self.codes = codes
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.codes)
+
+    def label(self, position):
+        return self.labels[self.codes[position]]
+
+    def decode(self):
+        return [self.labels[code] for code in self.codes]
+
+
+def encode_column(values):
+    """
+    dictionary encode strings
+    :param values: list or iterator of strings
+    :return: EncodedColumn
+    """
+    import numpy as np
+    index = dict()
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values), dtype=np.int32)
+    return EncodedColumn(codes=codes, labels=list(index))
+
+
 class mmcifHandling:
     def __init__(self):
         self.cif_handling = gemmi_cif_handling()
@@ -43,35 +76,100 @@ class mmcifHandling:
     def getCategory(self, category):
         return self.cif_handling.getCategory(category=category)
 
+    def getCategoryColumns(self, category, items=None):
+        return self.cif_handling.getCategoryColumns(category=category, items=items)
+
+    def getCategoryItems(self, category):
+        return self.cif_handling.getCategoryItems(category=category)
+
+    def getCategoryRows(self, category, items):
+        """
+        stream the rows of a category
+        :param category: mmCIF category
+        :param items: list of items to return for each row
+        :return: generator of tuples of values in the order of items, None for items missing from the category
+        """
+        return self.cif_handling.iterCategoryRows(category=category, items=items)
+
+    def getCategoryValues(self, category, item):
+        return (row[0] for row in self.getCategoryRows(category=category, items=[item]))
+
+    def getCategoryArrays(self, category, items, dtypes=None):
+        """
+        return selected columns of a category as numpy arrays
+        :param category: mmCIF category
+        :param items: list of items to return
+        :param dtypes: dictionary of item: numpy dtype for numeric items, all other items are dictionary encoded
+        :return: dictionary of item: numpy array or EncodedColumn. Items missing from the category are left out
+        """
+        import numpy as np
+        dtypes = dtypes if dtypes else dict()
+        arrays = dict()
+        category_items = self.getCategoryItems(category=category)
+        for item in items:
+            if item not in category_items:
+                continue
+            if item in dtypes:
+                try:
+                    arrays[item] = np.fromiter(self.getCategoryValues(category=category, item=item),
+                                               dtype=dtypes[item])
+                    continue
+                except ValueError as e:
+                    logging.warning('unable to convert {} to {}, dictionary encoding it: {}'.format(item, dtypes[item],
+                                                                                                  e))
+            arrays[item] = encode_column(self.getCategoryValues(category=category, item=item))
+        return arrays
+
     def getCategoryList(self, category):
         return self.cif_handling.getCategoryAsList(category=category)
 
     def setCategory(self, category, item_value_dict):
         self.cif_handling.setCategory(category=category, item_value_dict=item_value_dict)
 
+    def copyCategory(self, source, category):
+        """
+        copy a whole category from the current datablock of another mmcifHandling without converting its values
+        :param source: parsed mmcifHandling to copy from
+        :param category: mmCIF category, replaced if it is already in this mmCIF
+        :return: True if the category was copied, False if it is not in source
+        """
+        return self.cif_handling.copyCategory(source_block=source.cif_handling.datablock, category=category)
+
+    def copyCategories(self, source, categories):
+        """
+        copy whole categories from the current datablock of another mmcifHandling without converting their values
+        :param source: parsed mmcifHandling to copy from
+        :param categories: list of mmCIF categories, replaced if they are already in this mmCIF
+        :return: list of the categories copied
+        """
+        return self.cif_handling.copyCategories(source_block=source.cif_handling.datablock, categories=categories)
+
     def removeCategory(self, category):
         self.setCategory(category=category, item_value_dict={})
 
     def writeCif(self, fileName):
         self.cif_handling.writeCif(fileName=fileName)
 
+    def categoryUpdate(self):
+        """
+        :return: CategoryUpdate, which writes each category it changes once when committed
+        """
+        return CategoryUpdate(mmcif_handling=self)
+
     def addToCif(self, data_dictionary):
-        logging.debug(data_dictionary)
+        debug('data dictionary: %s', data_dictionary)
         if self.cif_handling.datablock:
             try:
+                update = self.categoryUpdate()
                 if data_dictionary:
                     for category in data_dictionary:
                         logging.debug(category)
                         item_value_dict = data_dictionary[category]
-                        logging.debug('item value dict {}'.format(item_value_dict))
-                        cat_item_value_dict = self.addValuesToCategory(category=category,
-                                                                       item_value_dictionary=item_value_dict)
-                        logging.debug('cat item dict {}'.format(cat_item_value_dict))
-                        category = self.prepareCategory(category=category)
-                        if cat_item_value_dict:
-                            self.setCategory(category, cat_item_value_dict[category])
-                        else:
+                        debug('item value dict %s', item_value_dict)
+                        if not update.add_values(category=category, item_value_dictionary=item_value_dict):
+                            update.rollback()
                             return False
+                update.commit()
                 return True
             except Exception as e:
                 logging.error(e)
@@ -88,50 +186,22 @@ class mmcifHandling:
         return current_values
 
     def addValuesToCategory(self, category, item_value_dictionary, ordinal_item=None):
+        """
+        :param category: mmCIF category
+        :param item_value_dictionary: dictionary of item: value or list of values to add
+        :param ordinal_item: item numbered from the current rows when it is not in item_value_dictionary
+        :return: dictionary of category: dictionary of item: list of values with the values added,
+        which is not written to the mmCIF. Empty if the values could not be added
+        """
         logging.debug('addValuesToCategory')
         category = self.prepareCategory(category=category)
         current_values = self.getCategory(category=category)
-        num_new_values = 0
-        num_current_values = 0
-        for key in item_value_dictionary:
-            num_new_values = len(self.check_string_list(item_value_dictionary[key]))
-        if current_values:
-            if category in current_values:
-                logging.debug(current_values)
-                current_mmcif_items = current_values[category].keys()
-                new_mmcif_items = item_value_dictionary.keys()
-                for mmcif_item in current_values[category]:
-                    num_current_values = len(current_values[category][mmcif_item])
-                if set(current_mmcif_items) & set(new_mmcif_items):
-                    logging.debug('overlap between input and output category')
-                    for mmcif_item in current_values[category]:
-                        num_current_items = len(current_values[category][mmcif_item])
-                        if mmcif_item in item_value_dictionary:
-                            new_values = self.check_string_list(item_value_dictionary[mmcif_item])
-                            current_values[category][mmcif_item].extend(new_values)
-                        elif mmcif_item == ordinal_item:
-                            for pos in range(num_new_values):
-                                ordinal = num_current_items + pos + 1
-                                current_values[category][mmcif_item].append(str(ordinal))
-                        else:
-                            empty_values = [''] * num_new_values
-                            current_values[category][mmcif_item].extend(empty_values)
-                            # elif num_current_items == 0:
-                else:
-                    logging.debug('no overlap between new and current items')
-                    if num_new_values == num_current_values:
-                        logging.debug('same number of values')
-                        current_values = self.mergeCategory(category=category,
-                                                            item_value_dictionary=item_value_dictionary)
-                    else:
-                        logging.error('different number of values')
-                        return {}
-        else:
-            for mmcif_item in item_value_dictionary:
-                new_values = self.check_string_list(item_value_dictionary[mmcif_item])
-                current_values.setdefault(category, {}).setdefault(mmcif_item, []).extend(new_values)
-
-        return current_values
+        debug('current values: %s', current_values)
+        category_values = add_values(current_values=current_values.get(category, {}),
+                                     item_value_dictionary=item_value_dictionary, ordinal_item=ordinal_item)
+        if not category_values:
+            return {}
+        return {category: category_values}
 
     @staticmethod
     def check_string_list(value):
@@ -150,11 +220,125 @@ class mmcifHandling:
         exptl_cat = self.getCategory(category=cat)
         if not exptl_cat:
             row = {'entry_id': entry_id, 'method': method}
-            exptl_cat = self.addValuesToCategory(category=cat, item_value_dictionary=row)
-            self.addToCif(data_dictionary=exptl_cat)
+            with self.categoryUpdate() as update:
+                update.add_values(category=cat, item_value_dictionary=row)
+                exptl_cat = {self.prepareCategory(category=cat): update.get_values(category=cat)}
         return exptl_cat
 
 
+def add_values(current_values, item_value_dictionary, ordinal_item=None):
+    """
+    add rows to the columns of a category.
+    When the new items overlap the current items the new rows are appended, current items missing from the new rows
+    are left empty or numbered if they are the ordinal item, and new items which are not current are left out.
+    Otherwise the new items are added as extra columns if they have the same number of rows as the category
+    :param current_values: dictionary of item: list of values of the category, which is changed in place
+    :param item_value_dictionary: dictionary of item: value or list of values to add
+    :param ordinal_item: item numbered from the current rows when it is not in item_value_dictionary
+    :return: current_values with the values added, None if they have a different number of rows.
+    current_values is only changed if the values are added
+    """
+    new_values = {item: mmcifHandling.check_string_list(item_value_dictionary[item])
+                  for item in item_value_dictionary}
+    num_new_values = len(new_values[list(new_values)[-1]]) if new_values else 0
+    if not current_values:
+        for mmcif_item in new_values:
+            current_values.setdefault(mmcif_item, []).extend(new_values[mmcif_item])
+        return current_values
+    if set(current_values) & set(new_values):
+        logging.debug('overlap between input and output category')
+        for mmcif_item in current_values:
+            num_current_items = len(current_values[mmcif_item])
+            if mmcif_item in new_values:
+                current_values[mmcif_item].extend(new_values[mmcif_item])
+            elif mmcif_item == ordinal_item:
+                current_values[mmcif_item].extend(str(num_current_items + pos + 1) for pos in range(num_new_values))
+            else:
+                current_values[mmcif_item].extend([''] * num_new_values)
+        return current_values
+    logging.debug('no overlap between new and current items')
+    num_current_values = len(current_values[list(current_values)[-1]])
+    if num_new_values != num_current_values:
+        logging.error('different number of values')
+        return None
+    logging.debug('same number of values')
+    current_values.update(new_values)
+    return current_values
+
+
+class CategoryUpdate:
+    """
+    stages changes to several categories and writes each changed category to the mmCIF once, on commit.
+    Used as a context manager it commits when the block finishes and discards the changes if the block raises
+    """
+
+    def __init__(self, mmcif_handling):
+        """
+        :param mmcif_handling: parsed mmcifHandling
+        """
+        self.mm = mmcif_handling
+        # prepared category: dictionary of item: list of values, for each changed category
+        self.staged = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def get_values(self, category):
+        """
+        :param category: mmCIF category
+        :return: dictionary of item: list of values of the category including the staged changes
+        """
+        category = self.mm.prepareCategory(category=category)
+        if category not in self.staged:
+            self.staged[category] = self.mm.getCategory(category=category).get(category, {})
+        return self.staged[category]
+
+    def add_values(self, category, item_value_dictionary, ordinal_item=None):
+        """
+        stage rows to add to a category, as addValuesToCategory
+        :param category: mmCIF category
+        :param item_value_dictionary: dictionary of item: value or list of values to add
+        :param ordinal_item: item numbered from the current rows when it is not in item_value_dictionary
+        :return: True if the rows were staged, False if they have a different number of rows to the category
+        """
+        # add_values only changes the staged values once it knows the rows fit
+        category_values = add_values(current_values=self.get_values(category=category),
+                                     item_value_dictionary=item_value_dictionary, ordinal_item=ordinal_item)
+        return bool(category_values)
+
+    def merge_values(self, category, item_value_dictionary):
+        """
+        stage items to set in a category, replacing their current values, as mergeCategory
+        :param category: mmCIF category
+        :param item_value_dictionary: dictionary of item: value or list of values
+        """
+        current_values = self.get_values(category=category)
+        for mmcif_item in item_value_dictionary:
+            current_values[mmcif_item] = self.mm.check_string_list(item_value_dictionary[mmcif_item])
+
+    def commit(self):
+        """
+        write each changed category to the mmCIF
+        """
+        for category in self.staged:
+            if self.staged[category]:
+                self.mm.setCategory(category, self.staged[category])
+        self.staged = dict()
+
+    def rollback(self):
+        """
+        discard the staged changes
+        """
+        self.staged = dict()
+
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+# set to a directory to move the cache, or to an empty string to turn the cache off
+CACHE_DIR_ENV = 'ADDING_STATS_TO_MMCIF_CACHE_DIR'
+CACHE_FILE_NAME = 'compounds.sqlite'
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+_compound_cache = None
+
+
+def get_cache_dir():
+    """
+    :return: cache directory from ADDING_STATS_TO_MMCIF_CACHE_DIR, otherwise the user cache directory
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if cache_dir is None:
+        user_cache = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        cache_dir = os.path.join(user_cache, 'adding_stats_to_mmcif')
+    return cache_dir
+
+
+def get_compound_cache():
+    """
+    :return: the CompoundCache shared by everything in this process
+    """
+    global _compound_cache
+    if _compound_cache is None:
+        _compound_cache = CompoundCache()
+    return _compound_cache
+
+
+class CompoundCache:
+    """
+    persistent cache of one letter codes for chemical components, shared between processes through SQLite
+    """
+
+    def __init__(self, cache_dir=None, max_age=DEFAULT_MAX_AGE):
+        """
+        :param cache_dir: directory for the cache file, an empty string turns the cache off
+        :param max_age: number of seconds before a cached code expires
+        """
+        self.cache_dir = cache_dir if cache_dir is not None else get_cache_dir()
+        self.cache_file = os.path.join(self.cache_dir, CACHE_FILE_NAME) if self.cache_dir else None
+        self.max_age = max_age
+        self.connection = None
+        self.connection_pid = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """
+        open the cache file, reopening it in a forked process
+        :return: True if the cache is available, False if not
+        """
+        if not self.cache_file:
+            return False
+        if self.connection and self.connection_pid == os.getpid():
+            return True
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir, exist_ok=True)
+            connection = sqlite3.connect(self.cache_file, timeout=30, check_same_thread=False)
+            # WAL lets readers carry on while another process writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS compounds ('
+                               'compound TEXT PRIMARY KEY, one_letter_code TEXT NOT NULL, updated REAL NOT NULL)')
+            connection.commit()
+        except (OSError, sqlite3.Error) as e:
+            logging.warning('unable to use compound cache {}: {}'.format(self.cache_file, e))
+            self.cache_file = None
+            return False
+        self.connection = connection
+        self.connection_pid = os.getpid()
+        return True
+
+    def get(self, compound):
+        """
+        :param compound: chemical component id
+        :return: cached one letter code, or None if not cached or expired
+        """
+        if not compound:
+            return None
+        with self.lock:
+            if not self.connect():
+                return None
+            try:
+                row = self.connection.execute('SELECT one_letter_code, updated FROM compounds WHERE compound = ?',
+                                              (compound.upper(),)).fetchone()
+            except sqlite3.Error as e:
+                logging.warning('unable to read compound cache: {}'.format(e))
+                return None
+        if row and time.time() - row[1] <= self.max_age:
+            return row[0]
+        return None
+
+    def get_many(self, compounds):
+        """
+        :param compounds: list of chemical component ids
+        :return: dictionary of compound: one letter code for the compounds that are cached and not expired
+        """
+        one_letter_codes = dict()
+        compounds = [compound for compound in compounds if compound]
+        if not compounds:
+            return one_letter_codes
+        with self.lock:
+            if not self.connect():
+                return one_letter_codes
+            try:
+                rows = self.connection.execute(
+                    'SELECT compound, one_letter_code, updated FROM compounds WHERE compound IN ({})'.format(
+                        ','.join('?' * len(compounds))), [compound.upper() for compound in compounds]).fetchall()
+            except sqlite3.Error as e:
+                logging.warning('unable to read compound cache: {}'.format(e))
+                return one_letter_codes
+        cached = {row[0]: row[1] for row in rows if time.time() - row[2] <= self.max_age}
+        for compound in compounds:
+            if compound.upper() in cached:
+                one_letter_codes[compound] = cached[compound.upper()]
+        return one_letter_codes
+
+    def set_many(self, one_letter_codes):
+        """
+        :param one_letter_codes: dictionary of compound: one letter code to cache
+        :return: True if cached, False if not
+        """
+        rows = [(compound.upper(), one_letter_codes[compound], time.time()) for compound in one_letter_codes
+                if compound]
+        with self.lock:
+            if not self.connect():
+                return False
+            try:
+                with self.connection:
+                    self.connection.executemany('INSERT OR REPLACE INTO compounds VALUES (?, ?, ?)', rows)
+            except sqlite3.Error as e:
+                logging.warning('unable to write to compound cache: {}'.format(e))
+                return False
+        return True
+
+    def set(self, compound, one_letter_code):
+        """
+        :param compound: chemical component id
+        :param one_letter_code: one letter code to cache
+        :return: True if cached, False if not
+        """
+        if not compound:
+            return False
+        with self.lock:
+            if not self.connect():
+                return False
+            try:
+                with self.connection:
+                    self.connection.execute('INSERT OR REPLACE INTO compounds VALUES (?, ?, ?)',
+                                            (compound.upper(), one_letter_code, time.time()))
+            except sqlite3.Error as e:
+                logging.warning('unable to write to compound cache: {}'.format(e))
+                return False
+        return True
+
+    def remove_expired(self):
+        """
+        :return: number of expired codes removed
+        """
+        with self.lock:
+            if not self.connect():
+                return 0
+            try:
+                with self.connection:
+                    cursor = self.connection.execute('DELETE FROM compounds WHERE updated < ?',
+                                                     (time.time() - self.max_age,))
+            except sqlite3.Error as e:
+                logging.warning('unable to remove expired codes from compound cache: {}'.format(e))
+                return 0
+        return cursor.rowcount
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--compound', help='compound to look up in the cache', type=str)
+    parser.add_argument('--cache_dir', help='cache directory', type=str)
+    parser.add_argument('--remove_expired', help='remove expired codes', action='store_true')
+    parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
+                        default=logging.INFO)
+    args = parser.parse_args()
+
+    logger.setLevel(args.loglevel)
+
+    cc = CompoundCache(cache_dir=args.cache_dir)
+    logging.info('cache file: {}'.format(cc.cache_file))
+    if args.remove_expired:
+        logging.info('removed: {}'.format(cc.remove_expired()))
+    if args.compound:
+        logging.info('{}: {}'.format(args.compound, cc.get(args.compound)))
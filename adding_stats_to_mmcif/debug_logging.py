@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+import logging
+import os
+import sys
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+# number of items of each list or dictionary shown in debug messages, 0 to show everything
+DEBUG_ITEMS_ENV = 'ADDING_STATS_TO_MMCIF_DEBUG_ITEMS'
+DEFAULT_DEBUG_ITEMS = 5
+# strings longer than this are cut short in debug messages
+MAX_STRING_LENGTH = 80
+# report the caller of debug() as the origin of the message, logging only takes stacklevel from Python 3.8
+_CALLER = {'stacklevel': 2} if sys.version_info >= (3, 8) else {}
+
+
+def get_max_items():
+    """
+    :return: number of items of each list or dictionary shown in debug messages, 0 for all of them
+    """
+    try:
+        return max(0, int(os.environ.get(DEBUG_ITEMS_ENV, DEFAULT_DEBUG_ITEMS)))
+    except ValueError:
+        return DEFAULT_DEBUG_ITEMS
+
+
+def summarise(value, max_items=None):
+    """
+    size bounded description of a value: the number of items in lists and dictionaries and only the first few of them,
+    long strings are cut short and arrays are described by their shape
+    :param value: value to describe
+    :param max_items: number of items of each list or dictionary to show, 0 for all.
+    By default from ADDING_STATS_TO_MMCIF_DEBUG_ITEMS
+    :return: string
+    """
+    max_items = get_max_items() if max_items is None else max_items
+    if isinstance(value, dict):
+        keys = list(value)
+        shown = keys[:max_items] if max_items else keys
+        items = ['{!r}: {}'.format(key, summarise(value[key], max_items=max_items)) for key in shown]
+        if len(shown) < len(keys):
+            items.append('...')
+        return '{} keys {{{}}}'.format(len(keys), ', '.join(items))
+    if isinstance(value, (list, tuple, set)):
+        values = list(value)
+        shown = values[:max_items] if max_items else values
+        items = [summarise(item, max_items=max_items) for item in shown]
+        if len(shown) < len(values):
+            items.append('...')
+        return '{} items [{}]'.format(len(values), ', '.join(items))
+    if isinstance(value, str):
+        if max_items and len(value) > MAX_STRING_LENGTH:
+            return '{!r}... ({} characters)'.format(value[:MAX_STRING_LENGTH], len(value))
+        return repr(value)
+    if hasattr(value, 'shape') and hasattr(value, 'dtype'):
+        return 'array of shape {} {}'.format(tuple(value.shape), value.dtype)
+    return repr(value)
+
+
+class Summary:
+    """
+    summarises a value when a log message is formatted, so nothing is done for messages which are not emitted
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return summarise(self.value)
+
+
+def debug(message, *values):
+    """
+    log a debug message with size bounded summaries of the values in place of each %s.
+    The values are only summarised if debug messages are emitted
+    :param message: message with a %s for each value
+    :param values: values to summarise
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, *[Summary(value) for value in values], **_CALLER)
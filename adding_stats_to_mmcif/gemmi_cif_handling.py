@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 import argparse
+import itertools
 import logging
 import os
 
-from gemmi import cif
+from .debug_logging import debug
 
 logger = logging.getLogger()
 
@@ -18,6 +19,8 @@ class mmcifHandling:
         """parse the mmcif and return a dictionary file"""
         # from http://gemmi.readthedocs.io/en/latest/cif-parser.html#python-module
         if fileName and os.path.exists(fileName):
+            # gemmi is imported when first needed, as importing it is slow
+            from gemmi import cif
             try:
                 self.cifObj = cif.read_file(fileName)  # copy all the data from mmCIF file
                 if self.cifObj:
@@ -61,7 +64,7 @@ class mmcifHandling:
                 logging.debug(datablock)
                 cif_categories = self.cifObj[position]
                 cats = cif_categories.get_mmcif_category_names()
-                logging.debug(cats)
+                debug('categories: %s', cats)
                 num_cats = len(cats)
                 if num_cats > largest_num:
                     largest_num = num_cats
@@ -114,17 +117,73 @@ class mmcifHandling:
         values = result_dict.get(item)
         return values
 
-    def getCategory(self, category):
-        mmcif_dictionary = dict()
+    def getCategoryColumns(self, category, items=None):
+        """
+        read the columns of a category in a single pass over the category
+        :param category: mmCIF category
+        :param items: optional list of items to read, all items are read if not given
+        :return: dictionary of item: list of values, with ? and . returned as empty strings
+        """
+        columns = dict()
+        if self.datablock:
+            category = self.prepare_cat(category=category)
+            if items is None:
+                # gemmi returns None for ? and False for . when not raw
+                cat = self.datablock.get_mmcif_category(category)
+                for cif_item in cat:
+                    columns[cif_item] = [value if value else '' for value in cat[cif_item]]
+            else:
+                from gemmi import cif
+                cat = self.datablock.find_mmcif_category(category)
+                if cat:
+                    for position, tag in enumerate(cat.tags):
+                        cif_item = tag[len(category):]
+                        if cif_item in items:
+                            columns[cif_item] = [cif.as_string(value) for value in cat.column(position)]
+        return columns
+
+    def getCategoryItems(self, category):
+        """
+        :param category: mmCIF category
+        :return: list of the items in the category
+        """
+        items = list()
+        if self.datablock:
+            category = self.prepare_cat(category=category)
+            cat = self.datablock.find_mmcif_category(category)
+            if cat:
+                items = [tag[len(category):] for tag in cat.tags]
+        return items
+
+    def iterCategoryRows(self, category, items):
+        """
+        iterate over the rows of a category without copying the category
+        :param category: mmCIF category
+        :param items: list of items to return for each row
+        :return: generator of tuples of values in the order of items. ? and . are returned as empty strings,
+                 items missing from the category as None
+        """
         if self.datablock:
             category = self.prepare_cat(category=category)
             cat = self.datablock.find_mmcif_category(category)
             if cat:
-                for cif_item in cat.tags:
-                    if cif_item:
-                        cif_item = cif_item.split('.')[-1]
-                        values = self.getCatItemValues(category=category, item=cif_item)
-                        mmcif_dictionary.setdefault(category, {})[cif_item] = values
+                from gemmi import cif
+                positions = {tag[len(category):]: position for position, tag in enumerate(cat.tags)}
+                columns = list()
+                for item in items:
+                    if item in positions:
+                        columns.append(map(cif.as_string, cat.column(positions[item])))
+                    else:
+                        columns.append(itertools.repeat(None, len(cat)))
+                for row in zip(*columns):
+                    yield row
+
+    def getCategory(self, category):
+        mmcif_dictionary = dict()
+        category = self.prepare_cat(category=category)
+        columns = self.getCategoryColumns(category=category)
+        if columns:
+            mmcif_dictionary[category] = columns
 
         return mmcif_dictionary
 
@@ -132,19 +191,50 @@ class mmcifHandling:
         category = self.prepare_cat(category=category)
         self.datablock.set_mmcif_category(category, item_value_dict)
 
+    def copyCategories(self, source_block, categories):
+        """
+        copy whole categories from another gemmi block, replacing those which are already in this block.
+        The values are copied by gemmi as they are, so their quoting and ? and . are kept
+        :param source_block: gemmi block to copy the categories from
+        :param categories: list of mmCIF categories
+        :return: list of the categories copied, those missing from the source block are left out
+        """
+        if not self.datablock:
+            return []
+        categories = {self.prepare_cat(category=category).lower(): category for category in categories}
+        # a category is either one loop or one pair for each item, found in a single pass over the source block
+        source_items = dict()
+        for item in source_block:
+            tag = item.loop.tags[0] if item.loop else item.pair[0] if item.pair else None
+            if tag and '.' in tag:
+                category = tag[:tag.index('.') + 1].lower()
+                if category in categories:
+                    source_items.setdefault(category, []).append(item)
+        for category in source_items:
+            position = -1
+            current = self.datablock.find_mmcif_category(category)
+            if current:
+                position = self.datablock.get_index(current.tags[0])
+                # erased items keep their place, so the copied items go where the category was
+                current.erase()
+            for item in source_items[category]:
+                self.datablock.add_item(item, position)
+                if position >= 0:
+                    position += 1
+        return [categories[category] for category in source_items]
+
+    def copyCategory(self, source_block, category):
+        """
+        :param source_block: gemmi block to copy the category from
+        :param category: mmCIF category
+        :return: True if the category was copied, False if it is not in the source block
+        """
+        return bool(self.copyCategories(source_block=source_block, categories=[category]))
+
     def getCategoryAsList(self, category):
-        self.prepare_cat(category=category)
-        mmcif_dictionary = self.getCategory(category=self.category)
-        # logging.debug(mmcif_dictionary)
-
-        mmcif_cat_list = list()
-        if self.category in mmcif_dictionary:
-            first_key_in_mmcif_dict = list(mmcif_dictionary[self.category].keys())[0]
-            len_of_values = len(mmcif_dictionary[self.category][first_key_in_mmcif_dict])
-            mmcif_cat_list = [{} for i in range(1, len_of_values + 1)]
-            for item in mmcif_dictionary[self.category]:
-                for position, value in enumerate(mmcif_dictionary[self.category][item]):
-                    mmcif_cat_list[position][item] = value
+        columns = self.getCategoryColumns(category=category)
+        items = list(columns.keys())
+        mmcif_cat_list = [dict(zip(items, row)) for row in zip(*columns.values())]
 
         return mmcif_cat_list
 
@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 
 import argparse
+import asyncio
 import logging
 import re
+import threading
 
-import requests
+from adding_stats_to_mmcif.ccd_index import get_ccd_index
 
 logger = logging.getLogger()
 FORMAT = "%(filename)s - %(funcName)s - %(message)s"
@@ -12,19 +14,77 @@ logging.basicConfig(format=FORMAT)
 
 BASE_URL = 'https://www.ebi.ac.uk/pdbe/api/'
 API_END_POINTS = {'compounds': 'pdb/compound/summary/'}
+# maximum number of PDBe API calls made at the same time
+MAX_WORKERS = 8
+# seconds to wait for the PDBe API
+TIMEOUT = 5
+# server errors are retried, waiting BACKOFF_FACTOR seconds and doubling.
+# Connection errors are not, so lookups without the network fail at once
+RETRY_STATUS_CODES = [500, 502, 503, 504]
+BACKOFF_FACTOR = 0.3
+RETRIES = 3
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    :return: requests session shared by all PDBe API calls, which reuses connections and retries server errors
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests is only imported when the PDBe API is needed
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retries = Retry(total=RETRIES, connect=0, read=0,  # number of retries of server errors only
+                            backoff_factor=BACKOFF_FACTOR,
+                            # the factor time in seconds is multiplied by before a retry is tried again
+                            status_forcelist=RETRY_STATUS_CODES)  # retry for these status codes
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS, max_retries=retries)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
+def get_async_session(max_workers=MAX_WORKERS):
+    """
+    must be called from a coroutine, and closed by the caller
+    :param max_workers: maximum number of connections
+    :return: aiohttp.ClientSession for non-blocking PDBe API calls, or None if aiohttp is not installed
+    """
+    try:
+        import aiohttp
+    except ImportError:
+        return None
+    return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=TIMEOUT),
+                                 connector=aiohttp.TCPConnector(limit=max_workers))
 
 
 class GetDataFromPdbeAPi:
 
-    def __init__(self, entry_id, end_point, server_root=BASE_URL):
+    def __init__(self, entry_id, end_point, server_root=BASE_URL, fetch=True):
+        """
+        :param entry_id: entry or compound id
+        :param end_point: key of API_END_POINTS
+        :param server_root: PDBe API server
+        :param fetch: get the data straight away, otherwise call get_data or get_data_async
+        """
         self.url = None
         self.entry_id = entry_id
         self.suffix = end_point
         self.server_root = server_root
         self.data = {}
+        self.status_code = None
 
         self.url_from_suffix()
-        self.get_data()
+        if fetch:
+            self.get_data()
 
     def url_from_suffix(self):
         if self.suffix in API_END_POINTS and self.entry_id and self.server_root:
@@ -38,36 +98,56 @@ class GetDataFromPdbeAPi:
             try:
                 self.encode_url()
 
-                """
-                s = requests.Session()  # start a requests session
-                retries = Retry(total=5,  # number of retries
-                                backoff_factor=1.0,
-                                # the factor time in seconds is multiplied by before a retry is tried again
-                                status_forcelist=[500, 502, 503, 504])  # retry for these status codes
-                s.mount('http://', HTTPAdapter(max_retries=retries))  # retry for these protocols.
-                s.mount('https://', HTTPAdapter(max_retries=retries))
-
-                r = s.get(url=self.url, timeout=5)
-                """
-                r = requests.get(url=self.url, timeout=5)
-
-                if r.status_code == 200:
-                    json_data = r.json()
-                    if self.entry_id in json_data:
-                        self.data = json_data[self.entry_id]
-                    else:
-                        self.data = json_data
-                elif r.status_code == 404:
-                    self.data = {}
-
-                else:
-                    logging.error(r.status_code, r.reason)
-                    self.data = {}
+                r = get_session().get(url=self.url, timeout=TIMEOUT)
+                self.status_code = r.status_code
+                self.set_data(json_data=r.json() if r.status_code == 200 else None, reason=r.reason)
 
             except Exception as e:
                 logging.error(e)
                 self.data = {}
 
+    async def get_data_async(self, session=None):
+        """
+        get the data without blocking the event loop
+        :param session: aiohttp.ClientSession from get_async_session. Without one, the blocking
+        request is made on the event loop's default executor
+        """
+        if not self.url:
+            return
+        if session is None:
+            await asyncio.get_running_loop().run_in_executor(None, self.get_data)
+            return
+        try:
+            self.encode_url()
+            for attempt in range(RETRIES + 1):
+                async with session.get(self.url) as r:
+                    self.status_code = r.status
+                    if r.status in RETRY_STATUS_CODES and attempt < RETRIES:
+                        await asyncio.sleep(BACKOFF_FACTOR * 2 ** attempt)
+                        continue
+                    self.set_data(json_data=await r.json() if r.status == 200 else None, reason=r.reason)
+                    break
+        except Exception as e:
+            logging.error(e)
+            self.data = {}
+
+    def set_data(self, json_data, reason=None):
+        """
+        :param json_data: decoded response, when the status code is 200
+        :param reason: reason for the status code
+        """
+        if self.status_code == 200:
+            if self.entry_id in json_data:
+                self.data = json_data[self.entry_id]
+            else:
+                self.data = json_data
+        elif self.status_code == 404:
+            self.data = {}
+
+        else:
+            logging.error('{} {}'.format(self.status_code, reason))
+            self.data = {}
+
     def return_data(self):
         return self.data
 
@@ -77,16 +157,127 @@ class GetDataFromPdbeAPi:
 
 class GetSpecificDataFromPdbeAPI:
 
-    def get_one_letter_code_for_compound(self, compound):
+    def __init__(self, server_root=BASE_URL, ccd_index=None):
+        """
+        :param server_root: PDBe API server
+        :param ccd_index: CcdIndex consulted before the PDBe API, by default the one from get_ccd_index
+        """
+        self.server_root = server_root
+        self.ccd_index = ccd_index if ccd_index is not None else get_ccd_index()
+        # True when the PDBe API gave a definite answer, so the answer can be cached
+        self.lookup_worked = False
+        # compounds from the last batch of lookups without a definite answer
+        self.failed_lookups = set()
+
+    def lookup_one_letter_code(self, compound):
+        """
+        :param compound: chemical component id
+        :return: one letter code ('X' if unknown) and whether the PDBe API gave a definite answer
+        """
+        if not compound:
+            return 'X', False
+        compound = compound.upper()
+        ccd_one_letter_code = self.lookup_ccd_index(compound=compound)
+        if ccd_one_letter_code is not None:
+            return ccd_one_letter_code, True
+        pdbe_api = GetDataFromPdbeAPi(entry_id=compound, end_point='compounds', server_root=self.server_root)
+        return self.one_letter_code_from_api(pdbe_api=pdbe_api)
+
+    async def lookup_one_letter_code_async(self, compound, session=None):
+        """
+        :param compound: chemical component id
+        :param session: aiohttp.ClientSession from get_async_session
+        :return: one letter code ('X' if unknown) and whether the PDBe API gave a definite answer
+        """
+        if not compound:
+            return 'X', False
+        compound = compound.upper()
+        ccd_one_letter_code = self.lookup_ccd_index(compound=compound)
+        if ccd_one_letter_code is not None:
+            return ccd_one_letter_code, True
+        pdbe_api = GetDataFromPdbeAPi(entry_id=compound, end_point='compounds', server_root=self.server_root,
+                                      fetch=False)
+        await pdbe_api.get_data_async(session=session)
+        return self.one_letter_code_from_api(pdbe_api=pdbe_api)
+
+    def lookup_ccd_index(self, compound):
+        """
+        :param compound: chemical component id in upper case
+        :return: one letter code from the CCD index, or None if it is not in the index
+        """
+        if self.ccd_index is not None:
+            return self.ccd_index.get_one_letter_code(compound=compound)
+        return None
+
+    @staticmethod
+    def one_letter_code_from_api(pdbe_api):
+        """
+        :param pdbe_api: GetDataFromPdbeAPi for the compounds end point, which has its data
+        :return: one letter code ('X' if unknown) and whether the PDBe API gave a definite answer
+        """
         one_letter_code = 'X'
-        if compound:
-            compound = compound.upper()
-            pdbe_api_data = GetDataFromPdbeAPi(entry_id=compound, end_point='compounds').return_data()
-            if pdbe_api_data:
-                for data in pdbe_api_data:
-                    one_letter_code = data['one_letter_code']
+        pdbe_api_data = pdbe_api.return_data()
+        lookup_worked = pdbe_api.status_code in (200, 404)
+        if pdbe_api_data:
+            for data in pdbe_api_data:
+                one_letter_code = data['one_letter_code']
+        return one_letter_code, lookup_worked
+
+    def get_one_letter_code_for_compound(self, compound):
+        one_letter_code, self.lookup_worked = self.lookup_one_letter_code(compound=compound)
         return one_letter_code
 
+    def get_one_letter_codes_for_compounds(self, compounds, max_workers=MAX_WORKERS):
+        """
+        look up several compounds at the same time through the shared session
+        :param compounds: list of chemical component ids
+        :param max_workers: maximum number of concurrent PDBe API calls
+        :return: dictionary of compound: one letter code. Compounds without a definite answer are in failed_lookups
+        """
+        compounds = list(dict.fromkeys(compounds))
+        one_letter_codes = dict()
+        self.failed_lookups = set()
+        if compounds:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(compounds))) as executor:
+                results = executor.map(self.lookup_one_letter_code, compounds)
+                for compound, (one_letter_code, lookup_worked) in zip(compounds, results):
+                    one_letter_codes[compound] = one_letter_code
+                    if not lookup_worked:
+                        self.failed_lookups.add(compound)
+        return one_letter_codes
+
+    async def get_one_letter_codes_for_compounds_async(self, compounds, max_workers=MAX_WORKERS):
+        """
+        look up several compounds at the same time without blocking the event loop. Uses aiohttp if it
+        is installed, otherwise the blocking calls are made on the event loop's default executor
+        :param compounds: list of chemical component ids
+        :param max_workers: maximum number of concurrent PDBe API calls
+        :return: dictionary of compound: one letter code. Compounds without a definite answer are in failed_lookups
+        """
+        compounds = list(dict.fromkeys(compounds))
+        one_letter_codes = dict()
+        self.failed_lookups = set()
+        if not compounds:
+            return one_letter_codes
+        semaphore = asyncio.Semaphore(max_workers)
+        session = get_async_session(max_workers=max_workers)
+
+        async def lookup(compound):
+            async with semaphore:
+                return await self.lookup_one_letter_code_async(compound=compound, session=session)
+
+        try:
+            results = await asyncio.gather(*[lookup(compound) for compound in compounds])
+        finally:
+            if session is not None:
+                await session.close()
+        for compound, (one_letter_code, lookup_worked) in zip(compounds, results):
+            one_letter_codes[compound] = one_letter_code
+            if not lookup_worked:
+                self.failed_lookups.add(compound)
+        return one_letter_codes
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
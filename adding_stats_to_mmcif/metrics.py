@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+# set to a file to append a JSON record of stage timings for each entry to, or to - for standard error
+METRICS_ENV = 'ADDING_STATS_TO_MMCIF_METRICS'
+
+_current_metrics = contextvars.ContextVar('metrics', default=None)
+_no_stage = contextlib.nullcontext()
+
+
+def get_metrics():
+    """
+    :return: the Metrics being collected for the entry in this context, or None
+    """
+    return _current_metrics.get()
+
+
+def stage(name):
+    """
+    time a stage of the entry being processed, does nothing unless collect_metrics is active
+    :param name: name of the stage
+    :return: context manager
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return _no_stage
+    return metrics.stage(name)
+
+
+@contextlib.contextmanager
+def collect_metrics(metrics_file=None, **fields):
+    """
+    collect the time and memory used by each stage of an entry, and append them as one JSON record to the metrics file.
+    Does nothing if there is no metrics file
+    :param metrics_file: file to append the record to, - for standard error.
+    By default from ADDING_STATS_TO_MMCIF_METRICS
+    :param fields: fields to include in the record, such as the input file
+    :return: context manager giving the Metrics, or None if metrics are not collected
+    """
+    metrics_file = metrics_file if metrics_file else os.environ.get(METRICS_ENV)
+    if not metrics_file:
+        yield None
+        return
+    metrics = Metrics(**fields)
+    token = _current_metrics.set(metrics)
+    # stage peaks need tracemalloc.reset_peak, without it tracing would only slow processing down
+    started_tracing = not tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak')
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        with metrics.stage('total'):
+            yield metrics
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _current_metrics.reset(token)
+        metrics.write(metrics_file=metrics_file)
+
+
+class Metrics:
+    """
+    wall time, CPU time of the thread and peak traced memory of each stage of an entry
+    """
+
+    def __init__(self, **fields):
+        """
+        :param fields: fields to include in the record
+        """
+        self.fields = fields
+        self.stages = dict()
+        # peak traced memory so far of the stages which are running, innermost last
+        self.peaks = list()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        :param name: name of the stage, the times of a stage run more than once are added together
+        """
+        # the traced peak is reset for each stage, which needs Python 3.9, otherwise peaks are not recorded
+        tracing = tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak')
+        if tracing:
+            # the peak so far belongs to the enclosing stage
+            if self.peaks:
+                self.peaks[-1] = max(self.peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self.peaks.append(0)
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.thread_time() - start_cpu
+            stage_metrics = self.stages.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+            stage_metrics['calls'] += 1
+            stage_metrics['wall_seconds'] += wall
+            stage_metrics['cpu_seconds'] += cpu
+            if tracing:
+                peak = max(self.peaks.pop(), tracemalloc.get_traced_memory()[1])
+                # the enclosing stage reached this peak too
+                if self.peaks:
+                    self.peaks[-1] = max(self.peaks[-1], peak)
+                stage_metrics['peak_memory_bytes'] = max(stage_metrics.get('peak_memory_bytes', 0), peak)
+
+    def get_record(self):
+        """
+        :return: dictionary of the fields and the metrics of each stage
+        """
+        record = dict(self.fields)
+        record['stages'] = self.stages
+        return record
+
+    def write(self, metrics_file):
+        """
+        :param metrics_file: file to append the record to as one line of JSON, - for standard error
+        """
+        line = json.dumps(self.get_record()) + '\n'
+        if metrics_file == '-':
+            sys.stderr.write(line)
+            return
+        try:
+            # a single append, so records from several processes are not interleaved
+            with open(metrics_file, 'a') as out_file:
+                out_file.write(line)
+        except OSError as e:
+            logging.warning('unable to write metrics to {}: {}'.format(metrics_file, e))
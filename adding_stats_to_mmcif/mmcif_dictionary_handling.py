@@ -1,6 +1,23 @@
 import json
 import os
 
+SOFTWARE_JSON_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'software_classification.json')
+
+_software_dictionary = None
+
+
+def get_software_dictionary():
+    """
+    :return: software classification dictionary, read once per process
+    """
+    global _software_dictionary
+    if _software_dictionary is None:
+        _software_dictionary = dict()
+        if os.path.exists(SOFTWARE_JSON_FILE):
+            with open(SOFTWARE_JSON_FILE) as json_file:
+                _software_dictionary = json.load(json_file)
+    return _software_dictionary
+
 
 class SoftwareClassification:
 
@@ -10,11 +27,8 @@ class SoftwareClassification:
         self.get_software_data()
 
     def get_software_data(self):
-        software_json_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'software_classification.json')
         if not self.software_dictionary:
-            if os.path.exists(software_json_file):
-                with open(software_json_file) as json_file:
-                    self.software_dictionary = json.load(json_file)
+            self.software_dictionary = get_software_dictionary()
         self.software_name_lower_dict = {k.lower(): k for k in self.software_dictionary.keys()}
 
     def get_software_name_correct_case(self, software_name):
@@ -1,14 +1,15 @@
 #!/usr/bin/env python
 import argparse
+import bisect
+import collections
 import logging
-
-from Bio import Align
-from Bio import pairwise2
-# AL: hiding warnings, could be done better
+import math
 import warnings
-with warnings.catch_warnings():
-  warnings.simplefilter("ignore")
-  from Bio.SubsMat import MatrixInfo as matlist
+
+from adding_stats_to_mmcif.alignment_memo import get_alignment_memo, get_memo_key
+from adding_stats_to_mmcif.debug_logging import debug
+
+# Biopython, numpy and multiprocessing are imported where they are first used, to keep start up quick
 
 # from Bio import AlignIO
 # from Bio.Emboss.Applications import NeedleCommandline
@@ -27,16 +28,487 @@ logging.basicConfig(format=FORMAT)
 # needle_cline.stdout = True
 # needle_cline.outfile = "stdout"
 
+MATCH_SCORE = 1.0
+MISMATCH_SCORE = 0.0
+OPEN_GAP_SCORE = -10
+EXTEND_GAP_SCORE = -0.5
+END_GAP_SCORE = 0.0
+
+# number of chunks given to each worker process, so a slow chunk does not hold up the rest
+CHUNKS_PER_WORKER = 4
+
+# banded alignment: seeds placing the band, the first band around them and limits on when to use it
+SEED_LENGTH = 12
+NUMBER_OF_SEEDS = 9
+INITIAL_BAND_WIDTH = 16
+MAX_BAND_WIDTH = 1000
+MIN_BANDED_CELLS = 16000000
+# number of rows of substitution scores worked out at a time
+BAND_BLOCK_ROWS = 1024
+
+_alignment_engine = None
+_banded_alignment_engine = None
+
+
+def get_alignment_engine():
+    """
+    :return: the AlignmentEngine shared by everything in this process
+    """
+    global _alignment_engine
+    if _alignment_engine is None:
+        _alignment_engine = AlignmentEngine(memo=get_alignment_memo())
+    return _alignment_engine
+
+
+def get_banded_alignment_engine():
+    """
+    :return: the BandedAlignmentEngine shared by everything in this process
+    """
+    global _banded_alignment_engine
+    if _banded_alignment_engine is None:
+        _banded_alignment_engine = BandedAlignmentEngine(memo=get_alignment_memo())
+    return _banded_alignment_engine
+
+
+def score_chunk(engine_class, engine_parameters, pairs):
+    """
+    score a chunk of pairs in a worker process
+    :param engine_class: class of the engine in the parent process
+    :param engine_parameters: AlignmentEngine.parameters of the engine in the parent process
+    :param pairs: list of (query, target)
+    :return: list of alignment scores
+    """
+    return engine_class(**engine_parameters).score_pairs(pairs=pairs)
+
+
+def remove_gaps(sequence):
+    return str(sequence).replace("\n", "").replace(" ", "")
+
+
+def sequence_type(sequence):
+    """
+    :param sequence: one letter sequence
+    :return: tuple of whether the sequence could be DNA and whether it could be RNA
+    """
+    residues = set(sequence)
+    return residues.issubset(set("ATGC")), residues.issubset(set("AUGC"))
+
+
+class AlignmentEngine:
+    """
+    global alignment scorer configured once and reused for every pair of sequences
+    """
+
+    def __init__(self, open_gap_score=OPEN_GAP_SCORE, extend_gap_score=EXTEND_GAP_SCORE, end_gap_score=END_GAP_SCORE,
+                 memo=None):
+        """
+        :param open_gap_score: score for opening an internal gap
+        :param extend_gap_score: score for extending an internal gap
+        :param end_gap_score: score for gaps at either end, which are free by default
+        :param memo: alignment_memo.AlignmentMemo to reuse scores of pairs already aligned
+        """
+        self.memo = memo
+        self.open_gap_score = open_gap_score
+        self.extend_gap_score = extend_gap_score
+        self.end_gap_score = end_gap_score
+        self.match_score = MATCH_SCORE
+        self.mismatch_score = MISMATCH_SCORE
+        self._aligner = None
+        self.memo_parameters = {'open_gap_score': open_gap_score,
+                                'extend_gap_score': extend_gap_score,
+                                'end_gap_score': end_gap_score,
+                                'match_score': self.match_score,
+                                'mismatch_score': self.mismatch_score}
+
+    @property
+    def aligner(self):
+        """
+        :return: Align.PairwiseAligner configured with the scores of this engine, made on first use
+        """
+        if self._aligner is None:
+            from Bio import Align
+            aligner = Align.PairwiseAligner()
+            aligner.match_score = self.match_score
+            aligner.mismatch_score = self.mismatch_score
+            aligner.open_gap_score = self.open_gap_score
+            aligner.extend_gap_score = self.extend_gap_score
+            aligner.target_end_gap_score = self.end_gap_score
+            aligner.query_end_gap_score = self.end_gap_score
+            self._aligner = aligner
+        return self._aligner
+
+    def exact_match_score(self, query):
+        """
+        with these scores a query found unchanged inside a target has the highest score any target can get,
+        so the alignment can be skipped
+        :param query: one letter sequence
+        :return: score of the query aligned to a target containing it, None if that might not be the highest score
+        """
+        if self.match_score <= max(self.mismatch_score, 0):
+            return None
+        if self.open_gap_score >= 0 or self.extend_gap_score > 0 or self.end_gap_score != 0:
+            return None
+        return len(remove_gaps(query)) * self.match_score
+
+    def upper_bound_is_valid(self):
+        """
+        :return: True if no alignment can score more than the residues the two sequences have in common
+        """
+        if self.match_score <= 0 or self.mismatch_score > 0:
+            return False
+        return self.open_gap_score <= 0 and self.extend_gap_score <= 0 and self.end_gap_score <= 0
+
+    def upper_bound(self, query_composition, target_composition):
+        """
+        :param query_composition: collections.Counter of the residues in the query
+        :param target_composition: collections.Counter of the residues in the target
+        :return: highest score an alignment of the two sequences could have
+        """
+        common_residues = 0
+        for residue, count in query_composition.items():
+            common_residues += min(count, target_composition[residue])
+        return common_residues * self.match_score
+
+    def best_match(self, query, targets, target_compositions=None):
+        """
+        find the first target with the highest score, aligning targets in order of their upper bound
+        and stopping when no remaining target can beat the best score
+        :param query: one letter sequence
+        :param targets: list of one letter sequences
+        :param target_compositions: collections.Counter of the residues in each target, without gaps
+        :return: position in targets of the best target (None if no score is above 0) and its score
+        """
+        query = remove_gaps(query)
+        query_type = sequence_type(query)
+        if self.upper_bound_is_valid():
+            if target_compositions is None:
+                target_compositions = [collections.Counter(remove_gaps(target)) for target in targets]
+            query_composition = collections.Counter(query)
+            upper_bounds = [self.upper_bound(query_composition, target_composition)
+                            for target_composition in target_compositions]
+        else:
+            upper_bounds = [float('inf')] * len(targets)
+
+        best_position = None
+        best_score = 0
+        # sorting is stable, so targets with the same upper bound stay in order
+        for position in sorted(range(len(targets)), key=lambda target_position: -upper_bounds[target_position]):
+            if upper_bounds[position] < best_score:
+                break
+            if upper_bounds[position] == best_score and (best_position is None or position > best_position):
+                continue
+            target = remove_gaps(targets[position])
+            if sequence_type(target) != query_type:
+                continue
+            score = self.score(query, target)
+            if score > best_score or (score == best_score and best_position is not None and position < best_position):
+                best_position = position
+                best_score = score
+        return best_position, best_score
+
+    def score(self, query, target):
+        """
+        :param query: one letter sequence without gaps
+        :param target: one letter sequence without gaps
+        :return: global alignment score
+        """
+        if self.memo is None:
+            return self.align_score(query, target)
+        key = get_memo_key(parameters=self.memo_parameters, query=query, target=target)
+        score = self.memo.get(key=key)
+        if score is None:
+            score = self.align_score(query, target)
+            self.memo.set(key=key, score=score)
+        return score
+
+    def align_score(self, query, target):
+        """
+        :param query: one letter sequence without gaps
+        :param target: one letter sequence without gaps
+        :return: global alignment score, without using the memo
+        """
+        # only the score is needed, which is faster and uses less memory than working out the alignments
+        return self.aligner.score(query, target)
+
+    @property
+    def parameters(self):
+        """
+        :return: keyword arguments which make an identical engine, for worker processes
+        """
+        return {'open_gap_score': self.open_gap_score,
+                'extend_gap_score': self.extend_gap_score,
+                'end_gap_score': self.end_gap_score}
+
+    def score_pairs(self, pairs, workers=1, chunk_size=None):
+        """
+        score many pairs of sequences, optionally spread over a pool of processes
+        :param pairs: list of (query, target)
+        :param workers: number of worker processes, 1 scores the pairs in this process
+        :param chunk_size: number of pairs sent to a worker at a time, by default enough for a few chunks per worker
+        :return: list of alignment scores in the order of pairs, 0 where the sequences are not the same type
+        """
+        if workers <= 1 or len(pairs) <= 1:
+            return [self.score_many(query=query, targets=[target])[0] for query, target in pairs]
+
+        scores = [0] * len(pairs)
+        pairs_to_score = list()
+        keys = list()
+        for position, (query, target) in enumerate(pairs):
+            query = remove_gaps(query)
+            target = remove_gaps(target)
+            if sequence_type(query) != sequence_type(target):
+                continue
+            key = None
+            if self.memo is not None:
+                key = get_memo_key(parameters=self.memo_parameters, query=query, target=target)
+                score = self.memo.get(key=key)
+                if score is not None:
+                    scores[position] = score
+                    continue
+            pairs_to_score.append((position, (query, target)))
+            keys.append(key)
+        if not pairs_to_score:
+            return scores
+
+        from concurrent.futures import ProcessPoolExecutor
+        if not chunk_size:
+            chunk_size = max(1, -(-len(pairs_to_score) // (workers * CHUNKS_PER_WORKER)))
+        chunks = [[pair for position, pair in pairs_to_score[start:start + chunk_size]]
+                  for start in range(0, len(pairs_to_score), chunk_size)]
+        new_scores = list()
+        engine_classes = [type(self)] * len(chunks)
+        engine_parameters = [self.parameters] * len(chunks)
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            # map returns the chunks in order, so the scores line up with the pairs
+            for chunk_scores in executor.map(score_chunk, engine_classes, engine_parameters, chunks):
+                new_scores.extend(chunk_scores)
+        for (position, pair), key, score in zip(pairs_to_score, keys, new_scores):
+            scores[position] = score
+            if key is not None:
+                self.memo.set(key=key, score=score)
+        return scores
+
+    def score_many(self, query, targets):
+        """
+        score one sequence against many, preparing the query once
+        :param query: one letter sequence
+        :param targets: list of one letter sequences
+        :return: list of alignment scores in the order of targets, 0 where the sequences are not the same type
+        """
+        query = remove_gaps(query)
+        query_type = sequence_type(query)
+        scores = list()
+        for target in targets:
+            target = remove_gaps(target)
+            if sequence_type(target) != query_type:
+                scores.append(0)
+            else:
+                scores.append(self.score(query, target))
+        return scores
+
+
+class BandedAlignmentEngine(AlignmentEngine):
+    """
+    scores long, nearly identical sequences in a band of diagonals around seed matches.
+    The band is widened until no alignment outside it can score higher, so scores are the same as the full aligner's.
+    Falls back to the full aligner when the band would be wider than max_band_width
+    """
+
+    def __init__(self, open_gap_score=OPEN_GAP_SCORE, extend_gap_score=EXTEND_GAP_SCORE, end_gap_score=END_GAP_SCORE,
+                 memo=None, max_band_width=MAX_BAND_WIDTH, min_cells=MIN_BANDED_CELLS):
+        """
+        :param max_band_width: maximum number of diagonals in the band
+        :param min_cells: pairs with fewer cells than this in the full matrix use the full aligner
+        """
+        self.max_band_width = max_band_width
+        self.min_cells = min_cells
+        self.banded_alignments = 0
+        self.full_alignments = 0
+        super().__init__(open_gap_score=open_gap_score, extend_gap_score=extend_gap_score,
+                         end_gap_score=end_gap_score, memo=memo)
+
+    @property
+    def parameters(self):
+        return dict(super().parameters, max_band_width=self.max_band_width, min_cells=self.min_cells)
+
+    def seed_diagonals(self, query, target):
+        """
+        :param query: one letter sequence without gaps
+        :param target: one letter sequence without gaps
+        :return: lowest and highest offset in target of short stretches of query found exactly in target,
+        None if none are found
+        """
+        diagonals = list()
+        if len(query) >= SEED_LENGTH:
+            for seed in range(NUMBER_OF_SEEDS):
+                start = seed * (len(query) - SEED_LENGTH) // (NUMBER_OF_SEEDS - 1)
+                position = target.find(query[start:start + SEED_LENGTH])
+                if position != -1:
+                    diagonals.append(position - start)
+        if not diagonals:
+            return None
+        return min(diagonals), max(diagonals)
+
+    def band_needed(self, query_length, target_length, score):
+        """
+        an alignment through diagonal d (target position - query position) has at most
+        min(query_length, target_length - d) matches for d >= 0 and min(query_length + d, target_length) for d < 0,
+        and gaps and mismatches only lower the score
+        :return: lowest and highest diagonal which could hold an alignment scoring more than score,
+        None if there are none
+        """
+        matches = score / self.match_score
+        if min(query_length, target_length) <= matches:
+            return None
+        return math.floor(matches - query_length) + 1, math.ceil(target_length - matches) - 1
+
+    def banded_score(self, query, target, low, high):
+        """
+        affine gap alignment score with free end gaps, using only diagonals low to high
+        :param query: one letter sequence without gaps
+        :param target: one letter sequence without gaps
+        :param low: lowest diagonal (target position - query position) in the band
+        :param high: highest diagonal in the band
+        :return: highest score of alignments within the band
+        """
+        import numpy as np
+        query_length = len(query)
+        target_length = len(target)
+        open_gap_score = self.open_gap_score
+        extend_gap_score = self.extend_gap_score
+        query_codes = np.fromiter(map(ord, query), dtype=np.int32, count=query_length)
+        target_codes = np.fromiter(map(ord, target), dtype=np.int32, count=target_length)
+        # each position in the band is a diagonal, so the target position is the row plus the diagonal
+        diagonals = np.arange(low, high + 1)
+        band_width = len(diagonals)
+        gap_extensions = np.arange(band_width) * extend_gap_score
+        gap_openings = gap_extensions[:-1] + open_gap_score
+
+        # row 0: leading gaps in the query are free
+        best_score = 0.0
+        best = np.where((diagonals >= 0) & (diagonals <= target_length), 0.0, -np.inf)
+        match_or_horizontal = best.copy()
+        vertical = np.full(band_width, -np.inf)
+        horizontal = np.full(band_width, -np.inf)
+
+        for block_start in range(1, query_length + 1, BAND_BLOCK_ROWS):
+            block_end = min(block_start + BAND_BLOCK_ROWS, query_length + 1)
+            rows = np.arange(block_start, block_end)
+            target_positions = rows[:, None] + diagonals[None, :]
+            residues = target_codes[np.clip(target_positions - 1, 0, target_length - 1)]
+            substitution = np.where(residues == query_codes[rows - 1][:, None], self.match_score, self.mismatch_score)
+            substitution[(target_positions < 1) | (target_positions > target_length)] = -np.inf
+
+            for row_in_block, row in enumerate(rows.tolist()):
+                match = best + substitution[row_in_block]
+                np.maximum(match_or_horizontal[1:] + open_gap_score, vertical[1:] + extend_gap_score,
+                           out=vertical[:-1])
+                vertical[-1] = -np.inf
+                edge_of_matrix = row + low < 1 or row + high > target_length
+                if edge_of_matrix:
+                    # the band runs off the matrix, where leading gaps in the target are free
+                    target_positions_in_row = diagonals + row
+                    vertical[(target_positions_in_row < 0) | (target_positions_in_row > target_length)] = -np.inf
+                    if row + low <= 0 <= row + high:
+                        vertical[-(row + low)] = 0.0
+                not_horizontal = np.maximum(match, vertical)
+                running_best = np.maximum.accumulate(not_horizontal - gap_extensions)
+                np.add(running_best[:-1], gap_openings, out=horizontal[1:])
+                if edge_of_matrix:
+                    horizontal[(target_positions_in_row < 1) | (target_positions_in_row > target_length)] = -np.inf
+                best = np.maximum(not_horizontal, horizontal)
+                match_or_horizontal = np.maximum(match, horizontal)
+                # trailing gaps are free, so the alignment can end anywhere on the last row or column
+                if low <= target_length - row <= high:
+                    best_score = max(best_score, best[target_length - row - low])
+        best_score = max(best_score, best.max())
+        return float(best_score)
+
+    def align_score(self, query, target):
+        if not self.upper_bound_is_valid() or self.end_gap_score != 0 or \
+                len(query) * len(target) < self.min_cells:
+            self.full_alignments += 1
+            return super().align_score(query, target)
+        seed_diagonals = self.seed_diagonals(query=query, target=target)
+        if seed_diagonals is None or seed_diagonals[1] - seed_diagonals[0] + 2 * INITIAL_BAND_WIDTH > \
+                self.max_band_width:
+            self.full_alignments += 1
+            return super().align_score(query, target)
+
+        low = seed_diagonals[0] - INITIAL_BAND_WIDTH
+        high = seed_diagonals[1] + INITIAL_BAND_WIDTH
+        score = self.banded_score(query=query, target=target, low=low, high=high)
+        band_needed = self.band_needed(query_length=len(query), target_length=len(target), score=score)
+        if band_needed and (band_needed[0] < low or band_needed[1] > high):
+            # a higher score can only make the band needed narrower, so one wider band is enough
+            low = min(low, band_needed[0])
+            high = max(high, band_needed[1])
+            if high - low + 1 > self.max_band_width:
+                logging.debug('band of {} diagonals is too wide'.format(high - low + 1))
+                self.full_alignments += 1
+                return super().align_score(query, target)
+            score = self.banded_score(query=query, target=target, low=low, high=high)
+        self.banded_alignments += 1
+        return score
+
+
+class SequenceIndex:
+    """
+    candidate sequences joined into one string, to find exact and substring matches without aligning
+    """
+
+    def __init__(self, sequences):
+        """
+        :param sequences: list of one letter sequences
+        """
+        self.sequences = list(sequences)
+        prepared_sequences = [remove_gaps(sequence) for sequence in self.sequences]
+        self.sequence_types = [sequence_type(sequence) for sequence in prepared_sequences]
+        self.compositions = [collections.Counter(sequence) for sequence in prepared_sequences]
+        self.starts = list()
+        position = 0
+        for sequence in prepared_sequences:
+            self.starts.append(position)
+            position += len(sequence) + 1
+        # new lines are removed from sequences, so a match can never run across two sequences
+        self.joined_sequences = '\n'.join(prepared_sequences)
+
+    def find_substring(self, query):
+        """
+        :param query: one letter sequence
+        :return: position in sequences of the first sequence of the same type containing query, None if there is none
+        """
+        query = remove_gaps(query)
+        if not query:
+            return None
+        query_type = sequence_type(query)
+        position = self.joined_sequences.find(query)
+        while position != -1:
+            candidate = bisect.bisect_right(self.starts, position) - 1
+            if self.sequence_types[candidate] == query_type:
+                return candidate
+            if candidate + 1 == len(self.starts):
+                break
+            position = self.joined_sequences.find(query, self.starts[candidate + 1])
+        return None
+
+
 class SequenceAlign:
 
-    def __init__(self, sequence1, sequence2):
+    def __init__(self, sequence1, sequence2, engine=None):
+        """
+        :param sequence1: one letter sequence
+        :param sequence2: one letter sequence
+        :param engine: AlignmentEngine to score with, by default the one from get_alignment_engine
+        """
         self.sequence1 = sequence1
         self.sequence2 = sequence2
+        self.engine = engine if engine else get_alignment_engine()
         self.score = None
         self.alignment_dict = dict()
         self.alignment_list = list()
-        logging.debug(self.sequence1)
-        logging.debug(self.sequence2)
+        debug('sequence1: %s', self.sequence1)
+        debug('sequence2: %s', self.sequence2)
 
     def rna(self, seq):
         return set(seq).issubset(set("AUGC"))
@@ -57,7 +529,7 @@ class SequenceAlign:
         # return True, ''
 
     def remove_gaps(self, sequence):
-        return str(sequence).replace("\n", "").replace(" ", "")
+        return remove_gaps(sequence)
 
     def prepare_sequences(self):
         self.sequence1 = self.remove_gaps(self.sequence1)
@@ -67,6 +539,11 @@ class SequenceAlign:
         return self.both_sequences_same_type()
 
     def pairwise2(self):
+        from Bio import pairwise2
+        # AL: hiding warnings, could be done better
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            from Bio.SubsMat import MatrixInfo as matlist
 
         matrix = matlist.blosum62
         gap_open = -10
@@ -77,40 +554,8 @@ class SequenceAlign:
         self.score = alns[2]
 
     def pairwise_aligner(self):
-
-        aligner = Align.PairwiseAligner()
-        aligner.open_gap_score = -10
-        aligner.extend_gap_score = -0.5
-        aligner.target_end_gap_score = 0.0
-        aligner.query_end_gap_score = 0.0
-        # aligner.match = 2
-        # aligner.mismatch = -1
-        # only need to run aligner.score. This improves memory usage and speed.
-        # logging.debug('length of query: {}'.format(len(self.sequence1)))
-        # logging.debug('length of target: {}'.format(len(self.sequence2)))
-        alignments = aligner.align(self.sequence1, self.sequence2)
-        # for alignment in sorted(alignments):
-        #     logging.debug(alignment)
-        #     # logging.debug(alignment.score)
-        #     logging.debug(alignment.target)
-        #     logging.debug(alignment.query)
-        #     logging.debug(alignment.path)
-        #     # logging.debug(dir(alignment))
-        #     current_query_position = 0
-        #     current_target_position = 0
-        #     for align_tupple in alignment.path:
-        #         working_query_position = align_tupple[0]
-        #         working_target_position = align_tupple[1]
-        #         query_shift = working_query_position - current_query_position
-        #         target_shift = working_target_position - current_target_position
-        #         logging.debug(query_shift)
-        #         # expand the shift into a list. Then for each position add the position in the list to a dictionary?
-        #
-        #         current_target_position = working_target_position
-        #         current_query_position = working_query_position
-
-        align_score = aligner.score(self.sequence1, self.sequence2)
-        logging.info(align_score)
+        align_score = self.engine.score(self.sequence1, self.sequence2)
+        logging.debug(align_score)
 
         self.score = align_score
 
@@ -3,10 +3,6 @@ import argparse
 import logging
 import os
 
-from Bio import SeqIO
-from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
-
 logger = logging.getLogger()
 FORMAT = "%(filename)s - %(funcName)s - %(message)s"
 logging.basicConfig(format=FORMAT)
@@ -25,6 +21,7 @@ class ProcessFasta:
             if os.path.exists(self.fasta_file):
                 logging.debug('processing fasta file')
                 try:
+                    from Bio import SeqIO
                     self.fasta_data = SeqIO.parse(self.fasta_file, "fasta")
                     for record in self.fasta_data:
                         self.sequence_dict[record.id] = record.seq
@@ -41,6 +38,9 @@ class ProcessFasta:
         if not isinstance(sequence_dict, dict):
             logging.error('requires a dictionary')
             return False
+        from Bio import SeqIO
+        from Bio.Seq import Seq
+        from Bio.SeqRecord import SeqRecord
         sequences = list()
         if sequence_dict:
             try:
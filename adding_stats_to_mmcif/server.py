@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+import argparse
+import ipaddress
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+
+from adding_stats_to_mmcif.batch import get_entry, init_worker, process_entry
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_WORKERS = 2
+
+
+class JobService:
+    """
+    runs jobs on a pool of worker processes, which keep the modules and caches loaded between jobs
+    """
+
+    def __init__(self, output_dir, workers=DEFAULT_WORKERS, banded=False):
+        """
+        :param output_dir: directory the output mmCIF files are written to, jobs writing elsewhere are refused
+        :param workers: number of jobs run at the same time
+        :param banded: align long sequences in a band around the diagonal
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.output_dir = os.path.realpath(output_dir)
+        self.banded = banded
+        # the server handles requests on threads, forking from them is not safe, so workers come from a fork server
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method),
+                                            initializer=init_worker, initargs=(logger.level,))
+        # start every worker now, so the first jobs do not wait for the imports
+        for started in [self.executor.submit(os.getpid) for _ in range(workers)]:
+            started.result()
+
+    def run_job(self, job):
+        """
+        :param job: dictionary of the arguments of run_process, output_mmcif relative to the output directory.
+        return_output asks for the output mmCIF in the response, banded overrides the service default
+        :return: dictionary of whether the job worked, the error if it failed, the output mmCIF and the time taken
+        """
+        try:
+            entry = get_entry(job)
+        except ValueError as e:
+            return {'worked': False, 'error': 'bad job: {}'.format(e)}
+        entry['output_mmcif'] = self.get_output_path(output_mmcif=entry['output_mmcif'])
+        if not entry['output_mmcif']:
+            return {'worked': False, 'error': 'bad job: output_mmcif is not in {}'.format(self.output_dir)}
+        banded = bool(job.get('banded', self.banded))
+        try:
+            result = self.executor.submit(process_entry, entry, 1, banded).result()
+        except Exception as e:
+            # the worker died, for example it ran out of memory
+            result = {'worked': False, 'error': '{}: {}'.format(type(e).__name__, e), 'seconds': None}
+        response = {'worked': result['worked'], 'error': result['error'], 'output_mmcif': entry['output_mmcif'],
+                    'seconds': result['seconds']}
+        if job.get('return_output') and result['worked']:
+            try:
+                with open(entry['output_mmcif']) as in_file:
+                    response['output'] = in_file.read()
+            except OSError as e:
+                response['worked'] = False
+                response['error'] = 'unable to read output: {}'.format(e)
+        logging.info('{} {}{}'.format('worked' if result['worked'] else 'FAILED', entry['input_mmcif'],
+                                      ': {}'.format(result['error']) if result['error'] else ''))
+        return response
+
+    def get_output_path(self, output_mmcif):
+        """
+        :param output_mmcif: output mmCIF file of a job, relative to the output directory
+        :return: the real path of the file, or None if it is not in the output directory
+        """
+        output_path = os.path.realpath(os.path.join(self.output_dir, output_mmcif))
+        if os.path.commonpath([self.output_dir, output_path]) != self.output_dir or output_path == self.output_dir:
+            return None
+        return output_path
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """
+    reads one JSON job per line and writes one JSON response per line
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                response = {'worked': False, 'error': 'bad job: {}'.format(e)}
+            else:
+                response = self.server.service.run_job(job=job)
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class UnixJobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, service):
+        self.service = service
+        # a socket left by a service which died is replaced, any other file is kept
+        if os.path.lexists(socket_path):
+            if not is_socket(path=socket_path):
+                raise FileExistsError('{} exists and is not a socket'.format(socket_path))
+            os.remove(socket_path)
+        # only the user running the service can submit jobs, the socket is created with these permissions
+        # so no one else can connect before they are set
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, JobHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        if is_socket(path=self.server_address):
+            os.remove(self.server_address)
+
+
+def is_socket(path):
+    """
+    :param path: file name
+    :return: True if the file is a socket, symbolic links are not followed
+    """
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except OSError:
+        return False
+
+
+class TcpJobServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host, port, service):
+        # there is no authentication, so only processes on this machine can submit jobs
+        if not is_loopback(host=host):
+            raise ValueError('refusing to listen on {}, only loopback addresses are allowed'.format(host))
+        self.service = service
+        super().__init__((host, port), JobHandler)
+
+
+def is_loopback(host):
+    """
+    :param host: host name or IP address
+    :return: True if the host is localhost or a loopback address
+    """
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def get_server(service, socket_path=None, host=DEFAULT_HOST, port=None):
+    """
+    :param service: JobService to run the jobs
+    :param socket_path: Unix domain socket to listen on
+    :param host: loopback address to listen on when there is no socket path, localhost by default
+    :param port: port to listen on when there is no socket path
+    :return: server, call serve_forever to handle jobs
+    """
+    if socket_path:
+        return UnixJobServer(socket_path=socket_path, service=service)
+    return TcpJobServer(host=host, port=port, service=service)
+
+
+def send_job(job, socket_path=None, host=DEFAULT_HOST, port=None, timeout=None):
+    """
+    submit a job to a running server
+    :param job: dictionary of the arguments of run_process, optionally return_output and banded
+    :param socket_path: Unix domain socket the server listens on
+    :param host: host the server listens on when there is no socket path
+    :param port: port the server listens on when there is no socket path
+    :param timeout: seconds to wait for the response
+    :return: response dictionary from JobService.run_job
+    """
+    if socket_path:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = socket_path
+    else:
+        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = (host, port)
+    with connection:
+        connection.settimeout(timeout)
+        connection.connect(address)
+        with connection.makefile('rwb') as stream:
+            stream.write((json.dumps(job) + '\n').encode('utf-8'))
+            stream.flush()
+            return json.loads(stream.readline())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='serve run_process jobs, one JSON object per line, '
+                                                 'over a Unix domain socket or localhost TCP')
+    parser.add_argument('--socket', help='Unix domain socket to listen on', type=str)
+    parser.add_argument('--host', help='loopback address to listen on without --socket', type=str,
+                        default=DEFAULT_HOST)
+    parser.add_argument('--port', help='port to listen on without --socket', type=int)
+    parser.add_argument('--output_dir', help='directory output mmCIF files are written to, '
+                                             'jobs writing elsewhere are refused', type=str, required=True)
+    parser.add_argument('--workers', help='number of jobs run at the same time', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--banded', help='align long sequences in a band around the diagonal', action='store_true')
+    parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
+                        default=logging.INFO)
+
+    args = parser.parse_args()
+    logger.setLevel(args.loglevel)
+
+    if not args.socket and not args.port:
+        parser.error('either --socket or --port is required')
+
+    if not args.socket and not is_loopback(host=args.host):
+        parser.error('--host must be a loopback address, jobs are not authenticated')
+
+    if args.socket and os.path.lexists(args.socket) and not is_socket(path=args.socket):
+        parser.error('--socket {} exists and is not a socket'.format(args.socket))
+
+    js = JobService(output_dir=args.output_dir, workers=args.workers, banded=args.banded)
+    server = get_server(service=js, socket_path=args.socket, host=args.host, port=args.port)
+    logging.info('serving on {}'.format(server.server_address))
+    # stopping the service removes its socket
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        js.shutdown()
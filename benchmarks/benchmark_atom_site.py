@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from gemmi import cif
+
+from adding_stats_to_mmcif.add_sequence_to_mmcif import ExtractFromMmcif, residue_map_1to3
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+STANDARD_RESIDUES = sorted(residue_map_1to3.values())
+
+
+def write_synthetic_chain(file_name, number_of_atoms, atoms_per_residue=10):
+    """
+    write an mmCIF file containing a single polymer chain of standard residues
+    :param file_name: output mmCIF file
+    :param number_of_atoms: number of atoms in atom_site
+    :param atoms_per_residue: number of atoms in each residue
+    """
+    residues = [STANDARD_RESIDUES[atom // atoms_per_residue % len(STANDARD_RESIDUES)]
+                for atom in range(number_of_atoms)]
+    residue_numbers = [str(atom // atoms_per_residue + 1) for atom in range(number_of_atoms)]
+    atom_site = {'group_PDB': ['ATOM'] * number_of_atoms,
+                 'id': [str(atom + 1) for atom in range(number_of_atoms)],
+                 'label_atom_id': ['C{}'.format(atom % atoms_per_residue) for atom in range(number_of_atoms)],
+                 'label_comp_id': residues,
+                 'label_asym_id': ['A'] * number_of_atoms,
+                 'label_entity_id': ['1'] * number_of_atoms,
+                 'label_seq_id': residue_numbers,
+                 'pdbx_PDB_ins_code': [None] * number_of_atoms,
+                 'auth_seq_id': residue_numbers,
+                 'auth_comp_id': residues,
+                 'auth_asym_id': ['A'] * number_of_atoms,
+                 }
+    doc = cif.Document()
+    block = doc.add_new_block('synthetic')
+    block.set_mmcif_category('_atom_site.', atom_site)
+    doc.write_file(file_name)
+
+
+def time_get_data_from_atom_site(mmcif_file):
+    mm = ExtractFromMmcif()
+    mm.parse_mmcif(mmcif_file=mmcif_file)
+    start = time.perf_counter()
+    mm.get_data_from_atom_site()
+    return time.perf_counter() - start
+
+
+def run_benchmark(sizes):
+    """
+    time ExtractFromMmcif.get_data_from_atom_site for chains of increasing size
+    :param sizes: list of the number of atoms in each chain
+    :return: list of (number of atoms, seconds)
+    """
+    results = list()
+    run_dir = tempfile.mkdtemp()
+    try:
+        for number_of_atoms in sizes:
+            mmcif_file = os.path.join(run_dir, 'synthetic_{}.cif'.format(number_of_atoms))
+            write_synthetic_chain(file_name=mmcif_file, number_of_atoms=number_of_atoms)
+            seconds = time_get_data_from_atom_site(mmcif_file=mmcif_file)
+            logging.info('{} atoms: {:.3f} s, {:.2f} us per atom'.format(number_of_atoms, seconds,
+                                                                         1e6 * seconds / number_of_atoms))
+            results.append((number_of_atoms, seconds))
+    finally:
+        shutil.rmtree(run_dir)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', help='number of atoms in each synthetic chain', type=int, nargs='+',
+                        default=[50000, 100000, 250000, 500000])
+    parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
+                        default=logging.INFO)
+
+    args = parser.parse_args()
+    logger.setLevel(args.loglevel)
+
+    run_benchmark(sizes=args.sizes)
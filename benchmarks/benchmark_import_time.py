@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+PACKAGE = 'adding_stats_to_mmcif'
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# modules which are slow to import and are only imported when they are needed
+HEAVY_MODULES = ['Bio', 'gemmi', 'numpy', 'requests', 'urllib3', 'multiprocessing']
+# seconds `python -m adding_stats_to_mmcif --help` may take on top of starting the interpreter
+STARTUP_BUDGET = 0.15
+
+
+def run_python(arguments):
+    return subprocess.run([sys.executable] + arguments, cwd=PACKAGE_ROOT, capture_output=True, text=True,
+                          check=True)
+
+
+def import_time(module=PACKAGE):
+    """
+    :param module: module to import
+    :return: cumulative import time of the module in seconds, from python -X importtime
+    """
+    result = run_python(['-X', 'importtime', '-c', 'import {}'.format(module)])
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1e6
+    return None
+
+
+def heavy_modules_imported(module=PACKAGE):
+    """
+    :param module: module to import
+    :return: list of HEAVY_MODULES imported by importing the module
+    """
+    script = 'import sys, {}; print(" ".join(sorted({{m.split(".")[0] for m in sys.modules}})))'.format(module)
+    imported = set(run_python(['-c', script]).stdout.split())
+    return [heavy_module for heavy_module in HEAVY_MODULES if heavy_module in imported]
+
+
+def startup_time(repeats=5):
+    """
+    :param repeats: number of times to start the command line, the fastest is used
+    :return: seconds `python -m adding_stats_to_mmcif --help` takes more than `python -c pass`
+    """
+    def fastest(arguments):
+        times = list()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run_python(arguments)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    return fastest(['-m', PACKAGE, '--help']) - fastest(['-c', 'pass'])
+
+
+def run_benchmark(repeats=5, budget=STARTUP_BUDGET):
+    """
+    :param repeats: number of times to start the command line
+    :param budget: seconds the command line may take on top of starting the interpreter
+    :return: True if start up is within budget and no heavy modules are imported up front
+    """
+    logging.info('import {}: {:.3f} s'.format(PACKAGE, import_time()))
+    heavy_modules = heavy_modules_imported()
+    if heavy_modules:
+        logging.warning('imported up front: {}'.format(', '.join(heavy_modules)))
+    seconds = startup_time(repeats=repeats)
+    within_budget = seconds <= budget
+    logging.info('start up: {:.3f} s, budget {:.3f} s: {}'.format(seconds, budget,
+                                                                    'ok' if within_budget else 'over budget'))
+    return within_budget and not heavy_modules
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', help='number of times to start the command line', type=int, default=5)
+    parser.add_argument('--budget', help='start up budget in seconds', type=float, default=STARTUP_BUDGET)
+    parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
+                        default=logging.INFO)
+
+    args = parser.parse_args()
+    logger.setLevel(args.loglevel)
+
+    if not run_benchmark(repeats=args.repeats, budget=args.budget):
+        sys.exit(1)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_entry import MODIFIED_RESIDUES, get_parameters, scale_parameters, write_synthetic_entry
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+BENCHMARKS = ['run_process', 'get_sequence_dict', 'get_best_match', 'aimless_return_data', 'add_to_cif']
+DEFAULT_SCALES = [1, 2, 4, 8]
+# a benchmark which takes this many times longer than in the baseline results is a regression
+DEFAULT_TOLERANCE = 1.25
+# differences smaller than this are timing noise, not regressions
+MIN_REGRESSION_SECONDS = 0.01
+
+
+def isolate_caches(cache_dir):
+    """
+    keep the benchmark off the network and away from the user's caches: a private compound cache holding the
+    modified residues of the synthetic entries, no CCD index and alignment scores only kept in memory.
+    Must be called before anything uses the caches
+    :param cache_dir: directory for the private compound cache
+    """
+    from adding_stats_to_mmcif.alignment_memo import MEMO_FILE_ENV
+    from adding_stats_to_mmcif.ccd_index import CCD_INDEX_ENV
+    from adding_stats_to_mmcif.compound_cache import CACHE_DIR_ENV, CompoundCache
+
+    os.environ[CACHE_DIR_ENV] = cache_dir
+    os.environ[CCD_INDEX_ENV] = ''
+    os.environ.pop(MEMO_FILE_ENV, None)
+    CompoundCache(cache_dir=cache_dir).set_many(MODIFIED_RESIDUES)
+
+
+def best_time(function, repeats, setup=None):
+    """
+    :param function: function to time
+    :param repeats: number of times to run it
+    :param setup: function run before each repeat, which is not timed. Its result is passed to function
+    :return: fastest time in seconds
+    """
+    times = list()
+    for _ in range(repeats):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument) if setup else function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def time_entry(files, output_dir, repeats=3):
+    """
+    :param files: dictionary from write_synthetic_entry
+    :param output_dir: directory for the output mmCIF
+    :param repeats: number of times each benchmark is run, the fastest is kept
+    :return: dictionary of benchmark: seconds
+    """
+    from adding_stats_to_mmcif import run_process
+    from adding_stats_to_mmcif.add_data_from_aimless_xml import get_xml_data
+    from adding_stats_to_mmcif.add_sequence_to_mmcif import AddSequenceToMmcif, ExtractFromMmcif
+    from adding_stats_to_mmcif.aimless_xml_parser import aimlessReport
+    from adding_stats_to_mmcif.alignment_memo import get_alignment_memo
+    from adding_stats_to_mmcif.cif_handling import mmcifHandling
+
+    output_mmcif = os.path.join(output_dir, 'output.cif')
+    memo = get_alignment_memo()
+    seconds = dict()
+
+    # alignment scores are forgotten before each repeat, so every repeat aligns the sequences
+    seconds['run_process'] = best_time(
+        lambda _: run_process(input_mmcif=files['mmcif'], output_mmcif=output_mmcif, fasta_file=files['fasta'],
+                              xml_file=files['xml']),
+        repeats=repeats, setup=memo.clear)
+
+    def parsed_entry():
+        extract = ExtractFromMmcif()
+        extract.parse_mmcif(mmcif_file=files['mmcif'])
+        return extract
+
+    seconds['get_sequence_dict'] = best_time(lambda extract: extract.get_sequence_dict(), repeats=repeats,
+                                             setup=parsed_entry)
+
+    add_sequence = AddSequenceToMmcif(input_mmcif=files['mmcif'], output_mmcif=output_mmcif,
+                                      fasta_file=files['fasta'])
+    add_sequence.process_input_sequences()
+    seconds['get_best_match'] = best_time(
+        lambda _: [add_sequence.get_best_match(mmcif_sequence=sequence) for sequence in files['sequences']],
+        repeats=repeats, setup=memo.clear)
+
+    seconds['aimless_return_data'] = best_time(lambda: aimlessReport(xml_file=files['xml']).return_data(),
+                                               repeats=repeats)
+
+    xml_data = get_xml_data(xml_file=files['xml'])[0]
+
+    def parsed_mmcif():
+        mm = mmcifHandling()
+        mm.parse_mmcif(fileName=files['mmcif'])
+        return mm
+
+    seconds['add_to_cif'] = best_time(lambda mm: mm.addToCif(data_dictionary=xml_data), repeats=repeats,
+                                      setup=parsed_mmcif)
+    return seconds
+
+
+def run_benchmark(base_parameters, scales=None, repeats=3, seed=0):
+    """
+    generate a synthetic entry at each scale and time each benchmark on it
+    :param base_parameters: dictionary from synthetic_entry.get_parameters, for scale 1
+    :param scales: list of factors the base parameters are multiplied by
+    :param repeats: number of times each benchmark is run, the fastest is kept
+    :param seed: seed for the synthetic entries
+    :return: dictionary of the results, which can be written out as JSON
+    """
+    from adding_stats_to_mmcif import __version__
+
+    results = {'version': __version__,
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+               'repeats': repeats,
+               'seed': seed,
+               'results': []}
+    run_dir = tempfile.mkdtemp()
+    try:
+        isolate_caches(cache_dir=os.path.join(run_dir, 'cache'))
+        for scale in scales if scales else DEFAULT_SCALES:
+            parameters = scale_parameters(parameters=base_parameters, scale=scale)
+            entry_dir = os.path.join(run_dir, 'scale_{}'.format(scale))
+            os.makedirs(entry_dir)
+            files = write_synthetic_entry(output_dir=entry_dir, parameters=parameters, seed=seed)
+            seconds = time_entry(files=files, output_dir=entry_dir, repeats=repeats)
+            logging.info('scale {}: {}'.format(scale, ', '.join('{} {:.4f} s'.format(benchmark, seconds[benchmark])
+                                                                 for benchmark in BENCHMARKS)))
+            results['results'].append({'scale': scale, 'parameters': parameters, 'seconds': seconds})
+    finally:
+        shutil.rmtree(run_dir)
+    return results
+
+
+def compare_results(baseline, results, tolerance=DEFAULT_TOLERANCE):
+    """
+    :param baseline: results from an earlier run_benchmark
+    :param results: results from run_benchmark
+    :param tolerance: ratio of the new time to the baseline time above which a benchmark has regressed
+    :return: list of (benchmark, scale, baseline seconds, seconds) which have regressed
+    """
+    baseline_seconds = {json.dumps(result['parameters'], sort_keys=True): result['seconds']
+                        for result in baseline['results']}
+    regressions = list()
+    for result in results['results']:
+        old_seconds = baseline_seconds.get(json.dumps(result['parameters'], sort_keys=True))
+        if not old_seconds:
+            logging.warning('no baseline for scale {}'.format(result['scale']))
+            continue
+        for benchmark in BENCHMARKS:
+            if benchmark not in old_seconds or benchmark not in result['seconds']:
+                continue
+            ratio = result['seconds'][benchmark] / old_seconds[benchmark] if old_seconds[benchmark] else 1.0
+            logging.info('scale {} {}: {:.4f} s, {:.2f} times version {}'.format(
+                result['scale'], benchmark, result['seconds'][benchmark], ratio, baseline.get('version')))
+            if ratio > tolerance and result['seconds'][benchmark] - old_seconds[benchmark] > MIN_REGRESSION_SECONDS:
+                regressions.append((benchmark, result['scale'], old_seconds[benchmark], result['seconds'][benchmark]))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', help='factors the base sizes are multiplied by', type=float, nargs='+',
+                        default=DEFAULT_SCALES)
+    parser.add_argument('--number_of_atoms', help='number of atoms at scale 1', type=int, default=20000)
+    parser.add_argument('--number_of_entities', help='number of polymer entities at scale 1', type=int, default=2)
+    parser.add_argument('--chains_per_entity', help='number of chains of each entity at scale 1', type=int, default=2)
+    parser.add_argument('--modified_residues', help='number of modified residues in each entity at scale 1', type=int,
+                        default=4)
+    parser.add_argument('--mutations', help='number of point mutations in each entity at scale 1', type=int,
+                        default=2)
+    parser.add_argument('--fasta_sequences', help='number of sequences in the FASTA file at scale 1', type=int,
+                        default=10)
+    parser.add_argument('--number_of_datasets', help='number of datasets in the aimless XML file at scale 1', type=int,
+                        default=1)
+    parser.add_argument('--repeats', help='number of times each benchmark is run', type=int, default=3)
+    parser.add_argument('--seed', help='seed for the synthetic entries', type=int, default=0)
+    parser.add_argument('--output', help='JSON file to write the results to', type=str)
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with', type=str)
+    parser.add_argument('--tolerance', help='slow down compared with the baseline which counts as a regression',
+                        type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
+                        default=logging.INFO)
+
+    args = parser.parse_args()
+    logger.setLevel(args.loglevel)
+
+    benchmark_results = run_benchmark(base_parameters=get_parameters(number_of_atoms=args.number_of_atoms,
+                                                                     number_of_entities=args.number_of_entities,
+                                                                     chains_per_entity=args.chains_per_entity,
+                                                                     modified_residues=args.modified_residues,
+                                                                     mutations=args.mutations,
+                                                                     fasta_sequences=args.fasta_sequences,
+                                                                     number_of_datasets=args.number_of_datasets),
+                                      scales=args.scales, repeats=args.repeats, seed=args.seed)
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            json.dump(benchmark_results, out_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as in_file:
+            regressed = compare_results(baseline=json.load(in_file), results=benchmark_results,
+                                        tolerance=args.tolerance)
+        for regressed_benchmark, regressed_scale, old, new in regressed:
+            logging.warning('{} at scale {} regressed: {:.4f} s to {:.4f} s'.format(regressed_benchmark,
+                                                                                    regressed_scale, old, new))
+        if regressed:
+            sys.exit(1)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+import argparse
+import logging
+import os
+import random
+
+from gemmi import cif
+
+from adding_stats_to_mmcif.add_sequence_to_mmcif import residue_map_1to3
+from adding_stats_to_mmcif.aimless_xml_parser import stats_remap
+
+logger = logging.getLogger()
+FORMAT = "%(filename)s - %(funcName)s - %(message)s"
+logging.basicConfig(format=FORMAT)
+
+AMINO_ACIDS = sorted(residue_map_1to3)
+# modified residues and their one letter codes, put in the compound cache so no PDBe API calls are made
+MODIFIED_RESIDUES = {'MSE': 'M', 'SEP': 'S', 'TPO': 'T', 'PTR': 'Y', 'HYP': 'P', 'MLY': 'K', 'CSO': 'C', 'KCX': 'K'}
+ATOMS_PER_RESIDUE = 8
+# residues of each FASTA sequence which are not modelled
+UNMODELLED_RESIDUES = 5
+CHAIN_IDS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+def get_chain_id(position):
+    """
+    :param position: position of the chain in the entry
+    :return: chain id A to Z, then AA, AB, ...
+    """
+    chain_id = ''
+    position += 1
+    while position:
+        position, remainder = divmod(position - 1, len(CHAIN_IDS))
+        chain_id = CHAIN_IDS[remainder] + chain_id
+    return chain_id
+
+
+def get_parameters(number_of_atoms=20000, number_of_entities=2, chains_per_entity=2, modified_residues=4,
+                   mutations=2, fasta_sequences=10, number_of_datasets=1):
+    """
+    :param number_of_atoms: approximate number of atoms in atom_site, spread over the chains
+    :param number_of_entities: number of polymer entities
+    :param chains_per_entity: number of chains of each entity
+    :param modified_residues: number of modified residues in each entity
+    :param mutations: number of residues in each entity which differ from the FASTA sequence, so it has to be aligned
+    :param fasta_sequences: number of sequences in the FASTA file, at least one per entity
+    :param number_of_datasets: number of datasets in the aimless XML file
+    :return: dictionary of the parameters of a synthetic entry
+    """
+    return {'number_of_atoms': number_of_atoms, 'number_of_entities': number_of_entities,
+            'chains_per_entity': chains_per_entity, 'modified_residues': modified_residues, 'mutations': mutations,
+            'fasta_sequences': max(fasta_sequences, number_of_entities), 'number_of_datasets': number_of_datasets}
+
+
+def scale_parameters(parameters, scale):
+    """
+    :param parameters: dictionary from get_parameters
+    :param scale: factor every parameter is multiplied by
+    :return: dictionary of the scaled parameters
+    """
+    return get_parameters(**{name: max(1, int(round(value * scale))) if value else 0
+                             for name, value in parameters.items()})
+
+
+def write_mmcif(file_name, entities, chains_per_entity):
+    """
+    :param file_name: output mmCIF file
+    :param entities: list of the residue names of each entity
+    :param chains_per_entity: number of chains of each entity
+    """
+    doc = cif.Document()
+    block = doc.add_new_block('SYNTHETIC')
+    block.set_pair('_entry.id', 'SYNTHETIC')
+    block.set_mmcif_category('_entity.', {'id': [str(entity + 1) for entity in range(len(entities))],
+                                          'type': ['polymer'] * len(entities)})
+
+    entity_poly_seq = {'entity_id': [], 'num': [], 'mon_id': [], 'hetero': []}
+    for entity, residues in enumerate(entities):
+        for number, residue in enumerate(residues):
+            entity_poly_seq['entity_id'].append(str(entity + 1))
+            entity_poly_seq['num'].append(str(number + 1))
+            entity_poly_seq['mon_id'].append(residue)
+            entity_poly_seq['hetero'].append('n')
+    block.set_mmcif_category('_entity_poly_seq.', entity_poly_seq)
+
+    block.set_mmcif_category('_software.', {'pdbx_ordinal': ['1'], 'name': ['refmac'], 'classification': ['refinement'],
+                                            'version': ['5.8']})
+    block.set_mmcif_category('_refine.', {'pdbx_refine_id': ['X-RAY DIFFRACTION'], 'ls_d_res_high': ['1.750'],
+                                          'ls_d_res_low': ['43.885'], 'ls_R_factor_R_work': ['0.1622']})
+    block.set_mmcif_category('_refine_ls_shell.', {'pdbx_refine_id': ['X-RAY DIFFRACTION'],
+                                                   'd_res_low': ['1.795'], 'd_res_high': ['1.750']})
+
+    atom_site = {'group_PDB': [], 'id': [], 'type_symbol': [], 'label_atom_id': [], 'label_comp_id': [],
+                 'label_asym_id': [], 'label_entity_id': [], 'label_seq_id': [], 'pdbx_PDB_ins_code': [],
+                 'Cartn_x': [], 'Cartn_y': [], 'Cartn_z': [], 'auth_seq_id': [], 'auth_comp_id': [],
+                 'auth_asym_id': []}
+    atom_id = 0
+    chain = 0
+    for entity, residues in enumerate(entities):
+        for _ in range(chains_per_entity):
+            chain_id = get_chain_id(chain)
+            chain += 1
+            for number, residue in enumerate(residues):
+                for atom in range(ATOMS_PER_RESIDUE):
+                    atom_id += 1
+                    atom_site['group_PDB'].append('HETATM' if residue in MODIFIED_RESIDUES else 'ATOM')
+                    atom_site['id'].append(str(atom_id))
+                    atom_site['type_symbol'].append('C')
+                    atom_site['label_atom_id'].append('C{}'.format(atom))
+                    atom_site['label_comp_id'].append(residue)
+                    atom_site['label_asym_id'].append(chain_id)
+                    atom_site['label_entity_id'].append(str(entity + 1))
+                    atom_site['label_seq_id'].append(str(number + 1))
+                    atom_site['pdbx_PDB_ins_code'].append(None)
+                    atom_site['Cartn_x'].append('{:.3f}'.format(number * 3.8))
+                    atom_site['Cartn_y'].append('{:.3f}'.format(atom * 1.5))
+                    atom_site['Cartn_z'].append('{:.3f}'.format(chain * 10.0))
+                    atom_site['auth_seq_id'].append(str(number + 1))
+                    atom_site['auth_comp_id'].append(residue)
+                    atom_site['auth_asym_id'].append(chain_id)
+    block.set_mmcif_category('_atom_site.', atom_site)
+    doc.write_file(file_name)
+
+
+def write_fasta(file_name, sequences):
+    """
+    :param file_name: output FASTA file
+    :param sequences: list of one letter sequences
+    """
+    with open(file_name, 'w') as out_file:
+        for position, sequence in enumerate(sequences):
+            out_file.write('>synthetic|{}\n'.format(position + 1))
+            for start in range(0, len(sequence), 80):
+                out_file.write(sequence[start:start + 80] + '\n')
+
+
+def write_aimless_xml(file_name, number_of_datasets, random_generator):
+    """
+    :param file_name: output aimless XML file
+    :param number_of_datasets: number of datasets
+    :param random_generator: random.Random
+    """
+    xml_items = set()
+    for cif_category in stats_remap:
+        xml_items.update(stats_remap[cif_category]['cif_to_xml'].values())
+    resolution = {'ResolutionLow': ('43.50', '43.50', '1.80'), 'ResolutionHigh': ('1.75', '9.08', '1.75')}
+    lines = ['<AIMLESS_PIPE>', '    <AIMLESS version="0.7.4" RunTime="Thu Jan  1 00:00:00 2015">', '        <Result>']
+    for dataset in range(number_of_datasets):
+        lines.append('            <Dataset name="synthetic/{}">'.format(dataset + 1))
+        for xml_item in sorted(xml_items):
+            values = resolution.get(xml_item, ['{:.3f}'.format(random_generator.uniform(0, 100)) for _ in range(3)])
+            lines.append('                <{0}><Overall>{1}</Overall><Inner>{2}</Inner><Outer>{3}</Outer></{0}>'.format(
+                xml_item, *values))
+        lines.append('            </Dataset>')
+    lines.extend(['        </Result>', '    </AIMLESS>', '</AIMLESS_PIPE>'])
+    with open(file_name, 'w') as out_file:
+        out_file.write('\n'.join(lines) + '\n')
+
+
+def write_synthetic_entry(output_dir, parameters, seed=0):
+    """
+    write a synthetic mmCIF, FASTA and aimless XML file. Each entity matches one of the FASTA sequences,
+    without its first UNMODELLED_RESIDUES residues and with point mutations, and has modified residues
+    in place of standard ones
+    :param output_dir: directory to write the files to
+    :param parameters: dictionary from get_parameters
+    :param seed: seed for the random sequences
+    :return: dictionary of the mmCIF, FASTA and XML files and the sequences of the entities
+    """
+    random_generator = random.Random(seed)
+    total_chains = parameters['number_of_entities'] * parameters['chains_per_entity']
+    residues_per_chain = max(UNMODELLED_RESIDUES + 1,
+                             parameters['number_of_atoms'] // (ATOMS_PER_RESIDUE * total_chains))
+    modified_names = sorted(MODIFIED_RESIDUES)
+    parent_to_modified = dict()
+    for name in modified_names:
+        parent_to_modified.setdefault(MODIFIED_RESIDUES[name], name)
+
+    sequences = [''.join(random_generator.choice(AMINO_ACIDS) for _ in range(residues_per_chain + UNMODELLED_RESIDUES))
+                 for _ in range(parameters['fasta_sequences'])]
+    entities = list()
+    entity_sequences = list()
+    for entity in range(parameters['number_of_entities']):
+        sequence = list(sequences[entity][UNMODELLED_RESIDUES:])
+        for position in random_generator.sample(range(len(sequence)), min(parameters['mutations'], len(sequence))):
+            sequence[position] = random_generator.choice([one_letter for one_letter in AMINO_ACIDS
+                                                          if one_letter != sequence[position]])
+        sequence = ''.join(sequence)
+        residues = [residue_map_1to3[one_letter] for one_letter in sequence]
+        modifiable = [position for position, one_letter in enumerate(sequence) if one_letter in parent_to_modified]
+        for position in random_generator.sample(modifiable, min(parameters['modified_residues'], len(modifiable))):
+            residues[position] = parent_to_modified[sequence[position]]
+        entities.append(residues)
+        entity_sequences.append(sequence)
+
+    files = {'mmcif': os.path.join(output_dir, 'synthetic.cif'),
+             'fasta': os.path.join(output_dir, 'synthetic.fasta'),
+             'xml': os.path.join(output_dir, 'synthetic.xml')}
+    write_mmcif(file_name=files['mmcif'], entities=entities, chains_per_entity=parameters['chains_per_entity'])
+    write_fasta(file_name=files['fasta'], sequences=sequences)
+    write_aimless_xml(file_name=files['xml'], number_of_datasets=parameters['number_of_datasets'],
+                      random_generator=random_generator)
+    files['sequences'] = entity_sequences
+    return files
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output_dir', help='directory to write the synthetic entry to', type=str, required=True)
+    parser.add_argument('--number_of_atoms', help='number of atoms', type=int, default=20000)
+    parser.add_argument('--number_of_entities', help='number of polymer entities', type=int, default=2)
+    parser.add_argument('--chains_per_entity', help='number of chains of each entity', type=int, default=2)
+    parser.add_argument('--modified_residues', help='number of modified residues in each entity', type=int, default=4)
+    parser.add_argument('--mutations', help='number of point mutations in each entity', type=int, default=2)
+    parser.add_argument('--fasta_sequences', help='number of sequences in the FASTA file', type=int, default=10)
+    parser.add_argument('--number_of_datasets', help='number of datasets in the aimless XML file', type=int,
+                        default=1)
+    parser.add_argument('--seed', help='seed for the random sequences', type=int, default=0)
+    parser.add_argument('-d', '--debug', help='debugging', action='store_const', dest='loglevel', const=logging.DEBUG,
+                        default=logging.INFO)
+
+    args = parser.parse_args()
+    logger.setLevel(args.loglevel)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    written = write_synthetic_entry(output_dir=args.output_dir,
+                                    parameters=get_parameters(number_of_atoms=args.number_of_atoms,
+                                                              number_of_entities=args.number_of_entities,
+                                                              chains_per_entity=args.chains_per_entity,
+                                                              modified_residues=args.modified_residues,
+                                                              mutations=args.mutations,
+                                                              fasta_sequences=args.fasta_sequences,
+                                                              number_of_datasets=args.number_of_datasets),
+                                    seed=args.seed)
+    logging.info('wrote {}, {} and {}'.format(written['mmcif'], written['fasta'], written['xml']))
@@ -1,15 +1,33 @@
+import os
+import re
+
 from setuptools import setup, find_packages
 
+# the version is only set in the package, read without importing it and its requirements
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'adding_stats_to_mmcif', '__init__.py')) as in_file:
+    version = re.search(r"^__version__ = '([^']+)'", in_file.read(), re.MULTILINE).group(1)
+
 setup(
     name='adding_stats_to_mmcif',
-    version='0.5',
+    version=version,
     url='https://github.com/berrisfordjohn/adding_stats_to_mmcif',
     author='John Berrisford',
     test_suite='tests',
     zip_safe=True,
+    # the minimum supported version: metrics need contextvars, contextlib.nullcontext and time.thread_time,
+    # batch and the server need the initializer of ProcessPoolExecutor and the async tests use asyncio.run
+    python_requires='>=3.7',
+    classifiers=['Programming Language :: Python :: 3',
+                 'Programming Language :: Python :: 3 :: Only',
+                 'Programming Language :: Python :: 3.7',
+                 'Programming Language :: Python :: 3.8',
+                 'Programming Language :: Python :: 3.9'],
     packages=['adding_stats_to_mmcif'],
     install_requires=['biopython>=1.72',
                       'requests',
-                      'gemmi'
+                      'gemmi',
+                      'numpy'
                       ],
+    # non-blocking PDBe API calls from run_process_async
+    extras_require={'async': ['aiohttp']},
 )
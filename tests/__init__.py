@@ -7,4 +7,21 @@
 #from tests.test_suite import TestSuite
 #
 #suite = TestSuite(verbosity=2)
-#suite.run_all_tests()
\ No newline at end of file
+#suite.run_all_tests()
+import atexit
+import os
+import shutil
+import tempfile
+
+from adding_stats_to_mmcif import alignment_memo, ccd_index, compound_cache
+
+# the tests use a cache of their own, so they neither depend on nor change the user's cache.
+# Set before any test runs, so worker processes started by the tests use it too
+TEST_CACHE_DIR = tempfile.mkdtemp()
+os.environ[compound_cache.CACHE_DIR_ENV] = TEST_CACHE_DIR
+os.environ[ccd_index.CCD_INDEX_ENV] = ''
+os.environ.pop(alignment_memo.MEMO_FILE_ENV, None)
+compound_cache._compound_cache = None
+ccd_index._ccd_index = None
+alignment_memo._alignment_memo = None
+atexit.register(shutil.rmtree, TEST_CACHE_DIR, True)
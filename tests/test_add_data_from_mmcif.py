@@ -3,7 +3,8 @@ import tempfile
 import os
 import shutil
 from tests.access_test_files import TestFiles
-from adding_stats_to_mmcif.add_data_from_mmcif import AddToMmcif
+from adding_stats_to_mmcif.add_data_from_mmcif import AddToMmcif, category_matches
+from adding_stats_to_mmcif.cif_handling import mmcifHandling
 
 
 class TestAddDataFromMMCif(unittest.TestCase):
@@ -19,6 +20,42 @@ class TestAddDataFromMMCif(unittest.TestCase):
         ret = self.ac.get_data(mmcif_file=self.simple)
         self.assertTrue(ret == {'_category1.': {'item1': ['row1_v1', 'row2_v1'], 'item2': ['row1_v2', 'row2_v2']}})
 
+    def test_get_cif_data_no_coordinates(self):
+        ret = self.ac.get_data(mmcif_file=self.test_files.TEST_VALID_MMCIF_FILE)
+        self.assertTrue('_refine.' in ret)
+        self.assertFalse('_atom_site.' in ret)
+        self.assertFalse('_atom_site_anisotrop.' in ret)
+        self.assertTrue('_atom_sites.' in ret)
+
+    def test_get_cif_data_include_categories(self):
+        ac = AddToMmcif(include_categories=['refine*', 'reflns*', 'software'], exclude_categories=['refine_hist'])
+        ret = ac.get_data(mmcif_file=self.test_files.TEST_VALID_MMCIF_FILE)
+        self.assertTrue(sorted(ret) == ['_refine.', '_refine_ls_restr.', '_refine_ls_shell.', '_reflns.',
+                                        '_reflns_shell.', '_software.'])
+
+    def test_get_cif_data_exclude_nothing(self):
+        ac = AddToMmcif(exclude_categories=[])
+        ret = ac.get_data(mmcif_file=self.test_files.TEST_VALID_MMCIF_FILE)
+        self.assertTrue('_atom_site.' in ret)
+
+    def test_category_matches(self):
+        self.assertTrue(category_matches(category='_pdbx_refine_tls.', patterns=['pdbx_refine*']))
+        self.assertTrue(category_matches(category='_Refine.', patterns=['_refine.']))
+        self.assertFalse(category_matches(category='_refine_hist.', patterns=['refine']))
+
+    def test_copy_to_mmcif(self):
+        self.test_files.one_sequence()
+        mm = mmcifHandling()
+        mm.parse_mmcif(fileName=self.test_files.cif)
+        number_of_software = len(mm.getCatItemValues(category='software', item='name'))
+        ac = AddToMmcif(include_categories=['refine', 'reflns', 'software'])
+        self.assertTrue(ac.parse_mmcif(mmcif_file=self.test_files.TEST_VALID_MMCIF_FILE))
+        self.assertTrue(ac.copy_to_mmcif(mmcif=mm))
+        # reflns is copied whole, the rows of refine and software are merged with those already there
+        self.assertTrue(mm.getCategory('reflns') == ac.ch.getCategory('reflns'))
+        self.assertTrue(len(mm.getCatItemValues(category='refine', item='pdbx_refine_id')) == 2)
+        self.assertTrue(len(mm.getCatItemValues(category='software', item='name')) == number_of_software + 4)
+
     def test_add_to_mmcif_new_cat(self):
         data_dict = {'software': {'name': 'Aimless'}}
         ret = self.ac.add_to_cif(input_mmcif_file=self.simple, output_mmcif_file=self.outfile,
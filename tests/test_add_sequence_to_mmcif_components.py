@@ -1,6 +1,7 @@
 import unittest
 from tests.access_test_files import TestFiles
 from adding_stats_to_mmcif.add_sequence_to_mmcif import AddSequenceToMmcif
+from adding_stats_to_mmcif.cif_handling import mmcifHandling
 import tempfile
 import shutil
 import os
@@ -46,6 +47,19 @@ class TestAddDataToMmcif(unittest.TestCase):
             self.assertTrue(sequence_dict.get(entity_id, {}).get('sequence', '') == entity_dict[entity_id]['sequence'])
             self.assertTrue(sorted(chains) == sorted(entity_dict[entity_id]['chains']))
 
+    def test_get_data_from_parsed_3zt9_via_AddSequenceToMmcif(self):
+        self.test_files.one_sequence()
+        parsed = mmcifHandling()
+        self.assertTrue(parsed.parse_mmcif(fileName=self.test_files.cif))
+        mm = AddSequenceToMmcif(input_mmcif=None,
+                                output_mmcif='output.cif',
+                                mmcif_handling=parsed)
+        entity_dict = self.test_files.observed_seq
+        sequence_dict = mm.process_mmcif()
+        self.assertTrue(mm.mmcif.mm is parsed)
+        for entity_id in entity_dict:
+            self.assertTrue(sequence_dict.get(entity_id, {}).get('sequence', '') == entity_dict[entity_id]['sequence'])
+
     def test_process_fasta_one_chain(self):
 
         self.test_files.one_sequence()
@@ -120,6 +134,27 @@ class TestAddDataToMmcif(unittest.TestCase):
         self.assertTrue(best_seq == expected_result)
         self.assertTrue(best_score > 0)
 
+    def test_get_best_match_exact_and_aligned(self):
+        mm = AddSequenceToMmcif(input_mmcif=None, output_mmcif='output.cif')
+        mm.input_sequence_dict = {'A': 'MGATCGATC', 'B': 'GATCGATCAA', 'C': 'MEKLEVGIYTRAREG'}
+        # DNA found inside a protein sequence is skipped
+        self.assertTrue(mm.get_best_match(mmcif_sequence='GATCG') == ('GATCGATCAA', 5.0))
+        self.assertTrue(mm.get_best_match(mmcif_sequence='EVGIYT') == ('MEKLEVGIYTRAREG', 6.0))
+        best_seq, best_score = mm.get_best_match(mmcif_sequence='EVGXYT')
+        self.assertTrue(best_seq == 'MEKLEVGIYTRAREG')
+        self.assertTrue(best_score == mm.alignment_engine.score_many(query='EVGXYT', targets=[best_seq])[0])
+
+    def test_get_best_matches_parallel_matches_serial(self):
+        self.test_files.five_sequences()
+        mm = AddSequenceToMmcif(input_mmcif=self.test_files.cif, output_mmcif='output.cif',
+                                fasta_file=self.test_files.fasta)
+        mm.process_input_sequences()
+        mmcif_sequences = [sequence[5:-5].replace('A', 'X') for sequence in mm.input_sequence_dict.values()]
+        serial_matches = mm.get_best_matches(mmcif_sequences=mmcif_sequences)
+        mm.workers = 2
+        self.assertTrue(mm.get_best_matches(mmcif_sequences=mmcif_sequences) == serial_matches)
+        self.assertTrue(serial_matches[0][0] == list(mm.input_sequence_dict.values())[0])
+
 
 if __name__ == '__main__':
     unittest.main()
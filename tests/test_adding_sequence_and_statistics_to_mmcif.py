@@ -1,10 +1,11 @@
 import unittest
+import asyncio
 from tests.access_test_files import TestFiles
 import tempfile
 import os
 import shutil
 
-from adding_stats_to_mmcif import run_process
+from adding_stats_to_mmcif import run_process, run_process_async
 
 
 class TestWholeProcess(unittest.TestCase):
@@ -36,6 +37,49 @@ class TestWholeProcess(unittest.TestCase):
         self.assertTrue(os.path.exists(output_cif))
         shutil.rmtree(test_dir)
 
+    def test_3zt9_without_statistics(self):
+        test_dir = tempfile.mkdtemp()
+        output_cif = os.path.join(test_dir, 'output.cif')
+        self.test_files.one_sequence()
+        worked = run_process(input_mmcif=self.test_files.cif, output_mmcif=output_cif,
+                             fasta_file=self.test_files.fasta,
+                             )
+        self.assertTrue(worked)
+        self.assertTrue(os.listdir(test_dir) == ['output.cif'])
+        shutil.rmtree(test_dir)
+
+    def test_3zt9_without_statistics_async(self):
+        test_dir = tempfile.mkdtemp()
+        output_cif = os.path.join(test_dir, 'output.cif')
+        async_output_cif = os.path.join(test_dir, 'async_output.cif')
+        self.test_files.one_sequence()
+        worked = run_process(input_mmcif=self.test_files.cif, output_mmcif=output_cif,
+                             fasta_file=self.test_files.fasta,
+                             )
+        async_worked = asyncio.run(run_process_async(input_mmcif=self.test_files.cif, output_mmcif=async_output_cif,
+                                                     fasta_file=self.test_files.fasta,
+                                                     ))
+        self.assertTrue(worked and async_worked)
+        with open(output_cif) as in_file, open(async_output_cif) as async_in_file:
+            self.assertTrue(in_file.read() == async_in_file.read())
+        shutil.rmtree(test_dir)
+
+    def test_missing_input_mmcif_async(self):
+        worked = asyncio.run(run_process_async(input_mmcif='missing_file.cif', output_mmcif='output.cif',
+                                               fasta_file=None))
+        self.assertFalse(worked)
+
+    def test_missing_input_mmcif(self):
+        test_dir = tempfile.mkdtemp()
+        output_cif = os.path.join(test_dir, 'output.cif')
+        self.test_files.one_sequence()
+        worked = run_process(input_mmcif='missing_file.cif', output_mmcif=output_cif,
+                             fasta_file=self.test_files.fasta,
+                             )
+        self.assertFalse(worked)
+        self.assertFalse(os.path.exists(output_cif))
+        shutil.rmtree(test_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
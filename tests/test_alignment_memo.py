@@ -0,0 +1,77 @@
+import unittest
+import tempfile
+import shutil
+import os
+from adding_stats_to_mmcif.alignment_memo import AlignmentMemo, get_memo_key
+from adding_stats_to_mmcif.pairwise_align import AlignmentEngine, SequenceAlign
+
+sequence1 = 'MEKLEVGIYTRAREGEIACGDACLVKRVEGVIFLAVGDGIGHGPEAARAAEIAIASMESSMNTGLVNIFQLCHRELRGTRG'
+sequence2 = 'GIYTRAREGEIACGDACLVKRVEGVIXXXXXXXXXGHGPEAARAAEIAIASMESS'
+
+
+class TestAlignmentMemo(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def test_memo_key(self):
+        parameters = AlignmentEngine().parameters
+        key = get_memo_key(parameters=parameters, query=sequence1, target=sequence2)
+        self.assertTrue(key == get_memo_key(parameters=parameters, query=sequence1, target=sequence2))
+        self.assertTrue(key != get_memo_key(parameters=parameters, query=sequence2, target=sequence1))
+        self.assertTrue(key != get_memo_key(parameters=AlignmentEngine(open_gap_score=-5).parameters,
+                                            query=sequence1, target=sequence2))
+
+    def test_hits_and_misses(self):
+        am = AlignmentMemo()
+        self.assertTrue(am.get('a') is None)
+        am.set('a', 1.5)
+        self.assertTrue(am.get('a') == 1.5)
+        self.assertTrue(am.get_stats() == {'hits': 1, 'misses': 1, 'size': 1})
+        am.clear()
+        self.assertTrue(am.get_stats() == {'hits': 0, 'misses': 0, 'size': 0})
+
+    def test_least_recently_used(self):
+        am = AlignmentMemo(max_size=2)
+        am.set('a', 1.0)
+        am.set('b', 2.0)
+        am.get('a')
+        am.set('c', 3.0)
+        self.assertTrue(am.get('b') is None)
+        self.assertTrue(am.get('a') == 1.0)
+        self.assertTrue(am.get('c') == 3.0)
+
+    def test_persisted(self):
+        memo_file = os.path.join(self.test_dir, 'alignments.sqlite')
+        am = AlignmentMemo(memo_file=memo_file)
+        am.set('a', 1.0)
+        other_memo = AlignmentMemo(memo_file=memo_file)
+        self.assertTrue(other_memo.get('a') == 1.0)
+        self.assertTrue(other_memo.hits == 1)
+
+    def test_engine_uses_memo(self):
+        am = AlignmentMemo()
+        engine = AlignmentEngine(memo=am)
+        first = SequenceAlign(sequence1=sequence1, sequence2=sequence2, engine=engine).do_sequence_alignment()
+        second = SequenceAlign(sequence1=sequence1, sequence2=sequence2, engine=engine).do_sequence_alignment()
+        self.assertTrue(first == second)
+        self.assertTrue(first[2] == AlignmentEngine().score(sequence1, sequence2))
+        self.assertTrue(am.hits == 1)
+        self.assertTrue(am.misses == 1)
+
+    def test_parallel_scores_use_memo(self):
+        am = AlignmentMemo()
+        engine = AlignmentEngine(memo=am)
+        pairs = [(sequence1, sequence2), (sequence2, sequence1), (sequence1, 'GATC')]
+        scores = engine.score_pairs(pairs=pairs, workers=2)
+        self.assertTrue(scores == AlignmentEngine().score_pairs(pairs=pairs))
+        self.assertTrue(am.get_stats() == {'hits': 0, 'misses': 2, 'size': 2})
+        self.assertTrue(engine.score_pairs(pairs=pairs, workers=2) == scores)
+        self.assertTrue(am.hits == 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
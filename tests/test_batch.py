@@ -0,0 +1,95 @@
+import unittest
+from tests.access_test_files import TestFiles
+import tempfile
+import shutil
+import json
+import os
+
+from adding_stats_to_mmcif.batch import read_manifest, run_batch, main, get_entry_hash, get_run_hash
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.test_files = TestFiles()
+        self.test_files.one_sequence()
+        self.test_dir = tempfile.mkdtemp()
+        self.output_cif = os.path.join(self.test_dir, 'output.cif')
+        self.csv_manifest = os.path.join(self.test_dir, 'manifest.csv')
+        with open(self.csv_manifest, 'w') as out_file:
+            out_file.write('input_mmcif,output_mmcif,fasta_file\n')
+            out_file.write('{},{},{}\n'.format(self.test_files.cif, self.output_cif, self.test_files.fasta))
+            out_file.write('missing_file.cif,{},\n'.format(os.path.join(self.test_dir, 'missing.cif')))
+
+    def test_read_csv_manifest(self):
+        entries = read_manifest(manifest_file=self.csv_manifest)
+        self.assertTrue(len(entries) == 2)
+        self.assertTrue(entries[0]['input_mmcif'] == self.test_files.cif)
+        self.assertTrue(entries[0]['xml_file'] is None)
+        self.assertTrue(entries[1]['fasta_file'] is None)
+
+    def test_read_json_manifest(self):
+        json_manifest = os.path.join(self.test_dir, 'manifest.json')
+        with open(json_manifest, 'w') as out_file:
+            json.dump([{'input_mmcif': self.test_files.cif, 'output_mmcif': self.output_cif}], out_file)
+        entries = read_manifest(manifest_file=json_manifest)
+        self.assertTrue(entries == [{'input_mmcif': self.test_files.cif, 'output_mmcif': self.output_cif,
+                                     'fasta_file': None, 'xml_file': None, 'input_mmcif_to_get_data_from': None}])
+
+    def test_manifest_without_output(self):
+        json_manifest = os.path.join(self.test_dir, 'manifest.json')
+        with open(json_manifest, 'w') as out_file:
+            json.dump([{'input_mmcif': self.test_files.cif}], out_file)
+        self.assertRaises(ValueError, read_manifest, json_manifest)
+
+    def test_run_batch_on_pool(self):
+        results = run_batch(entries=read_manifest(manifest_file=self.csv_manifest), workers=2)
+        self.assertTrue([result['worked'] for result in results] == [True, False])
+        self.assertTrue(os.path.exists(self.output_cif))
+
+    def test_exit_code(self):
+        report = os.path.join(self.test_dir, 'report.json')
+        self.assertTrue(main(['--manifest', self.csv_manifest, '--workers', '1', '--report', report]) == 1)
+        with open(report) as in_file:
+            results = json.load(in_file)
+        self.assertTrue(results[0]['worked'])
+        self.assertTrue(results[1]['error'] == 'processing failed')
+
+    def test_resume_skips_up_to_date_entries(self):
+        input_cif = os.path.join(self.test_dir, 'input.cif')
+        shutil.copy(self.test_files.cif, input_cif)
+        entries = [{'input_mmcif': input_cif, 'output_mmcif': self.output_cif, 'fasta_file': self.test_files.fasta,
+                    'xml_file': None, 'input_mmcif_to_get_data_from': None}]
+        state_file = os.path.join(self.test_dir, 'manifest.state')
+        results = run_batch(entries=entries, state_file=state_file)
+        self.assertTrue(results[0]['worked'] and not results[0]['skipped'])
+        results = run_batch(entries=entries, state_file=state_file)
+        self.assertTrue(results[0]['worked'] and results[0]['skipped'])
+        # a changed output is redone
+        with open(self.output_cif, 'a') as out_file:
+            out_file.write('#\n')
+        results = run_batch(entries=entries, state_file=state_file)
+        self.assertFalse(results[0]['skipped'])
+        # as is a changed input
+        with open(input_cif, 'a') as out_file:
+            out_file.write('#\n')
+        results = run_batch(entries=entries, state_file=state_file)
+        self.assertFalse(results[0]['skipped'])
+        self.assertTrue(run_batch(entries=entries, state_file=state_file)[0]['skipped'])
+        self.assertFalse(run_batch(entries=entries, state_file=state_file, force=True)[0]['skipped'])
+
+    def test_entry_hash(self):
+        entry = read_manifest(manifest_file=self.csv_manifest)[0]
+        entry_hash = get_entry_hash(entry=entry, run_hash=get_run_hash())
+        self.assertTrue(entry_hash == get_entry_hash(entry=entry, run_hash=get_run_hash()))
+        self.assertTrue(entry_hash != get_entry_hash(entry=entry, run_hash=get_run_hash(banded=True)))
+        run_hash = get_run_hash(include_categories=['refine*'])
+        self.assertTrue(entry_hash != get_entry_hash(entry=entry, run_hash=run_hash))
+        self.assertTrue(entry_hash != get_entry_hash(entry=entry, run_hash=get_run_hash(exclude_categories=[])))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import tempfile
+import shutil
+
+from adding_stats_to_mmcif.add_sequence_to_mmcif import ExtractFromMmcif
+from adding_stats_to_mmcif.aimless_xml_parser import aimlessReport
+from adding_stats_to_mmcif.compound_cache import CompoundCache
+from benchmarks.benchmark_suite import compare_results
+from benchmarks.synthetic_entry import MODIFIED_RESIDUES, get_chain_id, get_parameters, scale_parameters, \
+    write_synthetic_entry
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def test_chain_ids(self):
+        self.assertTrue([get_chain_id(position) for position in [0, 25, 26, 27]] == ['A', 'Z', 'AA', 'AB'])
+
+    def test_scale_parameters(self):
+        parameters = scale_parameters(parameters=get_parameters(mutations=0), scale=2)
+        self.assertTrue(parameters['number_of_atoms'] == 40000)
+        self.assertTrue(parameters['number_of_entities'] == 4)
+        self.assertTrue(parameters['mutations'] == 0)
+
+    def test_synthetic_entry(self):
+        parameters = get_parameters(number_of_atoms=2000, number_of_entities=2, chains_per_entity=2, mutations=0,
+                                    number_of_datasets=2)
+        files = write_synthetic_entry(output_dir=self.test_dir, parameters=parameters)
+        compound_cache = CompoundCache(cache_dir=self.test_dir)
+        compound_cache.set_many(MODIFIED_RESIDUES)
+        extract = ExtractFromMmcif(compound_cache=compound_cache)
+        extract.parse_mmcif(mmcif_file=files['mmcif'])
+        sequence_dict = extract.get_sequence_dict()
+        self.assertTrue(sequence_dict['1']['sequence'] == files['sequences'][0])
+        self.assertTrue(sequence_dict['2']['chains'] == ['C', 'D'])
+        xml_data = aimlessReport(xml_file=files['xml']).return_data()
+        self.assertTrue(len(xml_data['reflns_shell']['d_res_high']) == 2)
+
+    def test_compare_results(self):
+        parameters = get_parameters()
+        baseline = {'version': '0.5', 'results': [{'scale': 1, 'parameters': parameters,
+                                                   'seconds': {'run_process': 1.0, 'add_to_cif': 0.001}}]}
+        results = {'results': [{'scale': 1, 'parameters': parameters,
+                                'seconds': {'run_process': 2.0, 'add_to_cif': 0.002}}]}
+        self.assertTrue(compare_results(baseline=baseline, results=results) == [('run_process', 1, 1.0, 2.0)])
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import asyncio
+import tempfile
+import shutil
+import os
+from adding_stats_to_mmcif.ccd_index import CcdIndex, build_ccd_index, read_chem_comps
+from adding_stats_to_mmcif.get_data_from_pdbe_api import GetSpecificDataFromPdbeAPI
+
+COMPONENTS_CIF = '''data_HOH
+#
+_chem_comp.id                                    HOH
+_chem_comp.name                                  WATER
+_chem_comp.type                                  NON-POLYMER
+_chem_comp.mon_nstd_parent_comp_id               ?
+_chem_comp.one_letter_code                       ?
+#
+data_MSE
+#
+_chem_comp.id                                    MSE
+_chem_comp.name                                  SELENOMETHIONINE
+_chem_comp.type                                  "L-PEPTIDE LINKING"
+_chem_comp.mon_nstd_parent_comp_id               MET
+_chem_comp.one_letter_code                       M
+#
+data_MET
+#
+_chem_comp.id                                    MET
+_chem_comp.name                                  METHIONINE
+_chem_comp.mon_nstd_parent_comp_id               ?
+_chem_comp.one_letter_code                       M
+#
+data_SEP
+#
+_chem_comp.id                                    SEP
+_chem_comp.name                                  PHOSPHOSERINE
+_chem_comp.mon_nstd_parent_comp_id
+SER
+_chem_comp.one_letter_code                       ?
+#
+data_SER
+#
+_chem_comp.id                                    SER
+_chem_comp.mon_nstd_parent_comp_id               ?
+_chem_comp.one_letter_code                       S
+#
+data_XYZ
+#
+_chem_comp.id                                    XYZ
+_chem_comp.mon_nstd_parent_comp_id               "SER,MET"
+_chem_comp.one_letter_code                       ?
+'''
+
+
+class TestCcdIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.components_cif = os.path.join(self.test_dir, 'components.cif')
+        with open(self.components_cif, 'w') as out_file:
+            out_file.write(COMPONENTS_CIF)
+        self.index_file = os.path.join(self.test_dir, 'components.idx')
+
+    def test_read_chem_comps(self):
+        chem_comps = list(read_chem_comps(components_cif=self.components_cif))
+        self.assertTrue(len(chem_comps) == 6)
+        self.assertTrue(chem_comps[0] == ('HOH', None, None))
+        self.assertTrue(chem_comps[1] == ('MSE', 'M', 'MET'))
+        self.assertTrue(chem_comps[3] == ('SEP', None, 'SER'))
+        self.assertTrue(chem_comps[5] == ('XYZ', None, 'SER,MET'))
+
+    def test_build_and_look_up(self):
+        number_of_compounds = build_ccd_index(components_cif=self.components_cif, index_file=self.index_file)
+        self.assertTrue(number_of_compounds == 6)
+        ccd_index = CcdIndex(index_file=self.index_file)
+        self.assertTrue(len(ccd_index) == 6)
+        self.assertTrue(ccd_index.get_one_letter_code('MSE') == 'M')
+        self.assertTrue(ccd_index.get_one_letter_code('mse') == 'M')
+        self.assertTrue(ccd_index.get_one_letter_code('SEP') == 'S')
+        self.assertTrue(ccd_index.get_one_letter_code('HOH') == 'X')
+        self.assertTrue(ccd_index.get_one_letter_code('XYZ') == 'X')
+        self.assertTrue(ccd_index.get_one_letter_code('TPO') is None)
+        self.assertTrue(ccd_index.get_one_letter_code('A') is None)
+        self.assertTrue(ccd_index.get_one_letter_code('ZZZ') is None)
+        self.assertTrue(ccd_index.get_one_letter_code(None) is None)
+
+    def test_long_compound_id(self):
+        build_ccd_index(components_cif=self.components_cif, index_file=self.index_file)
+        ccd_index = CcdIndex(index_file=self.index_file)
+        self.assertTrue(ccd_index.get_record('MSE') == ('M', 'MET'))
+        self.assertTrue(ccd_index.get_record('MSE\x00\x00\x00\x00\x00X') is None)
+        self.assertTrue(ccd_index.get_record('MSEMSEMSE') is None)
+
+    def test_missing_index(self):
+        ccd_index = CcdIndex(index_file=self.index_file)
+        self.assertFalse(ccd_index.is_available())
+        self.assertTrue(ccd_index.get_one_letter_code('MSE') is None)
+
+    def test_not_an_index(self):
+        ccd_index = CcdIndex(index_file=self.components_cif)
+        self.assertFalse(ccd_index.is_available())
+
+    def test_index_before_network(self):
+        build_ccd_index(components_cif=self.components_cif, index_file=self.index_file)
+        api = GetSpecificDataFromPdbeAPI(server_root='https://www.ebiWRONG.ac.uk/pdbe/api/',
+                                         ccd_index=CcdIndex(index_file=self.index_file))
+        self.assertTrue(api.get_one_letter_code_for_compound('SEP') == 'S')
+        self.assertTrue(api.lookup_worked)
+        s = api.get_one_letter_codes_for_compounds(compounds=['MSE', 'TPO'])
+        self.assertEqual(s, {'MSE': 'M', 'TPO': 'X'})
+        self.assertEqual(api.failed_lookups, {'TPO'})
+
+    def test_index_before_network_async(self):
+        build_ccd_index(components_cif=self.components_cif, index_file=self.index_file)
+        api = GetSpecificDataFromPdbeAPI(server_root='https://www.ebiWRONG.ac.uk/pdbe/api/',
+                                         ccd_index=CcdIndex(index_file=self.index_file))
+        s = asyncio.run(api.get_one_letter_codes_for_compounds_async(compounds=['MSE', 'sep', 'TPO']))
+        self.assertEqual(s, {'MSE': 'M', 'sep': 'S', 'TPO': 'X'})
+        self.assertEqual(api.failed_lookups, {'TPO'})
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
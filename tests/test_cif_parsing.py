@@ -1,7 +1,9 @@
 import unittest
 
+import numpy as np
+
 from tests.access_test_files import TestFiles
-from adding_stats_to_mmcif.cif_handling import mmcifHandling
+from adding_stats_to_mmcif.cif_handling import mmcifHandling, encode_column
 
 
 class TestXmlParsing(unittest.TestCase):
@@ -127,6 +129,89 @@ class TestXmlParsing(unittest.TestCase):
             actual_len = len(ret.get(prepared_cat, {}).get(item, []))
             self.assertTrue(expected_num == actual_len)
 
+    def test_encode_column(self):
+        values = ['A', 'B', 'A', '', 'B']
+        ret = encode_column(values)
+        self.assertTrue(ret.labels == ['A', 'B', ''])
+        self.assertTrue(ret.codes.tolist() == [0, 1, 0, 2, 1])
+        self.assertTrue(ret.decode() == values)
+        self.assertTrue(len(ret) == 5)
+
+    def test_getCategoryArrays(self):
+        self.test_files.one_sequence()
+        self.mh.parse_mmcif(fileName=self.test_files.cif)
+        items = ['label_entity_id', 'auth_asym_id', 'label_comp_id', 'auth_seq_id', 'Cartn_x', 'missing_item']
+        ret = self.mh.getCategoryArrays(category='atom_site', items=items,
+                                        dtypes={'auth_seq_id': np.int64, 'Cartn_x': np.float64})
+        self.assertTrue('missing_item' not in ret)
+        self.assertTrue(ret['auth_seq_id'].dtype == np.int64)
+        self.assertTrue(ret['Cartn_x'].dtype == np.float64)
+        for item in ['label_entity_id', 'auth_asym_id', 'label_comp_id']:
+            values = self.mh.getCatItemValues(category='atom_site', item=item)
+            self.assertTrue(ret[item].decode() == values)
+        values = self.mh.getCatItemValues(category='atom_site', item='auth_seq_id')
+        self.assertTrue(ret['auth_seq_id'].tolist() == [int(value) for value in values])
+
+    def test_getCategoryArrays_non_numeric(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_SIMPLE_CIF)
+        ret = self.mh.getCategoryArrays(category='category1', items=['item1'], dtypes={'item1': np.int64})
+        self.assertTrue(ret['item1'].decode() == ['row1_v1', 'row2_v1'])
+
+    def test_getCategoryRows(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_SIMPLE_CIF)
+        rows = self.mh.getCategoryRows(category='category1', items=['item1', 'item2'])
+        self.assertTrue(next(rows) == ('row1_v1', 'row1_v2'))
+        self.assertTrue(list(rows) == [('row2_v1', 'row2_v2')])
+        values = self.mh.getCategoryValues(category='category1', item='item2')
+        self.assertTrue(list(values) == ['row1_v2', 'row2_v2'])
+
+    def test_categoryUpdate_commits_once(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_SIMPLE_CIF)
+        category = 'category1'
+        prepared_cat = self.mh.prepareCategory(category=category)
+        with self.mh.categoryUpdate() as update:
+            self.assertTrue(update.add_values(category=category, item_value_dictionary={'item1': 'row3_v1'}))
+            self.assertTrue(update.add_values(category=category, item_value_dictionary={'item2': 'row4_v2'}))
+            self.assertTrue(update.add_values(category='category2', item_value_dictionary={'item1': 'value1'}))
+            update.merge_values(category='category2', item_value_dictionary={'item2': 'value2'})
+            self.assertTrue(len(self.mh.getCategories()) == 1)
+        result = {prepared_cat: {'item1': ['row1_v1', 'row2_v1', 'row3_v1', ''],
+                                 'item2': ['row1_v2', 'row2_v2', '', 'row4_v2']}}
+        self.assertTrue(self.mh.getCategory(category) == result)
+        self.assertTrue(self.mh.getCategory('category2') == {self.mh.prepareCategory('category2'): {
+            'item1': ['value1'], 'item2': ['value2']}})
+
+    def test_categoryUpdate_rollback(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_SIMPLE_CIF)
+        category = 'category1'
+        current = self.mh.getCategory(category)
+        update = self.mh.categoryUpdate()
+        self.assertTrue(update.add_values(category=category, item_value_dictionary={'item1': 'row3_v1'}))
+        self.assertFalse(update.add_values(category=category, item_value_dictionary={'item3': ['v1', 'v2']}))
+        update.rollback()
+        update.commit()
+        self.assertTrue(self.mh.getCategory(category) == current)
+        with self.assertRaises(ValueError):
+            with self.mh.categoryUpdate() as update:
+                update.add_values(category=category, item_value_dictionary={'item1': 'row3_v1'})
+                raise ValueError('stop')
+        self.assertTrue(self.mh.getCategory(category) == current)
+
+    def test_addToCif_inconsistent_category_not_written(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_SIMPLE_CIF)
+        data_dictionary = {'category2': {'item1': 'value1'}, 'category1': {'item3': ['v1', 'v2', 'v3']}}
+        ok = self.mh.addToCif(data_dictionary=data_dictionary)
+        self.assertFalse(ok)
+        self.assertTrue(len(self.mh.getCategories()) == 1)
+
+    def test_software_row_added_once(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_VALID_MMCIF_FILE)
+        names = self.mh.getCatItemValues(category='software', item='name')
+        with self.mh.categoryUpdate() as update:
+            update.add_values(category='software', item_value_dictionary={'name': 'Aimless'},
+                              ordinal_item='pdbx_ordinal')
+        self.assertTrue(self.mh.getCatItemValues(category='software', item='name') == names + ['Aimless'])
+
 
 if __name__ == '__main__':
     unittest.main()
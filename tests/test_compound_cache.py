@@ -0,0 +1,90 @@
+import unittest
+import tempfile
+import shutil
+import os
+from adding_stats_to_mmcif.compound_cache import CompoundCache
+from adding_stats_to_mmcif.add_sequence_to_mmcif import ExtractFromMmcif, residue_map_3to1
+from tests.access_test_files import TestFiles
+
+
+class TestCompoundCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cc = CompoundCache(cache_dir=self.cache_dir)
+
+    def test_missing_compound(self):
+        self.assertTrue(self.cc.get('TPO') is None)
+        self.assertTrue(self.cc.get(None) is None)
+
+    def test_set_and_get(self):
+        ok = self.cc.set('TPO', 'T')
+        self.assertTrue(ok)
+        self.assertTrue(self.cc.get('TPO') == 'T')
+        self.assertTrue(self.cc.get('tpo') == 'T')
+        self.assertTrue(os.path.exists(self.cc.cache_file))
+
+    def test_shared_between_instances(self):
+        self.cc.set('SEP', 'S')
+        other_cache = CompoundCache(cache_dir=self.cache_dir)
+        self.assertTrue(other_cache.get('SEP') == 'S')
+        other_cache.set('SEP', 'X')
+        self.assertTrue(self.cc.get('SEP') == 'X')
+
+    def test_expired(self):
+        expired_cache = CompoundCache(cache_dir=self.cache_dir, max_age=-1)
+        expired_cache.set('MSE', 'M')
+        self.assertTrue(expired_cache.get('MSE') is None)
+        self.assertTrue(self.cc.get('MSE') == 'M')
+        self.assertTrue(expired_cache.remove_expired() == 1)
+        self.assertTrue(self.cc.get('MSE') is None)
+
+    def test_remove_expired_from_broken_cache(self):
+        self.assertTrue(self.cc.connect())
+        self.cc.connection.execute('DROP TABLE compounds')
+        self.assertTrue(self.cc.remove_expired() == 0)
+
+    def test_cache_turned_off(self):
+        cc = CompoundCache(cache_dir='')
+        self.assertFalse(cc.set('TPO', 'T'))
+        self.assertTrue(cc.get('TPO') is None)
+
+    def test_unwritable_cache_dir(self):
+        not_a_dir = os.path.join(self.cache_dir, 'file')
+        with open(not_a_dir, 'w') as out_file:
+            out_file.write('')
+        cc = CompoundCache(cache_dir=not_a_dir)
+        self.assertFalse(cc.set('TPO', 'T'))
+        self.assertTrue(cc.get('TPO') is None)
+
+    def test_get_non_standard_one_letter_from_cache(self):
+        self.cc.set('XYZ', 'K')
+        mm = ExtractFromMmcif(compound_cache=self.cc)
+        one_letter = mm.get_non_standard_one_letter(three_letter='XYZ')
+        self.assertTrue(one_letter == 'K')
+        self.assertTrue(mm.non_standard_residue_mapping == {'XYZ': 'K'})
+
+    def test_set_and_get_many(self):
+        ok = self.cc.set_many({'TPO': 'T', 'sep': 'S'})
+        self.assertTrue(ok)
+        ret = self.cc.get_many(['TPO', 'SEP', 'MSE', None])
+        self.assertTrue(ret == {'TPO': 'T', 'SEP': 'S'})
+        self.assertTrue(self.cc.get_many([]) == dict())
+
+    def test_resolve_non_standard_residues_from_cache(self):
+        test_files = TestFiles()
+        test_files.one_sequence()
+        mm = ExtractFromMmcif(compound_cache=self.cc)
+        mm.parse_mmcif(mmcif_file=test_files.cif)
+        non_standard = {compound: 'X' for compound in mm.get_compounds() if compound not in residue_map_3to1}
+        self.assertTrue('HOH' in non_standard)
+        self.cc.set_many(non_standard)
+        mm.resolve_non_standard_residues()
+        self.assertTrue(mm.non_standard_residue_mapping == non_standard)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
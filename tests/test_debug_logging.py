@@ -0,0 +1,55 @@
+import unittest
+import logging
+import os
+import sys
+
+from adding_stats_to_mmcif.debug_logging import DEBUG_ITEMS_ENV, MAX_STRING_LENGTH, Summary, debug, summarise
+
+
+class Unprintable:
+
+    def __repr__(self):
+        raise AssertionError('summarised when debug messages are not emitted')
+
+
+class TestDebugLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.level = logging.getLogger().level
+        os.environ.pop(DEBUG_ITEMS_ENV, None)
+
+    def test_summarise_dictionary(self):
+        atom_site_dict = {'1': {'A': list(range(1000))}, '2': {}}
+        self.assertTrue(summarise(atom_site_dict, max_items=2) ==
+                        "2 keys {'1': 1 keys {'A': 1000 items [0, 1, ...]}, '2': 0 keys {}}")
+
+    def test_summarise_long_string(self):
+        summary = summarise('A' * 1000)
+        self.assertTrue('1000 characters' in summary)
+        self.assertTrue(len(summary) < MAX_STRING_LENGTH + 30)
+
+    def test_summarise_everything(self):
+        os.environ[DEBUG_ITEMS_ENV] = '0'
+        self.assertTrue(summarise(list(range(10))) == '10 items [{}]'.format(', '.join(str(i) for i in range(10))))
+        self.assertTrue(summarise('A' * 1000) == repr('A' * 1000))
+
+    def test_not_summarised_above_debug(self):
+        logging.getLogger().setLevel(logging.INFO)
+        debug('value: %s', Unprintable())
+
+    def test_debug_message(self):
+        logging.getLogger().setLevel(logging.DEBUG)
+        with self.assertLogs(level=logging.DEBUG) as logs:
+            debug('sequences: %s', {'1': 'MKV'})
+        self.assertTrue(logs.records[0].getMessage() == "sequences: 1 keys {'1': 'MKV'}")
+        if sys.version_info >= (3, 8):
+            self.assertTrue(logs.records[0].funcName == 'test_debug_message')
+        self.assertTrue(str(Summary([1, 2])) == '2 items [1, 2]')
+
+    def tearDown(self):
+        logging.getLogger().setLevel(self.level)
+        os.environ.pop(DEBUG_ITEMS_ENV, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
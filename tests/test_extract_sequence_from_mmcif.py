@@ -1,4 +1,7 @@
 import unittest
+import tempfile
+import shutil
+import os
 from tests.access_test_files import TestFiles
 from adding_stats_to_mmcif.add_sequence_to_mmcif import ExtractFromMmcif
 
@@ -83,6 +86,37 @@ class TestGetDataFromMmcif(unittest.TestCase):
             self.assertTrue(sequence_dict.get(entity_id, {}).get('sequence', '') == entity_dict[entity_id]['sequence'])
             self.assertTrue(sorted(chains) == sorted(entity_dict[entity_id]['chains']))
 
+    def test_get_data_from_atom_site_insertion_codes(self):
+        # residue 52A is a new residue, the second part of residue 52 is not
+        atom_site = """data_test
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.label_comp_id
+_atom_site.label_entity_id
+_atom_site.pdbx_PDB_ins_code
+_atom_site.auth_seq_id
+_atom_site.auth_asym_id
+ATOM 1 GLY 1 ? 51 A
+ATOM 2 GLY 1 ? 51 A
+ATOM 3 ALA 1 ? 52 A
+ATOM 4 ALA 1 ? 52 A
+ATOM 5 CYS 1 A 52 A
+ATOM 6 ALA 1 ? 52 A
+ATOM 7 TRP 1 ? 53 A
+"""
+        temp_dir = tempfile.mkdtemp()
+        mmcif_file = os.path.join(temp_dir, 'atom_site.cif')
+        with open(mmcif_file, 'w') as out_file:
+            out_file.write(atom_site)
+        ok = self.mm.parse_mmcif(mmcif_file=mmcif_file)
+        self.assertTrue(ok)
+        self.mm.sequence_dict = {'1': {'sequence': '', 'chains': []}}
+        self.mm.get_data_from_atom_site()
+        self.assertTrue(self.mm.sequence_dict['1']['chains'] == ['A'])
+        self.assertTrue(self.mm.sequence_dict['1']['sequence'] == 'GACW')
+        shutil.rmtree(temp_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -137,6 +137,86 @@ class TestGemmiCifHandling(unittest.TestCase):
         ret = self.mh.getCatItemsValues(category=category, items=[item])
         self.assertTrue(ret == result)
 
+    def test_getCategoryColumns(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_SIMPLE_CIF)
+        self.mh.getDatablock(0)
+        result = {'item1': ['row1_v1', 'row2_v1'], 'item2': ['row1_v2', 'row2_v2']}
+        ret = self.mh.getCategoryColumns(category='category1')
+        self.assertTrue(ret == result)
+        ret = self.mh.getCategoryColumns(category='category1', items=['item2'])
+        self.assertTrue(ret == {'item2': result['item2']})
+        ret = self.mh.getCategoryColumns(category='missing_category')
+        self.assertTrue(ret == dict())
+
+    def test_getCategory_matches_item_values(self):
+        self.test_files.one_sequence()
+        self.mh.parse_mmcif(fileName=self.test_files.cif)
+        self.mh.getDatablock(0)
+        for category in self.mh.getCategories():
+            ret = self.mh.getCategory(category=category)
+            for item in ret[category]:
+                values = self.mh.getCatItemValues(category=category, item=item)
+                self.assertTrue(ret[category][item] == values)
+            items = list(ret[category])[:2]
+            ret = self.mh.getCategoryColumns(category=category, items=items)
+            for item in items:
+                values = self.mh.getCatItemValues(category=category, item=item)
+                self.assertTrue(ret[item] == values)
+
+    def test_getCategoryAsList(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_SIMPLE_CIF)
+        self.mh.getDatablock(0)
+        result = [{'item1': 'row1_v1', 'item2': 'row1_v2'}, {'item1': 'row2_v1', 'item2': 'row2_v2'}]
+        ret = self.mh.getCategoryAsList(category='category1')
+        self.assertTrue(ret == result)
+        ret = self.mh.getCategoryAsList(category='missing_category')
+        self.assertTrue(ret == list())
+
+    def test_getCategoryItems(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_SIMPLE_CIF)
+        self.mh.getDatablock(0)
+        self.assertTrue(self.mh.getCategoryItems(category='category1') == ['item1', 'item2'])
+        self.assertTrue(self.mh.getCategoryItems(category='missing_category') == list())
+
+    def test_iterCategoryRows(self):
+        self.mh.parse_mmcif(fileName=self.test_files.TEST_SIMPLE_CIF)
+        self.mh.getDatablock(0)
+        ret = list(self.mh.iterCategoryRows(category='category1', items=['item2', 'item1']))
+        self.assertTrue(ret == [('row1_v2', 'row1_v1'), ('row2_v2', 'row2_v1')])
+        ret = list(self.mh.iterCategoryRows(category='category1', items=['item1', 'missing_item']))
+        self.assertTrue(ret == [('row1_v1', None), ('row2_v1', None)])
+        ret = list(self.mh.iterCategoryRows(category='category1', items=['missing_item']))
+        self.assertTrue(ret == [(None,), (None,)])
+        ret = list(self.mh.iterCategoryRows(category='missing_category', items=['item1']))
+        self.assertTrue(ret == list())
+
+    def test_iterCategoryRows_matches_getCategoryAsList(self):
+        self.test_files.one_sequence()
+        self.mh.parse_mmcif(fileName=self.test_files.cif)
+        self.mh.getDatablock(0)
+        items = ['label_entity_id', 'auth_asym_id', 'label_alt_id', 'auth_seq_id']
+        expected = [tuple(row[item] for item in items) for row in self.mh.getCategoryAsList(category='atom_site')]
+        ret = list(self.mh.iterCategoryRows(category='atom_site', items=items))
+        self.assertTrue(ret == expected)
+
+    def test_copyCategories(self):
+        source = mmcifHandling()
+        source.parse_mmcif(fileName=self.test_files.TEST_VALID_MMCIF_FILE)
+        source.getDatablock()
+        self.test_files.one_sequence()
+        self.mh.parse_mmcif(fileName=self.test_files.cif)
+        self.mh.getDatablock()
+        categories = self.mh.getCategories()
+        copied = self.mh.copyCategories(source_block=source.datablock, categories=['refine', 'reflns', 'missing'])
+        self.assertTrue(sorted(copied) == ['refine', 'reflns'])
+        # refine is replaced where it was, reflns is added at the end
+        self.assertTrue(self.mh.getCategories() == categories + ['_reflns.'])
+        self.assertTrue(self.mh.datablock.find_value('_refine.ls_d_res_high') ==
+                        source.datablock.find_value('_refine.ls_d_res_high'))
+        self.assertTrue(self.mh.datablock.find_value('_refine.pdbx_ls_sigma_I') == '?')
+        self.assertTrue(self.mh.getCategory('refine') == source.getCategory('refine'))
+        self.assertFalse(self.mh.copyCategory(source_block=source.datablock, category='missing'))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from adding_stats_to_mmcif.get_data_from_pdbe_api import GetDataFromPdbeAPi, GetSpecificDataFromPdbeAPI
+import asyncio
+from adding_stats_to_mmcif.get_data_from_pdbe_api import GetDataFromPdbeAPi, GetSpecificDataFromPdbeAPI, get_session
 
 
 class TestAddDataFromAimless(unittest.TestCase):
@@ -62,6 +63,34 @@ class TestAddDataFromAimless(unittest.TestCase):
         s = GetSpecificDataFromPdbeAPI().get_one_letter_code_for_compound(compound=None)
         self.assertEqual(s, 'X')
 
+    def test_shared_session(self):
+        self.assertTrue(get_session() is get_session())
+
+    def test_only_server_errors_retried(self):
+        retries = get_session().get_adapter('https://').max_retries
+        self.assertTrue(retries.connect == 0 and retries.read == 0)
+        self.assertTrue(retries.total > 0)
+
+    def test_get_one_letter_codes_for_compounds_incorrect_server(self):
+        api = GetSpecificDataFromPdbeAPI(server_root='https://www.ebiWRONG.ac.uk/pdbe/api/')
+        s = api.get_one_letter_codes_for_compounds(compounds=['TPO', 'SEP', 'TPO'])
+        self.assertEqual(s, {'TPO': 'X', 'SEP': 'X'})
+        self.assertEqual(api.failed_lookups, {'TPO', 'SEP'})
+
+    def test_get_one_letter_codes_for_compounds_async_incorrect_server(self):
+        api = GetSpecificDataFromPdbeAPI(server_root='https://www.ebiWRONG.ac.uk/pdbe/api/')
+        s = asyncio.run(api.get_one_letter_codes_for_compounds_async(compounds=['TPO', 'SEP', 'TPO']))
+        self.assertEqual(s, {'TPO': 'X', 'SEP': 'X'})
+        self.assertEqual(api.failed_lookups, {'TPO', 'SEP'})
+
+    def test_get_one_letter_codes_for_no_compounds_async(self):
+        s = asyncio.run(GetSpecificDataFromPdbeAPI().get_one_letter_codes_for_compounds_async(compounds=[]))
+        self.assertEqual(s, dict())
+
+    def test_get_one_letter_codes_for_no_compounds(self):
+        s = GetSpecificDataFromPdbeAPI().get_one_letter_codes_for_compounds(compounds=[])
+        self.assertEqual(s, dict())
+
 
 if __name__ == '__main__':
     unittest.main()
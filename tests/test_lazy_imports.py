@@ -0,0 +1,15 @@
+import unittest
+from benchmarks.benchmark_import_time import heavy_modules_imported
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_no_heavy_modules_imported_up_front(self):
+        self.assertEqual(heavy_modules_imported('adding_stats_to_mmcif'), [])
+
+    def test_command_line_no_heavy_modules_imported_up_front(self):
+        self.assertEqual(heavy_modules_imported('adding_stats_to_mmcif.__main__'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from tests.access_test_files import TestFiles
+import tempfile
+import shutil
+import json
+import os
+import sys
+
+from adding_stats_to_mmcif import run_process
+from adding_stats_to_mmcif.metrics import METRICS_ENV, collect_metrics, get_metrics, stage
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.metrics_file = os.path.join(self.test_dir, 'metrics.json')
+
+    def read_records(self):
+        with open(self.metrics_file) as in_file:
+            return [json.loads(line) for line in in_file]
+
+    def test_no_metrics(self):
+        with collect_metrics(metrics_file=None) as metrics:
+            with stage('mmcif_parse'):
+                self.assertTrue(get_metrics() is None)
+        self.assertTrue(metrics is None)
+        self.assertFalse(os.path.exists(self.metrics_file))
+
+    def test_stages(self):
+        with collect_metrics(metrics_file=self.metrics_file, input_mmcif='input.cif'):
+            with stage('outer'):
+                with stage('inner'):
+                    data = bytearray(1000000)
+                del data
+            with stage('inner'):
+                pass
+        self.assertTrue(get_metrics() is None)
+        records = self.read_records()
+        self.assertTrue(len(records) == 1)
+        self.assertTrue(records[0]['input_mmcif'] == 'input.cif')
+        stages = records[0]['stages']
+        self.assertTrue(list(stages) == ['inner', 'outer', 'total'])
+        self.assertTrue(stages['inner']['calls'] == 2)
+        if sys.version_info >= (3, 9):
+            self.assertTrue(stages['inner']['peak_memory_bytes'] >= 1000000)
+            self.assertTrue(stages['outer']['peak_memory_bytes'] >= stages['inner']['peak_memory_bytes'])
+            self.assertTrue(stages['total']['peak_memory_bytes'] >= stages['outer']['peak_memory_bytes'])
+        else:
+            self.assertTrue('peak_memory_bytes' not in stages['inner'])
+        self.assertTrue(stages['total']['wall_seconds'] >= stages['outer']['wall_seconds'])
+
+    @unittest.skipIf(sys.version_info < (3, 9), 'stage peaks need tracemalloc.reset_peak')
+    def test_stage_peak_after_larger_stage(self):
+        with collect_metrics(metrics_file=self.metrics_file):
+            with stage('large'):
+                data = bytearray(4000000)
+                del data
+            with stage('small'):
+                data = bytearray(1000000)
+                del data
+        stages = self.read_records()[0]['stages']
+        self.assertTrue(1000000 <= stages['small']['peak_memory_bytes'] < 4000000)
+        self.assertTrue(stages['large']['peak_memory_bytes'] >= 4000000)
+        self.assertTrue(stages['total']['peak_memory_bytes'] >= stages['large']['peak_memory_bytes'])
+
+    def test_run_process_metrics(self):
+        test_files = TestFiles()
+        test_files.one_sequence()
+        os.environ[METRICS_ENV] = self.metrics_file
+        try:
+            worked = run_process(input_mmcif=test_files.cif, output_mmcif=os.path.join(self.test_dir, 'output.cif'),
+                                 fasta_file=test_files.fasta)
+        finally:
+            del os.environ[METRICS_ENV]
+        self.assertTrue(worked)
+        records = self.read_records()
+        self.assertTrue(records[0]['worked'])
+        for name in ['mmcif_parse', 'fasta_parse', 'compound_resolution', 'sequence_extraction', 'alignment', 'write']:
+            self.assertTrue(name in records[0]['stages'])
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
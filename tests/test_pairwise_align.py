@@ -1,5 +1,7 @@
 import unittest
-from adding_stats_to_mmcif.pairwise_align import SequenceAlign
+from adding_stats_to_mmcif.alignment_memo import AlignmentMemo
+from adding_stats_to_mmcif.pairwise_align import SequenceAlign, SequenceIndex, AlignmentEngine, \
+    BandedAlignmentEngine, get_alignment_engine
 
 no_match = 'XXXXXXXXXX'
 
@@ -157,6 +159,92 @@ class TestSeqAlign(unittest.TestCase):
         aligned, error, score = sa.do_sequence_alignment()
         self.assertFalse(aligned)
 
+    def test_shared_alignment_engine(self):
+        self.assertTrue(get_alignment_engine() is get_alignment_engine())
+        sa = SequenceAlign(sequence1=protein_DNA_RNA[0], sequence2=protein_DNA_RNA[0])
+        self.assertTrue(sa.engine is get_alignment_engine())
+
+    def test_score_many_matches_sequence_align(self):
+        query = short_test_sequences[0]
+        targets = short_test_sequences + protein_DNA_RNA + [no_match]
+        scores = get_alignment_engine().score_many(query=query, targets=targets)
+        for target, score in zip(targets, scores):
+            sa = SequenceAlign(sequence1=query, sequence2=target)
+            aligned, error, expected_score = sa.do_sequence_alignment()
+            self.assertTrue(score == expected_score or (not aligned and score <= 0))
+
+    def test_score_many_different_types(self):
+        scores = get_alignment_engine().score_many(query=protein_DNA_RNA[1], targets=protein_DNA_RNA)
+        self.assertTrue(scores[0] == 0)
+        self.assertTrue(scores[1] > 0)
+        self.assertTrue(scores[2] == 0)
+
+    def test_configured_engine(self):
+        engine = AlignmentEngine(open_gap_score=-20, extend_gap_score=-1)
+        self.assertTrue(engine.aligner.internal_open_gap_score == -20)
+        sa = SequenceAlign(sequence1=short_test_sequences[2], sequence2=short_test_sequences[3], engine=engine)
+        aligned, error, score = sa.do_sequence_alignment()
+        self.assertTrue(aligned)
+        self.assertTrue(score == engine.score(short_test_sequences[2], short_test_sequences[3]))
+
+    def test_sequence_index(self):
+        sequence_index = SequenceIndex(sequences=short_test_sequences + protein_DNA_RNA)
+        self.assertTrue(sequence_index.find_substring(short_test_sequences[2][10:60]) == 2)
+        self.assertTrue(sequence_index.find_substring(short_test_sequences[3]) == 3)
+        self.assertTrue(sequence_index.find_substring('ACGUAC') == 6)
+        self.assertTrue(sequence_index.find_substring('GCTAG') == 5)
+        self.assertTrue(sequence_index.find_substring(no_match) is None)
+        self.assertTrue(sequence_index.find_substring('') is None)
+
+    def test_exact_match_score(self):
+        query = short_test_sequences[1][5:50]
+        exact_score = get_alignment_engine().exact_match_score(query=query)
+        self.assertTrue(exact_score == get_alignment_engine().score(query, short_test_sequences[1]))
+        self.assertTrue(AlignmentEngine(end_gap_score=-1).exact_match_score(query=query) is None)
+
+    def test_score_pairs_parallel_matches_serial(self):
+        pairs = [(query, target) for query in short_test_sequences + protein_DNA_RNA
+                 for target in short_test_sequences + protein_DNA_RNA]
+        engine = get_alignment_engine()
+        serial_scores = engine.score_pairs(pairs=pairs)
+        self.assertTrue(engine.score_pairs(pairs=pairs, workers=2) == serial_scores)
+        self.assertTrue(engine.score_pairs(pairs=pairs, workers=3, chunk_size=5) == serial_scores)
+        self.assertTrue(serial_scores[0] == engine.score(short_test_sequences[0], short_test_sequences[0]))
+
+    def test_best_match_matches_aligning_all(self):
+        query = short_test_sequences[3][:40]
+        targets = [no_match * 10] + short_test_sequences + [short_test_sequences[2], protein_DNA_RNA[1]]
+        memo = AlignmentMemo()
+        position, score = AlignmentEngine(memo=memo).best_match(query=query, targets=targets)
+        scores = get_alignment_engine().score_many(query=query, targets=targets)
+        self.assertTrue(position == scores.index(max(scores)))
+        self.assertTrue(score == max(scores))
+        # targets with too few residues in common with the query are not aligned
+        self.assertTrue(memo.misses < len(targets))
+
+    def test_best_match_no_match(self):
+        position, score = get_alignment_engine().best_match(query=protein_DNA_RNA[1], targets=short_test_sequences)
+        self.assertTrue(position is None)
+        self.assertTrue(score == 0)
+
+    def test_banded_matches_full_aligner(self):
+        engine = BandedAlignmentEngine(min_cells=0)
+        target = test_sequences[2][:3100]
+        query = target[30:1000] + 'XXX' + target[1003:1500] + target[1520:3000]
+        for query, target in ((query, target), (target, query), (short_test_sequences[2], short_test_sequences[3])):
+            self.assertTrue(engine.score(query, target) == get_alignment_engine().score(query, target))
+        self.assertTrue(engine.banded_alignments == 3)
+        self.assertTrue(engine.full_alignments == 0)
+
+    def test_banded_falls_back_to_full_aligner(self):
+        engine = BandedAlignmentEngine(min_cells=0, max_band_width=20)
+        query = test_sequences[2][:200] + 'XX' + test_sequences[2][202:500]
+        target = test_sequences[2][:1000]
+        self.assertTrue(engine.score(query, target) == get_alignment_engine().score(query, target))
+        self.assertTrue(engine.score(query, no_match * 60) == get_alignment_engine().score(query, no_match * 60))
+        self.assertTrue(engine.full_alignments == 2)
+        self.assertTrue(engine.banded_alignments == 0)
+
 
 if __name__ == '__main__':
     unittest.main()
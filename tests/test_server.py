@@ -0,0 +1,87 @@
+import unittest
+from tests.access_test_files import TestFiles
+import tempfile
+import shutil
+import threading
+import os
+
+from adding_stats_to_mmcif.server import JobService, TcpJobServer, UnixJobServer, get_server, is_loopback, send_job
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.test_files = TestFiles()
+        self.test_files.one_sequence()
+        self.test_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.test_dir, 'server.sock')
+        self.service = JobService(output_dir=self.test_dir, workers=1)
+        self.server = get_server(service=self.service, socket_path=self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def test_job(self):
+        output_cif = os.path.join(self.test_dir, 'output.cif')
+        response = send_job(job={'input_mmcif': self.test_files.cif, 'output_mmcif': output_cif,
+                                 'fasta_file': self.test_files.fasta, 'return_output': True},
+                            socket_path=self.socket_path)
+        self.assertTrue(response['worked'])
+        self.assertTrue(response['output_mmcif'] == os.path.realpath(output_cif))
+        with open(output_cif) as in_file:
+            self.assertTrue(response['output'] == in_file.read())
+        self.assertTrue(os.stat(self.socket_path).st_mode & 0o777 == 0o600)
+
+    def test_failed_job(self):
+        response = send_job(job={'input_mmcif': 'missing_file.cif',
+                                 'output_mmcif': os.path.join(self.test_dir, 'output.cif')},
+                            socket_path=self.socket_path)
+        self.assertFalse(response['worked'])
+        self.assertTrue('output' not in response)
+
+    def test_bad_job(self):
+        response = send_job(job={'input_mmcif': self.test_files.cif}, socket_path=self.socket_path)
+        self.assertFalse(response['worked'])
+        self.assertTrue(response['error'].startswith('bad job'))
+
+    def test_relative_output(self):
+        response = send_job(job={'input_mmcif': self.test_files.cif, 'output_mmcif': 'output.cif',
+                                 'fasta_file': self.test_files.fasta}, socket_path=self.socket_path)
+        self.assertTrue(response['worked'])
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, 'output.cif')))
+
+    def test_output_outside_output_dir(self):
+        for output_cif in [os.path.join(tempfile.gettempdir(), 'output.cif'), os.path.join('..', 'output.cif'), '.']:
+            response = send_job(job={'input_mmcif': self.test_files.cif, 'output_mmcif': output_cif,
+                                     'fasta_file': self.test_files.fasta, 'return_output': True},
+                                socket_path=self.socket_path)
+            self.assertFalse(response['worked'])
+            self.assertTrue(response['error'].startswith('bad job'))
+            self.assertTrue('output' not in response)
+
+    def test_loopback_only(self):
+        self.assertTrue(is_loopback(host='127.0.0.1'))
+        self.assertTrue(is_loopback(host='localhost'))
+        self.assertFalse(is_loopback(host='0.0.0.0'))
+        self.assertFalse(is_loopback(host='example.org'))
+        with self.assertRaises(ValueError):
+            TcpJobServer(host='0.0.0.0', port=0, service=self.service)
+
+    def test_socket_path_not_a_socket(self):
+        data_file = os.path.join(self.test_dir, 'data.cif')
+        with open(data_file, 'w') as out_file:
+            out_file.write('data_test\n')
+        with self.assertRaises(FileExistsError):
+            UnixJobServer(socket_path=data_file, service=self.service)
+        with open(data_file) as in_file:
+            self.assertTrue(in_file.read() == 'data_test\n')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.service.shutdown()
+        shutil.rmtree(self.test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()